@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Store analytique SQLite pour les requêtes de statistiques filtrées (/stats/query)
+
+Les CSV servis par /stats/* (data_store.SOURCES) sont chargés, avec le même nettoyage
+que l'API, dans une table 'annonces' indexée par ville, quartier, type de bien et source.
+Chaque requête (filtres, regroupement, percentiles) est une seule requête SQL paramétrée :
+le filtrage, le tri et les agrégats sont faits par SQLite, pas par pandas.
+
+- percentiles : interpolation linéaire entre rangs (ROW_NUMBER / COUNT en fenêtre),
+  comme pandas.Series.quantile
+- in_stats : ligne retenue pour les moyennes (outliers exclus, data_store.stats_mask) ;
+  outliers=1 interroge toutes les lignes nettoyées
+
+Construction : python analytics_store.py (reconstruit aussi au démarrage de l'API si périmé)
+Workers gunicorn : la reconstruction se fait sous un verrou de fichier (<store>.lock) ; le
+premier worker qui trouve le store périmé le reconstruit, les autres attendent puis rouvrent
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus (un seul serveur Flask)
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from data_index import fold_key
+from data_store import DATA_DIR, SOURCES, STORE_DIR, _source_signature, read_csv_frames, stats_mask
+
+ANALYTICS_PATH = os.path.join(STORE_DIR, 'analytics.sqlite')
+ANALYTICS_FORMAT_VERSION = 1
+
+# Source des annonces quand le CSV n'a pas de colonne 'source'
+DEFAULT_SOURCES = {'vente': 'Mubawab'}
+
+SCHEMA = """
+CREATE TABLE annonces (
+    transaction_type TEXT NOT NULL,
+    source TEXT,
+    city TEXT NOT NULL,
+    city_key TEXT NOT NULL,
+    quartier TEXT,
+    type_bien TEXT,
+    nb_chambres INTEGER,
+    nb_salle_de_bain INTEGER,
+    price REAL NOT NULL,
+    surface_m2 REAL NOT NULL,
+    prix_m2 REAL,
+    in_stats INTEGER NOT NULL
+);
+CREATE TABLE sources (
+    transaction_type TEXT PRIMARY KEY,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Toutes les requêtes filtrent sur le type de transaction : il ouvre chaque index
+INDEXES = {
+    'city': ['transaction_type', 'city_key', 'in_stats'],
+    'quartier': ['transaction_type', 'quartier'],
+    'type_bien': ['transaction_type', 'type_bien'],
+    'source': ['transaction_type', 'source'],
+}
+
+STORE_COLUMNS = ['transaction_type', 'source', 'city', 'city_key', 'quartier', 'type_bien',
+                 'nb_chambres', 'nb_salle_de_bain', 'price', 'surface_m2', 'prix_m2', 'in_stats']
+
+# Paramètres de requête -> colonnes SQL (liste blanche : seules les valeurs sont paramétrées)
+FILTER_COLUMNS = {
+    'city': 'city_key',
+    'quartier': 'quartier',
+    'type_bien': 'type_bien',
+    'source': 'source',
+    'nb_chambres': 'nb_chambres',
+    'nb_salle_de_bain': 'nb_salle_de_bain',
+}
+RANGE_FILTERS = {
+    'min_price': ('price', '>='),
+    'max_price': ('price', '<='),
+    'min_surface': ('surface_m2', '>='),
+    'max_surface': ('surface_m2', '<='),
+}
+GROUP_COLUMNS = ['city', 'quartier', 'type_bien', 'source', 'nb_chambres', 'nb_salle_de_bain']
+METRICS = ['price', 'surface_m2', 'prix_m2']
+TRANSACTIONS = list(SOURCES)
+
+DEFAULT_PERCENTILES = [10, 25, 50, 75, 90]
+MAX_PERCENTILES = 9
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class QueryError(ValueError):
+    pass
+
+
+# ============================================
+# CONSTRUCTION
+# ============================================
+def prepare_frame(df_clean, transaction):
+    """df_clean (data_store.clean_frame) -> colonnes de la table 'annonces'"""
+    def column(name):
+        if name in df_clean.columns:
+            return df_clean[name].astype(object)
+        return pd.Series(DEFAULT_SOURCES.get(transaction) if name == 'source' else None,
+                         index=df_clean.index, dtype=object)
+
+    surface = df_clean['surface_m2'].to_numpy(dtype=float)
+    price = df_clean['price'].to_numpy(dtype=float)
+    frame = pd.DataFrame({
+        'transaction_type': transaction,
+        'source': column('source'),
+        'city': df_clean['city'].astype(str),
+        'city_key': df_clean['city_key'].astype(str),
+        'quartier': column('quartier'),
+        'type_bien': column('type_bien'),
+        'nb_chambres': pd.to_numeric(column('nb_chambres'), errors='coerce').astype('Int64'),
+        'nb_salle_de_bain': pd.to_numeric(column('nb_salle_de_bain'), errors='coerce').astype('Int64'),
+        'price': price,
+        'surface_m2': surface,
+        'prix_m2': np.divide(price, surface, out=np.full(len(price), np.nan), where=surface > 0),
+        'in_stats': stats_mask(df_clean, transaction).to_numpy(dtype=int),
+    }, index=df_clean.index)
+    return frame[STORE_COLUMNS]
+
+
+def _rows(frame):
+    """Tuples Python (None à la place de NaN / <NA>) pour executemany"""
+    columns = [frame[col].astype(object).where(frame[col].notna(), None).tolist() for col in frame.columns]
+    return zip(*columns)
+
+
+def build_store(path=ANALYTICS_PATH, data_dir=DATA_DIR):
+    """Charge les CSV dans un fichier temporaire, l'indexe, puis le met en place atomiquement"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    report = {}
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript('PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;' + SCHEMA)
+        placeholders = ', '.join('?' * len(STORE_COLUMNS))
+        for transaction, filename in SOURCES.items():
+            csv_path = os.path.join(data_dir, filename)
+            if not os.path.exists(csv_path):
+                continue
+            df_clean, _ = read_csv_frames(csv_path, transaction)
+            frame = prepare_frame(df_clean, transaction)
+            conn.executemany(f"INSERT INTO annonces ({', '.join(STORE_COLUMNS)}) VALUES ({placeholders})",
+                             _rows(frame))
+            signature = _source_signature(csv_path)
+            conn.execute("INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                         (transaction, filename, signature['size'], signature['mtime_ns'], len(frame)))
+            report[transaction] = len(frame)
+        for name, columns in INDEXES.items():
+            conn.execute(f"CREATE INDEX idx_{name} ON annonces ({', '.join(columns)})")
+        conn.execute("INSERT INTO meta VALUES ('format_version', ?)", (str(ANALYTICS_FORMAT_VERSION),))
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return report
+
+
+@contextmanager
+def build_lock(path=ANALYTICS_PATH):
+    """Verrou exclusif entre processus sur <store>.lock, tenu pendant une reconstruction"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def store_is_fresh(path=ANALYTICS_PATH, data_dir=DATA_DIR):
+    """Le store existe, au bon format, et chaque CSV présent y est chargé dans sa version actuelle"""
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            version = conn.execute("SELECT value FROM meta WHERE key = 'format_version'").fetchone()
+            loaded = {row[0]: row[1:] for row in conn.execute("SELECT transaction_type, file, size, mtime_ns FROM sources")}
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    if version is None or version[0] != str(ANALYTICS_FORMAT_VERSION):
+        return False
+    for transaction, filename in SOURCES.items():
+        csv_path = os.path.join(data_dir, filename)
+        if not os.path.exists(csv_path):
+            continue
+        signature = _source_signature(csv_path)
+        if loaded.get(transaction) != (filename, signature['size'], signature['mtime_ns']):
+            return False
+    return True
+
+
+# ============================================
+# REQUÊTES
+# ============================================
+def _values(args, name):
+    """Valeurs d'un paramètre : répété (?city=a&city=b) ou séparé par des virgules"""
+    raw = args.getlist(name) if hasattr(args, 'getlist') else args.get(name)
+    if raw is None:
+        return []
+    if isinstance(raw, str):
+        raw = [raw]
+    return [v.strip() for item in raw for v in str(item).split(',') if v.strip()]
+
+
+def _number(args, name, cast=float):
+    values = _values(args, name)
+    if not values:
+        return None
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise QueryError(f"Valeur invalide pour {name}: {values[0]!r}")
+
+
+def parse_query(args):
+    """Paramètres d'URL (MultiDict Flask ou dict) -> arguments de AnalyticsStore.query"""
+    transaction = (args.get('transaction') or 'vente').lower()
+    filters = {}
+    for name in FILTER_COLUMNS:
+        values = _values(args, name)
+        if values and name.startswith('nb_'):
+            try:
+                values = [int(v) for v in values]
+            except ValueError:
+                raise QueryError(f"Valeur invalide pour {name}: {values}")
+        if values:
+            filters[name] = values
+    ranges = {name: value for name in RANGE_FILTERS if (value := _number(args, name)) is not None}
+    percentiles = _values(args, 'percentiles')
+    try:
+        if percentiles == ['none']:
+            percentiles = []
+        else:
+            percentiles = [float(p) for p in percentiles] if percentiles else DEFAULT_PERCENTILES
+    except ValueError:
+        raise QueryError(f"Percentiles invalides: {percentiles}")
+    # limit=0 ou négatif : refusé par _check, pas remplacé par la valeur par défaut
+    limit = _number(args, 'limit', int)
+    return {
+        'transaction': transaction,
+        'filters': filters,
+        'ranges': ranges,
+        'group_by': _values(args, 'group_by'),
+        'metric': args.get('metric') or 'price',
+        'percentiles': percentiles,
+        'outliers': (args.get('outliers') or '0').lower() in ('1', 'true'),
+        'limit': DEFAULT_LIMIT if limit is None else limit,
+    }
+
+
+def _check(transaction, group_by, metric, percentiles, limit):
+    if transaction not in TRANSACTIONS:
+        raise QueryError(f"Type de transaction inconnu: {transaction}")
+    unknown = [g for g in group_by if g not in GROUP_COLUMNS]
+    if unknown or len(set(group_by)) != len(group_by):
+        raise QueryError(f"group_by invalide: {group_by} (valeurs possibles : {', '.join(GROUP_COLUMNS)})")
+    if metric not in METRICS:
+        raise QueryError(f"Métrique inconnue: {metric} (valeurs possibles : {', '.join(METRICS)})")
+    if len(percentiles) > MAX_PERCENTILES or not all(0 <= p <= 100 for p in percentiles):
+        raise QueryError(f"Percentiles invalides: {percentiles} (au plus {MAX_PERCENTILES} valeurs entre 0 et 100)")
+    if not 0 < limit <= MAX_LIMIT:
+        raise QueryError(f"limit doit être entre 1 et {MAX_LIMIT}")
+
+
+def build_sql(transaction, filters=None, ranges=None, group_by=(), metric='price',
+              percentiles=DEFAULT_PERCENTILES, outliers=False, limit=DEFAULT_LIMIT):
+    """(requête SQL, paramètres) : noms de colonnes issus des listes blanches, valeurs en '?'"""
+    _check(transaction, group_by, metric, percentiles, limit)
+    where = ['transaction_type = ?', f'{metric} IS NOT NULL']
+    params = [transaction]
+    if not outliers:
+        where.append('in_stats = 1')
+    for name, values in (filters or {}).items():
+        if name not in FILTER_COLUMNS:
+            raise QueryError(f"Filtre inconnu: {name}")
+        if name == 'city':
+            values = [fold_key(v) for v in values]
+        where.append(f"{FILTER_COLUMNS[name]} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    for name, value in (ranges or {}).items():
+        if name not in RANGE_FILTERS:
+            raise QueryError(f"Filtre inconnu: {name}")
+        column, op = RANGE_FILTERS[name]
+        where.append(f'{column} {op} ?')
+        params.append(value)
+
+    # Regroupement par ville sur la clé normalisée ; le libellé affiché est le plus petit nom
+    keys = [FILTER_COLUMNS[g] for g in group_by]
+    where.extend(f'{k} IS NOT NULL' for k in keys)
+    selected = ', '.join(keys + ['city', f'{metric} AS value'])
+    partition = f"PARTITION BY {', '.join(keys)} " if keys else ''
+    group = f"GROUP BY {', '.join(keys)} " if keys else ''
+    labels = ['MIN(city) AS city' if g == 'city' else k for g, k in zip(group_by, keys)]
+
+    # Rang bas / haut de chaque percentile puis interpolation linéaire (pandas.quantile)
+    bounds, interpolated = [], []
+    for i, p in enumerate(percentiles):
+        position = '(n - 1) * ?'
+        bounds.append(f"MAX(CASE WHEN i = CAST({position} AS INTEGER) THEN value END) AS lo{i}, "
+                      f"MAX(CASE WHEN i = CAST({position} AS INTEGER) + 1 THEN value END) AS hi{i}, "
+                      f"{position} - CAST({position} AS INTEGER) AS frac{i}")
+        interpolated.append(f"lo{i} + frac{i} * (COALESCE(hi{i}, lo{i}) - lo{i}) AS p{i}")
+    percentile_params = [q for p in percentiles for q in [p / 100] * 4]
+    # Sans percentiles, pas de tri : un simple GROUP BY sur les lignes trouvées par les index
+    window = (f", ROW_NUMBER() OVER ({partition}ORDER BY {metric}) - 1 AS i, "
+              f"COUNT(*) OVER ({partition.strip()}) AS n") if percentiles else ''
+
+    # Sans GROUP BY ni percentiles, COUNT(*) donne une ligne count = 0 (moyenne NULL) quand
+    # rien ne correspond : groupes vides écartés, la réponse a alors une liste vide
+    sql = (
+        f"WITH ranked AS ("
+        f"SELECT {selected}{window} "
+        f"FROM annonces WHERE {' AND '.join(where)}), "
+        f"grouped AS ("
+        f"SELECT {', '.join(labels + [''])}{'MAX(n)' if percentiles else 'COUNT(*)'} AS count, "
+        f"AVG(value) AS mean, MIN(value) AS min, MAX(value) AS max{''.join(', ' + b for b in bounds)} "
+        f"FROM ranked {group}) "
+        f"SELECT {', '.join(list(group_by) + ['count', 'mean', 'min', 'max'] + interpolated)} "
+        f"FROM grouped WHERE count > 0 "
+        f"ORDER BY count DESC{''.join(f', {g}' for g in group_by)} LIMIT ?"
+    )
+    return sql, params + percentile_params + [limit]
+
+
+class AnalyticsStore:
+    """
+    Store SQLite en lecture seule ; une connexion par thread (serveur Flask multi-thread),
+    ouverte à la première requête : jamais partagée entre le master gunicorn et ses workers
+    """
+
+    def __init__(self, path=ANALYTICS_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._local = threading.local()
+
+    @classmethod
+    def open(cls, path=ANALYTICS_PATH, data_dir=DATA_DIR, rebuild=True):
+        """
+        Ouvre le store, reconstruit au préalable s'il est absent ou périmé (rebuild=True)
+        Un seul processus reconstruit : les autres attendent le verrou, trouvent le store
+        à jour et l'ouvrent tel quel
+        """
+        if rebuild and not store_is_fresh(path, data_dir):
+            with build_lock(path):
+                if not store_is_fresh(path, data_dir):
+                    build_store(path, data_dir)
+        return cls(path)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute('PRAGMA query_only = 1')
+            self._local.conn = conn
+        return conn
+
+    def counts(self):
+        """Lignes chargées par type de transaction (connexion temporaire : utilisable avant un fork)"""
+        conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        try:
+            return dict(conn.execute("SELECT transaction_type, rows FROM sources"))
+        finally:
+            conn.close()
+
+    def query(self, transaction='vente', filters=None, ranges=None, group_by=(), metric='price',
+              percentiles=DEFAULT_PERCENTILES, outliers=False, limit=DEFAULT_LIMIT):
+        """Agrégats count / mean / min / max / percentiles de la métrique, par groupe"""
+        group_by = list(group_by)
+        sql, params = build_sql(transaction, filters, ranges, group_by, metric, percentiles, outliers, limit)
+        start = time.perf_counter()
+        rows = self.connection().execute(sql, params).fetchall()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        groups = []
+        width = len(group_by)
+        for row in rows:
+            count, mean, low, high = row[width:width + 4]
+            groups.append(dict(zip(group_by, row[:width]), count=int(count), mean=float(mean), min=float(low),
+                               max=float(high),
+                               percentiles={f'p{p:g}': float(v) for p, v in zip(percentiles, row[width + 4:])}))
+        return {
+            'transaction': transaction,
+            'metric': metric,
+            'filters': dict(filters or {}, **(ranges or {})),
+            'group_by': group_by,
+            'outliers': outliers,
+            'groups': groups,
+            'elapsed_ms': round(elapsed_ms, 3)
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Construction du store analytique SQLite des statistiques")
+    parser.add_argument('--path', default=ANALYTICS_PATH)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    with build_lock(args.path):
+        report = build_store(args.path, args.data_dir)
+    for transaction, rows in report.items():
+        print(f"✅ {transaction.upper()} : {rows} lignes")
+    print(f"💾 {args.path} ({os.path.getsize(args.path) / 1e6:.1f} Mo) en {time.perf_counter() - start:.2f}s")
@@ -6,88 +6,49 @@ Supporte deux modèles : Vente et Location
 
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-import pickle
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+import io
+import json
+import logging
+import time
+
+from feature_pipeline import CompiledPipeline, derive_features
+from prediction_cache import create_prediction_cache, prediction_key
+from model_registry import ModelRegistry, ModelUnavailableError
+from data_store import MissingColumnsError, SOURCES, read_csv_frames, read_store, store_is_fresh
+from stats_engine import StatsEngine
+from quantile_sketch import DEFAULT_PERCENTILES, METRICS as QUANTILE_METRICS
+from analytics_store import AnalyticsStore, QueryError, parse_query
+from data_refresh import DataRefresher
+from logging_setup import configure_logging, dropped_records, init_app as init_request_logging
+import metrics
+
+# Serveur de développement (python app.py) : INFO ; import par un serveur WSGI : WARNING
+configure_logging(default_level='INFO' if __name__ == '__main__' else 'WARNING')
+logger = logging.getLogger('api')
 
 app = Flask(__name__, static_folder='../frontend/out', static_url_path='')
 CORS(app)
+init_request_logging(app)
+metrics.init_app(app)
 
 # ============================================
 # CONFIGURATION DES CHEMINS
 # ============================================
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
-MODEL_DIR = os.path.join(PROJECT_ROOT, 'models')
-
-print(f"📂 Chemin des modèles : {MODEL_DIR}")
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(PROJECT_ROOT, 'models'))
 
+logger.info("📂 Chemin des modèles : %s", MODEL_DIR)
 
-
-# Variables globales pour les modèles
-model_vente = None
-model_location = None
-target_encoder = None
-scaler = None
-numeric_features = []
-categorical_features = []
-all_features_order = []
-model_performance_vente = {}
-model_performance_location = {}
-
-try:
-    # --- MODÈLE VENTE ---
-    print("\n📦 Chargement du modèle VENTE...")
-    with open(os.path.join(MODEL_DIR, 'gradient_boosting_model.pkl'), 'rb') as f:
-        model_vente = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'target_encoder.pkl'), 'rb') as f:
-        target_encoder_vente = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'scaler.pkl'), 'rb') as f:
-        scaler_vente = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'feature_names.pkl'), 'rb') as f:
-        feature_names_vente = pickle.load(f)
-    print("✅ Modèle Vente chargé (modèle + encoder + scaler)")
-    
-    # --- MODÈLE LOCATION ---
-    print("\n📦 Chargement du modèle LOCATION...")
-    with open(os.path.join(MODEL_DIR, 'model_Location_final_stacking.pkl'), 'rb') as f:
-        model_location = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'location_target_encoder.pkl'), 'rb') as f:
-        target_encoder_location = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'location_scaler.pkl'), 'rb') as f:
-        scaler_location = pickle.load(f)
-    with open(os.path.join(MODEL_DIR, 'location_feature_names.pkl'), 'rb') as f:
-        feature_names_location = pickle.load(f)
-    print("✅ Modèle Location chargé (modèle + encoder + scaler)")
-    
-    # Variables globales (pour compatibilité)
-    numeric_features = feature_names_vente.get('numeric_features', [])
-    categorical_features = feature_names_vente.get('categorical_features', [])
-    all_features_order = numeric_features + categorical_features
-    
-    # --- PERFORMANCES ---
-    print("\n📦 Chargement des performances...")
-    perf_vente = pd.read_csv(os.path.join(MODEL_DIR, 'model_performance_summary.csv'))
-    model_performance_vente = perf_vente.iloc[0].to_dict()
-    print(f"✅ Vente - RMSE: {model_performance_vente.get('rmse_test', 0):,.0f} DH")
-    
-    perf_location = pd.read_csv(os.path.join(MODEL_DIR, 'location_model_performance_summary.csv'))
-    model_performance_location = perf_location.iloc[0].to_dict()
-    print(f"✅ Location - RMSE: {model_performance_location.get('rmse_test_dh', 0):,.0f} DH")
-    
-    print("\n" + "="*60)
-    print("✅ TOUS LES MODÈLES SONT PRÊTS !")
-    print("="*60)
-    
-    MODELS_LOADED = True
-    
-except Exception as e:
-    print(f"\n❌ Erreur lors du chargement des modèles : {e}")
-    import traceback
-    traceback.print_exc()
-    MODELS_LOADED = False
+# Politique de chargement des modèles :
+# - eager : tous les modèles chargés au démarrage (défaut)
+# - background : démarrage immédiat, chargement dans un thread de préchauffage
+# - lazy : chaque modèle est chargé à sa première prédiction (workers stats uniquement)
+MODEL_LOADING = os.environ.get('MODEL_LOADING', 'eager').lower()
 
 # ============================================
 # DONNÉES DISPONIBLES
@@ -136,6 +97,7 @@ def serve_static(path):
 
 @app.route('/api/info')
 def api_info():
+    states = [entry['state'] for entry in MODEL_REGISTRY.status().values()]
     return jsonify({
         'name': 'API Prédiction Immobilière Maroc',
         'version': '2.0',
@@ -144,14 +106,27 @@ def api_info():
             'vente': 'Gradient Boosting',
             'location': 'Stacking Ensemble'
         },
-        'status': 'running' if MODELS_LOADED else 'error'
+        'status': 'error' if 'error' in states else 'running'
     })
 
 @app.route('/health')
 def health():
+    models = MODEL_REGISTRY.status()
+    states = [entry['state'] for entry in models.values()]
+    ready = all(state == 'ready' for state in states)
+    if 'error' in states:
+        status = 'degraded'
+    elif not ready and MODEL_LOADING != 'lazy':
+        status = 'starting'
+    else:
+        status = 'healthy'
     return jsonify({
-        'status': 'healthy' if MODELS_LOADED else 'degraded',
-        'models_loaded': MODELS_LOADED,
+        'status': status,
+        'models_loaded': ready,
+        'ready': ready,
+        'model_loading': MODEL_LOADING,
+        'models': models,
+        'data': {key: value for key, value in DATA_REFRESHER.status().items() if key != 'last_refresh'},
         'timestamp': datetime.now().isoformat()
     })
 
@@ -161,27 +136,236 @@ def get_data():
 
 @app.route('/model-info')
 def model_info():
-    return jsonify({
-        'vente': {
-            'model_type': 'Gradient Boosting Regressor',
-            'r2_test': float(model_performance_vente.get('r2_test', 0)),
-            'rmse_test': float(model_performance_vente.get('rmse_test', 0))
-        },
-        'location': {
-            'model_type': 'Stacking Ensemble',
-            'r2_test': float(model_performance_location.get('r2_test_log', 0)),
-            'rmse_test': float(model_performance_location.get('rmse_test_dh', 0))
+    result = {}
+    status = MODEL_REGISTRY.status()
+    for name, spec in MODEL_REGISTRY.specs.items():
+        performance = MODEL_REGISTRY.performance(name)
+        result[name] = {
+            'model_type': spec['model_type'],
+            'r2_test': float(performance.get(spec['r2_key'], 0)),
+            'rmse_test': float(performance.get(spec['rmse_key'], 0)),
+            'state': status[name]['state'],
+            'version': status[name].get('version'),
+            'fingerprint': status[name].get('fingerprint'),
+            'loaded_at': status[name].get('loaded_at'),
+            'reload': status[name]['reload']
+        }
+    return jsonify(result)
+
+# Jeton requis pour les endpoints /admin/* (désactivés si ADMIN_TOKEN n'est pas défini)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+def admin_denied():
+    """Réponse d'erreur si la requête admin n'est pas autorisée, sinon None"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Endpoint admin désactivé (ADMIN_TOKEN non défini)'}), 403
+    if request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Jeton admin invalide'}), 401
+    return None
+
+@app.route('/admin/reload-models', methods=['POST'])
+def admin_reload_models():
+    """Recharge à chaud les modèles depuis MODEL_DIR (?transaction=vente|location, ?wait=1)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    transaction = request.args.get('transaction')
+    if transaction and transaction not in MODEL_REGISTRY.specs:
+        return jsonify({'error': f'Type de transaction inconnu: {transaction}'}), 400
+    names = [transaction] if transaction else MODEL_REGISTRY.names
+
+    if request.args.get('wait') in ('1', 'true'):
+        results = [MODEL_REGISTRY.reload(name) for name in names]
+        failed = any(r['status'] == 'failed' for r in results)
+        return jsonify({'results': results}), 500 if failed else 200
+
+    MODEL_REGISTRY.reload_async(names)
+    return jsonify({'status': 'reloading', 'models': names}), 202
+
+# ============================================
+# PIPELINE DE PRÉDICTION (unitaire + batch)
+# ============================================
+REQUIRED_FIELDS = ['city', 'quartier', 'property_type', 'surface_m2', 'num_rooms', 'num_bathrooms']
+NUMERIC_FIELDS = ['surface_m2', 'num_rooms', 'num_bathrooms']
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', 100000))
+
+def bundle_name(transaction_type):
+    """Tout type autre que 'location' utilise le modèle vente"""
+    return 'location' if transaction_type == 'location' else 'vente'
+
+def get_model_bundle(transaction_type):
+    """Bundle (modèle + encoder + scaler + features) du type de transaction, chargé au besoin"""
+    return MODEL_REGISTRY.get(bundle_name(transaction_type))
+
+def engineer_features(df, transaction_type):
+    """Ajoute les features dérivées (vectorisé, une ou plusieurs lignes)"""
+    derived = derive_features(
+        df['surface_m2'], df['num_rooms'], df['num_bathrooms'],
+        AVG_PRICE_PER_M2 if transaction_type == 'vente' else 80
+    )
+    for name, values in derived.items():
+        df[name] = values
+    return df
+
+def predict_frame(df, transaction_type, bundle=None, timings=None):
+    """
+    Encode, standardise et prédit en un seul appel pour toutes les lignes de df
+    timings (dict optionnel) reçoit la durée de chaque étape en secondes
+    """
+    bundle = bundle or get_model_bundle(transaction_type)
+    num_features = bundle.num_features
+    cat_features = bundle.cat_features
+    all_features = num_features + cat_features
+
+    t0 = time.perf_counter()
+    new_features = engineer_features(df, transaction_type)[all_features].copy()
+    t1 = time.perf_counter()
+
+    # Target Encoding
+    new_features[cat_features] = bundle.target_encoder.transform(
+        new_features[cat_features]
+    )
+    t2 = time.perf_counter()
+
+    # Standardisation
+    new_features[num_features] = bundle.scaler.transform(
+        new_features[num_features]
+    )
+    t3 = time.perf_counter()
+
+    predictions = np.asarray(bundle.model.predict(new_features), dtype=float)
+    if timings is not None:
+        timings.update(features=t1 - t0, encode=t2 - t1, scale=t3 - t2, model=time.perf_counter() - t3)
+
+    # Pour location, le modèle peut prédire en log (petit nombre), convertir si nécessaire
+    if transaction_type == 'location':
+        predictions = np.where(predictions < 100, np.exp(predictions), predictions)
+
+    return predictions
+
+def build_prediction(prediction, surface_m2, transaction_type, rmse):
+    """Construit le bloc 'prediction' de la réponse (prix + intervalle de confiance)"""
+    result = {
+        'price_dh': round(prediction, 2),
+        'price_millions': round(prediction / 1_000_000, 2),
+        # Surface nulle ou non finie : pas de prix/m² plutôt qu'une exception
+        'price_per_m2': round(prediction / surface_m2, 2) if np.isfinite(surface_m2) and surface_m2 > 0 else None,
+        'confidence_interval': {
+            'min': round(max(0, prediction - rmse), 2),
+            'max': round(prediction + rmse, 2),
+            'margin': round(rmse, 2)
         }
+    }
+
+    if transaction_type == 'location':
+        # Pour location, ajouter le prix mensuel
+        result['price_monthly'] = round(prediction, 2)
+        result['price_millions'] = None  # Pas pertinent pour location
+
+    return result
+
+def predict_pandas(data, transaction_type, bundle=None, timings=None):
+    """Chemin historique : DataFrame d'une ligne passé à l'encodeur, au scaler et au modèle"""
+    start = time.perf_counter()
+    new_data = pd.DataFrame({
+        'city': [data['city']],
+        'quartier': [data['quartier']],
+        'property_type': [data['property_type']],
+        'surface_m2': [float(data['surface_m2'])],
+        'num_rooms': [int(data['num_rooms'])],
+        'num_bathrooms': [int(data['num_bathrooms'])]
     })
+    if timings is not None:
+        timings['frame'] = time.perf_counter() - start
+    return float(predict_frame(new_data, transaction_type, bundle, timings)[0])
+
+# Chemin des prédictions unitaires : 'fast' (pipeline compilé), 'pandas' (historique)
+# ou 'compare' (exécute les deux, signale les écarts et renvoie le résultat compilé)
+PREDICT_PIPELINE = os.environ.get('PREDICT_PIPELINE', 'fast').lower()
+
+# Cache des prédictions unitaires (PREDICTION_CACHE_SIZE / _TTL / _URL)
+PREDICTION_CACHE = create_prediction_cache()
+
+VERIFY_SAMPLES = [
+    {'city': city, 'quartier': quartier, 'property_type': property_type,
+     'surface_m2': 45 + 35 * i, 'num_rooms': 1 + i % 5, 'num_bathrooms': 1 + i % 3}
+    for i, (city, quartier, property_type) in enumerate([
+        ('Casablanca', 'Maârif', 'Appartement'),
+        ('Marrakech', 'Guéliz', 'Villa'),
+        ('Rabat', 'Souissi', 'Maison'),
+        ('Tanger', 'Malabata', 'Riad'),
+        ('Ville inconnue', 'Quartier inconnu', 'Type inconnu')
+    ])
+]
+
+def attach_compiled_pipeline(bundle):
+    """Compile le pipeline du bundle et le vérifie contre le chemin pandas"""
+    if PREDICT_PIPELINE == 'pandas':
+        return
+    label = bundle.spec['label']
+    try:
+        pipeline = CompiledPipeline(
+            bundle.name, bundle.features_dict, bundle.target_encoder, bundle.scaler,
+            bundle.model, AVG_PRICE_PER_M2 if bundle.name == 'vente' else 80
+        )
+        mismatches = pipeline.verify(lambda d: predict_pandas(d, bundle.name, bundle), VERIFY_SAMPLES)
+    except Exception as e:
+        logger.warning("⚠️ Pipeline compilé %s indisponible, utilisation du chemin pandas : %s", label, e)
+        return
+    if mismatches:
+        logger.warning("⚠️ Pipeline compilé %s désactivé (%d écarts) : %s", label, len(mismatches), mismatches[0])
+        return
+    bundle.pipeline = pipeline
+    logger.info("✅ Pipeline compilé %s vérifié (%d échantillons)", label, len(VERIFY_SAMPLES))
+
+def on_bundle_loaded(bundle):
+    attach_compiled_pipeline(bundle)
+
+def validate_bundle(bundle):
+    """Test de fumée avant activation : le modèle doit prédire des prix finis"""
+    samples = pd.DataFrame(VERIFY_SAMPLES)
+    predictions = predict_frame(samples, bundle.name, bundle)
+    if len(predictions) != len(samples) or not np.all(np.isfinite(predictions)):
+        raise ValueError(f"prédictions invalides sur les échantillons de contrôle : {predictions.tolist()}")
+
+def on_bundle_swapped(bundle):
+    # Les entrées du cache calculées avec l'ancienne version ne doivent plus être servies
+    PREDICTION_CACHE.set_fingerprint(MODEL_REGISTRY.fingerprint())
+
+MODEL_REGISTRY = ModelRegistry(
+    MODEL_DIR, on_load=on_bundle_loaded, validate=validate_bundle, on_swap=on_bundle_swapped
+)
+
+def predict_single(data, transaction_type, bundle, mode=None, timings=None):
+    """Prédiction unitaire selon le mode choisi (fast / pandas / compare)"""
+    mode = (mode or PREDICT_PIPELINE).lower()
+    # Le pipeline compilé fige price_per_m2 pour 'vente' / 'location' uniquement
+    pipeline = bundle.pipeline if transaction_type == bundle.name else None
+    if pipeline is None or mode == 'pandas':
+        return predict_pandas(data, transaction_type, bundle, timings)
+    if mode != 'compare':
+        return pipeline.predict(data, timings)
+
+    start = time.perf_counter()
+    fast = pipeline.predict(data)
+    fast_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    reference = predict_pandas(data, transaction_type, bundle)
+    pandas_ms = (time.perf_counter() - start) * 1000
+    level = logging.INFO if np.isclose(fast, reference, rtol=1e-9, atol=0) else logging.WARNING
+    logger.log(level, "compiled=%.2f (%.2f ms) | pandas=%.2f (%.2f ms)", fast, fast_ms, reference, pandas_ms,
+               extra={'compiled_ms': round(fast_ms, 3), 'pandas_ms': round(pandas_ms, 3)})
+    return fast
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if not MODELS_LOADED:
-        return jsonify({'error': 'Modèles non chargés'}), 503
-    
+    timings = {}
+    start = time.perf_counter()
     try:
         data = request.get_json()
-        print(f"\n📥 Données reçues : {data}")
+        timings['parse'] = time.perf_counter() - start
+        logger.debug("📥 Données reçues : %s", data)
         
         # Extraction des données
         transaction_type = data.get('transaction_type', 'vente').lower()
@@ -192,113 +376,252 @@ def predict():
         num_rooms = int(data['num_rooms'])
         num_bathrooms = int(data['num_bathrooms'])
         
-        print(f"📊 Transaction: {transaction_type.upper()}")
-        print(f"✅ {city}, {quartier}, {surface_m2}m², {num_rooms}ch, {num_bathrooms}sdb")
-        
-        # Sélection du modèle et des encodeurs selon le type de transaction
-        if transaction_type == 'location':
-            model = model_location
-            target_encoder = target_encoder_location
-            scaler = scaler_location
-            features_dict = feature_names_location
-            performance = model_performance_location
-            rmse_key = 'rmse_test_dh'
-            print("🔄 Utilisation du modèle LOCATION")
-        else:
-            model = model_vente
-            target_encoder = target_encoder_vente
-            scaler = scaler_vente
-            features_dict = feature_names_vente
-            performance = model_performance_vente
-            rmse_key = 'rmse_test'
-            print("🔄 Utilisation du modèle VENTE")
-        
-        # Features pour ce modèle
-        num_features = features_dict.get('numeric_features', numeric_features)
-        cat_features = features_dict.get('categorical_features', categorical_features)
-        all_features = num_features + cat_features
+        # Bundle du modèle (chargé au premier usage si MODEL_LOADING=lazy)
+        bundle = get_model_bundle(transaction_type)
         
-        # Créer le DataFrame
-        new_data = pd.DataFrame({
-            'city': [city],
-            'quartier': [quartier],
-            'property_type': [property_type],
-            'surface_m2': [surface_m2],
-            'num_rooms': [num_rooms],
-            'num_bathrooms': [num_bathrooms]
-        })
+        # Prédiction (pipeline compilé ou chemin pandas, cf. PREDICT_PIPELINE / ?pipeline=)
+        # Le cache est court-circuité quand un chemin est imposé explicitement : ni lu, ni
+        # alimenté (un appel de diagnostic ne doit pas servir les requêtes suivantes)
+        pipeline_mode = request.args.get('pipeline')
+        cache_key = (bundle.fingerprint,) + prediction_key(data, transaction_type)
+        start = time.perf_counter()
+        prediction = None if pipeline_mode else PREDICTION_CACHE.get(cache_key)
+        cached = prediction is not None
+        timings['cache'] = time.perf_counter() - start
+        metrics.CACHE_REQUESTS.inc(transaction_type, 'bypass' if pipeline_mode else 'hit' if cached else 'miss')
+        if prediction is None:
+            prediction = predict_single(data, transaction_type, bundle, pipeline_mode, timings)
+            if not pipeline_mode:
+                PREDICTION_CACHE.set(cache_key, prediction)
+        predict_ms = (time.perf_counter() - start) * 1000
         
-        # Feature Engineering
-        new_data['surface_rooms'] = new_data['surface_m2'] * new_data['num_rooms']
-        new_data['bathrooms_rooms_ratio'] = new_data['num_bathrooms'] / (new_data['num_rooms'] + 1)
-        new_data['total_rooms'] = new_data['num_rooms'] + new_data['num_bathrooms']
-        new_data['surface_per_room'] = new_data['surface_m2'] / (new_data['total_rooms'] + 1)
-        new_data['price_per_m2'] = AVG_PRICE_PER_M2 if transaction_type == 'vente' else 80
-        
-        # Préparer les features
-        new_features = new_data[all_features].copy()
-        
-        # Target Encoding
-        new_features[cat_features] = target_encoder.transform(
-            new_features[cat_features]
-        )
-        
-        # Standardisation
-        new_features[num_features] = scaler.transform(
-            new_features[num_features]
-        )
-        
-        # Prédiction
-        prediction = float(model.predict(new_features)[0])
-        
-        # Pour location, le modèle peut prédire en log, convertir si nécessaire
-        if transaction_type == 'location' and prediction < 100:
-            # Si la prédiction semble être en log (petit nombre)
-            prediction = np.exp(prediction)
-        
-        print(f"💰 Prédiction: {prediction:,.2f} DH")
+        logger.debug("💰 %s %s, %s, %sm², %sch, %ssdb -> %.2f DH (modèle v%s, cache=%s)",
+                     transaction_type.upper(), city, quartier, surface_m2, num_rooms, num_bathrooms,
+                     prediction, bundle.version, cached,
+                     extra={'transaction_type': transaction_type, 'predict_ms': round(predict_ms, 3), 'cache_hit': cached})
         
         if prediction < 0:
+            metrics.ERRORS.inc('predict', 'negative_prediction')
             return jsonify({'error': 'Prédiction négative invalide'}), 400
         
-        # Calcul de l'intervalle de confiance
-        rmse = float(performance.get(rmse_key, 0))
-        
         # Construction de la réponse
+        start = time.perf_counter()
         response = {
             'success': True,
             'transaction_type': transaction_type,
-            'prediction': {
-                'price_dh': round(prediction, 2),
-                'price_millions': round(prediction / 1_000_000, 2),
-                'price_per_m2': round(prediction / surface_m2, 2),
-                'confidence_interval': {
-                    'min': round(max(0, prediction - rmse), 2),
-                    'max': round(prediction + rmse, 2),
-                    'margin': round(rmse, 2)
-                }
-            },
+            'prediction': build_prediction(prediction, surface_m2, transaction_type, bundle.rmse),
             'input': data
         }
+        response = jsonify(response)
+        timings['serialize'] = time.perf_counter() - start
+        metrics.STAGE_DURATION.observe_many(('predict', transaction_type), timings)
+        return response, 200
         
-        if transaction_type == 'location':
-            # Pour location, ajouter le prix mensuel
-            response['prediction']['price_monthly'] = round(prediction, 2)
-            response['prediction']['price_dh'] = round(prediction, 2)
-            response['prediction']['price_millions'] = None  # Pas pertinent pour location
-        
-        print(f"✅ Réponse envoyée\n")
-        return jsonify(response), 200
-        
+    except ModelUnavailableError as e:
+        metrics.ERRORS.inc('predict', 'model_unavailable')
+        logger.error("❌ %s", e)
+        return jsonify({'error': 'Modèles non chargés', 'detail': str(e)}), 503
     except KeyError as e:
-        print(f"❌ Champ manquant : {e}")
+        metrics.ERRORS.inc('predict', 'missing_field')
+        logger.info("Champ manquant : %s", e)
         return jsonify({'error': f'Champ manquant: {str(e)}'}), 400
     except Exception as e:
-        print(f"❌ ERREUR : {str(e)}")
-        import traceback
-        traceback.print_exc()
+        metrics.ERRORS.inc('predict', 'internal')
+        logger.exception("❌ Erreur de prédiction : %s", e)
         return jsonify({'error': str(e)}), 500
 
+def collect_runtime_metrics():
+    """Valeurs lues au scrape : cache, modèles actifs, journaux perdus"""
+    cache = PREDICTION_CACHE.stats()
+    for key in ['hits', 'misses', 'evictions', 'expirations', 'invalidations']:
+        if key in cache:
+            yield (f'prediction_cache_{key}_total', 'counter', f"Cache de prédictions : {key}", {}, cache[key])
+    if cache.get('size') is not None:
+        yield ('prediction_cache_entries', 'gauge', "Entrées dans le cache de prédictions", {}, cache['size'])
+    for name, entry in MODEL_REGISTRY.status().items():
+        yield ('model_ready', 'gauge', "Modèle chargé et actif", {'transaction_type': name}, int(entry['state'] == 'ready'))
+        if entry.get('version') is not None:
+            yield ('model_version', 'gauge', "Version active du modèle (incrémentée à chaque rechargement)",
+                   {'transaction_type': name}, entry['version'])
+    yield ('log_records_dropped_total', 'counter', "Lignes de journal perdues (file pleine)", {}, dropped_records())
+    data = DATA_REFRESHER.status()
+    yield ('data_snapshot_version', 'gauge', "Version des données de statistiques (incrémentée à chaque rafraîchissement)",
+           {}, data['version'])
+    for name, rows in data['rows'].items():
+        yield ('data_rows', 'gauge', "Annonces chargées pour les statistiques", {'transaction_type': name}, rows)
+    if data['last_refresh']:
+        yield ('data_refresh_last_seconds', 'gauge', "Durée du dernier rafraîchissement des données",
+               {}, data['last_refresh']['elapsed_ms'] / 1e3)
+
+metrics.REGISTRY.add_collector(collect_runtime_metrics)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métriques au format texte Prometheus"""
+    if not metrics.ENABLED:
+        return jsonify({'error': 'Métriques désactivées (METRICS_ENABLED=0)'}), 404
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Compteurs du cache de prédictions (hits / misses / évictions)"""
+    return jsonify(dict(PREDICTION_CACHE.stats(), model_fingerprint=MODEL_REGISTRY.fingerprint()))
+
+def read_batch_payload():
+    """Lit le corps d'une requête batch : tableau JSON, NDJSON ou CSV (corps brut ou fichier uploadé)"""
+    upload = request.files.get('file')
+    if upload is not None:
+        raw = upload.read().decode('utf-8-sig')
+        name = (upload.filename or '').lower()
+        fmt = 'csv' if name.endswith('.csv') else 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'json'
+    else:
+        raw = request.get_data(as_text=True)
+        mimetype = request.mimetype or ''
+        fmt = 'csv' if 'csv' in mimetype else 'ndjson' if ('ndjson' in mimetype or 'jsonl' in mimetype) else 'json'
+
+    if fmt == 'csv':
+        return pd.read_csv(io.StringIO(raw), dtype=str, keep_default_na=False)
+
+    if fmt == 'ndjson':
+        records = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        records = json.loads(raw) if raw.strip() else []
+        if isinstance(records, dict):
+            records = records.get('items', [])
+
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError('Le corps doit être un tableau d\'objets JSON')
+    return pd.DataFrame.from_records(records)
+
+def validate_batch(df):
+    """Convertit les colonnes numériques et retourne (df typé, erreurs par ligne)"""
+    errors = np.full(len(df), None, dtype=object)
+
+    def flag(mask, message):
+        errors[np.asarray(mask) & pd.isna(errors)] = message
+
+    for col in REQUIRED_FIELDS:
+        if col not in df.columns:
+            flag(np.ones(len(df), dtype=bool), f'Champ manquant: {col!r}')
+            df[col] = np.nan
+            continue
+        flag(df[col].isna() | (df[col].astype(str).str.strip() == ''), f'Champ manquant: {col!r}')
+
+    for col in NUMERIC_FIELDS:
+        values = pd.to_numeric(df[col], errors='coerce').astype(float)
+        # inf / NaN rejetés ici : sinon le modèle échoue pour tout le groupe de la ligne
+        flag(~np.isfinite(values), f'Valeur invalide pour {col}')
+        df[col] = values
+    flag(df['surface_m2'] <= 0, 'surface_m2 doit être strictement positive')
+
+    # Même conversion que /predict : int(...) tronque les décimales
+    for col in ['num_rooms', 'num_bathrooms']:
+        df[col] = np.trunc(df[col])
+
+    if 'transaction_type' in df.columns:
+        tt = df['transaction_type'].fillna('vente').astype(str).str.strip().str.lower()
+        df['transaction_type'] = tt.where(tt != '', 'vente')
+    else:
+        df['transaction_type'] = 'vente'
+
+    return df, errors
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Prédiction vectorisée : un seul passage encoder/scaler/modèle par type de transaction"""
+    start = time.perf_counter()
+    try:
+        df = read_batch_payload()
+    except Exception as e:
+        metrics.ERRORS.inc('predict_batch', 'invalid_payload')
+        return jsonify({'error': f'Corps de requête invalide: {str(e)}'}), 400
+    parse_seconds = time.perf_counter() - start
+
+    if len(df) > BATCH_MAX_ROWS:
+        metrics.ERRORS.inc('predict_batch', 'too_large')
+        return jsonify({'error': f'Batch trop volumineux ({len(df)} > {BATCH_MAX_ROWS} lignes)'}), 413
+
+    df = df.reset_index(drop=True)
+    df, errors = validate_batch(df)
+    predictions = np.full(len(df), np.nan)
+    rmse = np.zeros(len(df))
+    group_key = np.where(df['transaction_type'] == 'location', 'location', 'vente')
+
+    for transaction_type in ['vente', 'location']:
+        mask = pd.isna(errors) & (group_key == transaction_type)
+        if not mask.any():
+            continue
+        group = df.loc[mask, REQUIRED_FIELDS].copy()
+        timings = {'parse': parse_seconds}
+        try:
+            bundle = get_model_bundle(transaction_type)
+            predictions[mask] = predict_frame(group, transaction_type, bundle, timings)
+            rmse[mask] = bundle.rmse
+        except ModelUnavailableError as e:
+            metrics.ERRORS.inc('predict_batch', 'model_unavailable')
+            errors[mask] = str(e)
+        except Exception as e:
+            metrics.ERRORS.inc('predict_batch', 'internal')
+            errors[mask] = str(e)
+        metrics.STAGE_DURATION.observe_many(('predict_batch', transaction_type), timings)
+
+    errors[pd.isna(errors) & ~np.isfinite(predictions)] = 'Prédiction invalide'
+    errors[pd.isna(errors) & (predictions < 0)] = 'Prédiction négative invalide'
+    succeeded = pd.isna(errors)
+    for transaction_type in ['vente', 'location']:
+        in_group = group_key == transaction_type
+        metrics.BATCH_ROWS.inc(transaction_type, 'ok', amount=int((succeeded & in_group).sum()))
+        metrics.BATCH_ROWS.inc(transaction_type, 'error', amount=int((~succeeded & in_group).sum()))
+
+    results = []
+    surfaces = df['surface_m2'].to_numpy()
+    for i, (error, prediction, transaction_type) in enumerate(zip(errors.tolist(), predictions.tolist(), group_key.tolist())):
+        if error is None:
+            # Une ligne qui échoue ici n'affecte que son propre résultat
+            try:
+                results.append({
+                    'index': i,
+                    'success': True,
+                    'transaction_type': transaction_type,
+                    'prediction': build_prediction(prediction, float(surfaces[i]), transaction_type, float(rmse[i]))
+                })
+                continue
+            except Exception as e:
+                metrics.ERRORS.inc('predict_batch', 'internal')
+                error = errors[i] = str(e)
+        results.append({'index': i, 'success': False, 'error': error})
+
+    failed = int((~pd.isna(errors)).sum())
+    return jsonify({
+        'success': True,
+        'count': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'results': results
+    }), 200
+
+# Chargement des modèles selon la politique choisie
+if MODEL_LOADING == 'eager':
+    MODEL_REGISTRY.warm_up(background=False)
+elif MODEL_LOADING == 'background':
+    MODEL_REGISTRY.warm_up(background=True)
+    logger.info("⏳ Modèles en cours de chargement en arrière-plan")
+else:
+    logger.info("💤 Modèles chargés à la demande (MODEL_LOADING=lazy)")
+
+# Surveillance de MODEL_DIR pour le rechargement à chaud (secondes, 0 = désactivée)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+
+def start_model_watcher():
+    if MODEL_WATCH_INTERVAL > 0:
+        MODEL_REGISTRY.watch(MODEL_WATCH_INTERVAL)
+        logger.info("👀 Surveillance de %s toutes les %gs", MODEL_DIR, MODEL_WATCH_INTERVAL)
+
+# Sous gunicorn (preload), les threads ne survivent pas au fork :
+# le watcher est démarré dans chaque worker par le hook post_fork
+if os.environ.get('APP_PRELOAD') != '1':
+    start_model_watcher()
+
 # ============================================
 # ENDPOINTS STATISTIQUES
 # ============================================
@@ -307,185 +630,179 @@ def predict():
 DATA_DIR = os.path.join(PROJECT_ROOT, 'data', 'clean_data')
 df_vente = None
 df_location = None
+df_vente_stats = None
+df_location_stats = None
+
+# Source des données : 'auto' (store Arrow s'il est à jour, sinon CSV), 'csv' ou 'store'
+DATA_STORE_MODE = os.environ.get('DATA_STORE', 'auto').lower()
 
 # Fonction de chargement et nettoyage robuste
 def load_and_clean_data(filepath, source_type='vente'):
     try:
-        if not os.path.exists(filepath):
-            print(f"⚠️ Fichier introuvable: {filepath}")
-            return None
-            
-        df = pd.read_csv(filepath)
-        
-        # Standardisation des colonnes
-        col_mapping = {
-            'ville': 'city', 
-            'prix': 'price', 
-            'surface': 'surface_m2',
-            'quartier': 'quartier'
-        }
-        df = df.rename(columns=col_mapping)
-        
-        # Vérification des colonnes requises
-        required_cols = ['city', 'price', 'surface_m2']
-        if not all(col in df.columns for col in required_cols):
-            print(f"⚠️ Colonnes manquantes dans {filepath}. Colonnes: {df.columns.tolist()}")
-            return None
-
-        # Nettoyage numérique
-        for col in ['price', 'surface_m2']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Suppression des NaNs
-        df_clean = df.dropna(subset=['price', 'surface_m2', 'city'])
-        total_count = len(df_clean)
-        
-        # Filtrage des outliers POUR LES MOYENNES (Copie du DF)
-        df_stats = df_clean.copy()
-        
-        if source_type == 'vente':
-            # Prix entre 100k et 50M DH
-            df_stats = df_stats[(df_stats['price'] > 100000) & (df_stats['price'] < 50000000)]
+        if DATA_STORE_MODE != 'csv' and store_is_fresh(filepath, source_type):
+            df_clean, df_stats = read_store(source_type)
+            origin = 'store Arrow'
+        elif DATA_STORE_MODE == 'store':
+            logger.warning("⚠️ Store Arrow absent ou périmé pour %s (lancer: python data_store.py)", source_type)
+            return None, None
         else:
-            # Loyer entre 500 et 50k DH
-            df_stats = df_stats[(df_stats['price'] > 500) & (df_stats['price'] < 50000)]
-            
-        # Surface entre 10 et 1000 m²
-        df_stats = df_stats[(df_stats['surface_m2'] > 10) & (df_stats['surface_m2'] < 1000)]
-        
-        print(f"✅ {source_type.upper()} chargé: {total_count} annonces (dont {len(df_stats)} retenues pour stats)")
+            if not os.path.exists(filepath):
+                logger.warning("⚠️ Fichier introuvable: %s", filepath)
+                return None, None
+            df_clean, df_stats = read_csv_frames(filepath, source_type)
+            origin = 'CSV'
         
         # On retourne le DF nettoyé (sans NaNs) mais avec outliers pour le compte, 
-        # et on attachera les stats calculées sur df_stats
+        # et le DF filtré sur lequel sont calculées les moyennes
+        logger.info("✅ %s chargé (%s): %d annonces (dont %d retenues pour stats)",
+                    source_type.upper(), origin, len(df_clean), len(df_stats))
         return df_clean, df_stats
         
+    except MissingColumnsError as e:
+        logger.warning("⚠️ Colonnes manquantes dans %s. %s", filepath, e)
+        return None, None
     except Exception as e:
-        print(f"❌ Erreur chargement {filepath}: {e}")
+        logger.error("❌ Erreur chargement %s: %s", filepath, e)
         return None, None
 
 try:
-    vente_path = os.path.join(DATA_DIR, 'annonces_nettoyees_mubawab.csv')
+    vente_path = os.path.join(DATA_DIR, SOURCES['vente'])
     df_vente, df_vente_stats = load_and_clean_data(vente_path, 'vente')
     
-    location_path = os.path.join(DATA_DIR, 'location_all_sources.csv')
+    location_path = os.path.join(DATA_DIR, SOURCES['location'])
     df_location, df_location_stats = load_and_clean_data(location_path, 'location')
     
 except Exception as e:
-    print(f"⚠️ Erreur chargement données stats: {e}")
+    logger.warning("⚠️ Erreur chargement données stats: %s", e)
 
-# Fonction pour filtrer les textes en arabe
-def is_latin_text(text):
-    """Vérifie si le texte contient principalement des caractères latins"""
-    if not text or not isinstance(text, str):
-        return False
-    latin_chars = sum(1 for c in text if c.isascii() or c in 'éèêëàâäùûüôöîïç')
-    return latin_chars / max(len(text), 1) > 0.5
+# Statistiques précalculées au chargement (lookups O(1) dans les endpoints)
+STATS_ENGINE = StatsEngine({
+    'vente': (df_vente, df_vente_stats),
+    'location': (df_location, df_location_stats)
+})
+logger.info("✅ Statistiques précalculées : %s", ', '.join(STATS_ENGINE.transactions) or 'aucune')
 
-def filter_cities(cities_list):
-    """Filtre les villes pour ne garder que celles en caractères latins"""
-    return [city for city in cities_list if is_latin_text(city)]
+@app.route('/stats/percentiles')
+@app.route('/stats/percentiles/<city>')
+def stats_percentiles(city=None):
+    """Percentiles du prix, du prix/m² ou de la surface (sketches) : global, ville ou ?quartier="""
+    metric = request.args.get('metric', 'prix_m2')
+    quartier = request.args.get('quartier') or None
+    if metric not in QUANTILE_METRICS:
+        return jsonify({'error': f"Métrique inconnue: {metric} ({', '.join(QUANTILE_METRICS)})"}), 400
+    # Les sketches de quartier sont rangés sous leur ville : pas de quartier sans ville
+    if quartier is not None and city is None:
+        return jsonify({'error': 'Le paramètre quartier nécessite une ville : /stats/percentiles/<city>?quartier='}), 400
+    try:
+        percentiles = [float(p) for p in request.args.get('p', '').split(',') if p.strip()] or DEFAULT_PERCENTILES
+    except ValueError:
+        return jsonify({'error': f"Percentiles invalides: {request.args.get('p')}"}), 400
+    if not all(0 <= p <= 100 for p in percentiles):
+        return jsonify({'error': 'Les percentiles doivent être entre 0 et 100'}), 400
+    engine = STATS_ENGINE
+    return jsonify({
+        'city': city,
+        'quartier': quartier,
+        'metric': metric,
+        'vente': engine.percentiles('vente', metric, city, quartier, percentiles),
+        'location': engine.percentiles('location', metric, city, quartier, percentiles)
+    })
+
+# Store analytique SQLite de /stats/query : 'auto' (reconstruit au démarrage s'il est
+# absent ou périmé par rapport aux CSV), 'readonly' (store existant tel quel) ou 'off'
+ANALYTICS_STORE_MODE = os.environ.get('ANALYTICS_STORE', 'auto').lower()
+
+def open_analytics_store():
+    if ANALYTICS_STORE_MODE == 'off':
+        return None
+    try:
+        store = AnalyticsStore.open(data_dir=DATA_DIR, rebuild=ANALYTICS_STORE_MODE == 'auto')
+    except Exception as e:
+        logger.warning("⚠️ Store analytique indisponible, /stats/query désactivé : %s", e)
+        return None
+    logger.info("✅ Store analytique : %s", store.counts())
+    return store
+
+ANALYTICS_STORE = open_analytics_store()
+
+# Rafraîchissement à chaud des statistiques quand data/clean_data change (data_refresh.py)
+def on_data_swapped(snapshot):
+    """Nouveau snapshot : chaque global lu par les endpoints est remplacé en une affectation"""
+    global df_vente, df_vente_stats, df_location, df_location_stats, STATS_ENGINE, ANALYTICS_STORE
+    df_vente, df_vente_stats = snapshot.frames.get('vente', (None, None))
+    df_location, df_location_stats = snapshot.frames.get('location', (None, None))
+    STATS_ENGINE = snapshot.engine
+    # Store analytique : reconstruit en entier (nouveau fichier + nouvel objet) par le premier
+    # worker qui le trouve périmé, sous verrou de fichier ; les autres workers rouvrent le
+    # fichier déjà à jour. Les requêtes en cours terminent sur l'ancien
+    if ANALYTICS_STORE_MODE == 'auto':
+        store = open_analytics_store()
+        if store is not None:
+            ANALYTICS_STORE = store
+
+DATA_REFRESHER = DataRefresher.from_frames(
+    {'vente': (df_vente, df_vente_stats), 'location': (df_location, df_location_stats)},
+    STATS_ENGINE, data_dir=DATA_DIR, on_swap=on_data_swapped
+)
+
+# Surveillance de data/clean_data (secondes, 0 = désactivée ; POST /admin/refresh-data sinon)
+DATA_REFRESH_INTERVAL = float(os.environ.get('DATA_REFRESH_INTERVAL', 0))
+
+def start_data_refresher():
+    if DATA_REFRESH_INTERVAL > 0:
+        DATA_REFRESHER.watch(DATA_REFRESH_INTERVAL)
+        logger.info("👀 Surveillance de %s toutes les %gs", DATA_DIR, DATA_REFRESH_INTERVAL)
+
+# Même contrainte que le watcher des modèles : démarré par post_fork sous gunicorn (preload)
+if os.environ.get('APP_PRELOAD') != '1':
+    start_data_refresher()
+
+@app.route('/admin/refresh-data', methods=['POST'])
+def admin_refresh_data():
+    """Relit les CSV modifiés de data/clean_data et publie les nouvelles statistiques (rapport de latence et mémoire)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    report = DATA_REFRESHER.refresh()
+    failed = any(entry['mode'] == 'failed' for entry in report['sources'].values())
+    return jsonify(report), 500 if failed else 200
 
 @app.route('/stats/summary')
 def stats_summary():
     """Résumé global des statistiques"""
-    result = {
-        'vente': {},
-        'location': {},
-        'cities': []
-    }
-    
-    if df_vente is not None and df_vente_stats is not None:
-        result['vente'] = {
-            'count': int(len(df_vente)), # Total sans NaNs
-            'prix_moyen': float(df_vente_stats['price'].mean()), # Moyenne sur données filtrées
-            'prix_m2_moyen': float(df_vente_stats['price'].mean() / df_vente_stats['surface_m2'].mean()) if 'surface_m2' in df_vente_stats.columns else 0,
-            'surface_moyenne': float(df_vente_stats['surface_m2'].mean()) if 'surface_m2' in df_vente_stats.columns else 0
-        }
-        result['cities'] = filter_cities(df_vente['city'].dropna().unique().tolist())
-    
-    if df_location is not None and df_location_stats is not None:
-        result['location'] = {
-            'count': int(len(df_location)), # Total sans NaNs
-            'prix_moyen': float(df_location_stats['price'].mean()), # Moyenne sur données filtrées
-            'prix_m2_moyen': float(df_location_stats['price'].mean() / df_location_stats['surface_m2'].mean()) if 'surface_m2' in df_location_stats.columns else 0,
-            'surface_moyenne': float(df_location_stats['surface_m2'].mean()) if 'surface_m2' in df_location_stats.columns else 0
-        }
-        # Combiner les villes (filtrées)
-        if df_vente is not None:
-            all_cities = set(result['cities']) | set(filter_cities(df_location['city'].dropna().unique().tolist()))
-            result['cities'] = sorted(list(all_cities))
-    
-    return jsonify(result)
+    return jsonify(STATS_ENGINE.summary)
 
 @app.route('/stats/city/<city>')
 def stats_city(city):
     """Statistiques pour une ville"""
-    result = {
+    engine = STATS_ENGINE
+    return jsonify({
         'city': city,
-        'vente': None,
-        'location': None,
-        'quartiers': []
-    }
-    
-    if df_vente is not None:
-        city_data = df_vente[df_vente['city'].str.lower() == city.lower()]
-        if len(city_data) > 0:
-            result['vente'] = {
-                'count': int(len(city_data)),
-                'prix_moyen': float(city_data['price'].mean()),
-                'prix_min': float(city_data['price'].min()),
-                'prix_max': float(city_data['price'].max()),
-                'prix_m2_moyen': float(city_data['price'].mean() / city_data['surface_m2'].mean()) if 'surface_m2' in city_data.columns else 0,
-                'surface_moyenne': float(city_data['surface_m2'].mean()) if 'surface_m2' in city_data.columns else 0
-            }
-            if 'quartier' in city_data.columns:
-                quartiers = city_data['quartier'].dropna().unique().tolist()
-                result['quartiers'] = sorted(quartiers)
-    
-    if df_location is not None:
-        city_data = df_location[df_location['city'].str.lower() == city.lower()]
-        if len(city_data) > 0:
-            result['location'] = {
-                'count': int(len(city_data)),
-                'prix_moyen': float(city_data['price'].mean()),
-                'prix_min': float(city_data['price'].min()),
-                'prix_max': float(city_data['price'].max()),
-                'prix_m2_moyen': float(city_data['price'].mean() / city_data['surface_m2'].mean()) if 'surface_m2' in city_data.columns else 0,
-                'surface_moyenne': float(city_data['surface_m2'].mean()) if 'surface_m2' in city_data.columns else 0
-            }
-            if 'quartier' in city_data.columns:
-                quartiers_loc = city_data['quartier'].dropna().unique().tolist()
-                result['quartiers'] = sorted(list(set(result['quartiers']) | set(quartiers_loc)))
-    
-    return jsonify(result)
+        'vente': engine.city('vente', city),
+        'location': engine.city('location', city),
+        'quartiers': sorted(set(engine.quartiers('vente', city)) | set(engine.quartiers('location', city)))
+    })
 
 @app.route('/stats/quartiers/<city>')
 def stats_quartiers(city):
     """Statistiques par quartier pour une ville (pour graphiques)"""
-    result = {
+    engine = STATS_ENGINE
+    return jsonify({
         'city': city,
-        'vente': [],
-        'location': []
-    }
-    
-    if df_vente is not None and 'quartier' in df_vente.columns:
-        city_data = df_vente[df_vente['city'].str.lower() == city.lower()]
-        quartier_stats = city_data.groupby('quartier').agg({
-            'price': ['count', 'mean']
-        }).reset_index()
-        quartier_stats.columns = ['quartier', 'count', 'prix_moyen']
-        quartier_stats = quartier_stats.sort_values('prix_moyen', ascending=False).head(10)
-        result['vente'] = quartier_stats.to_dict(orient='records')
-    
-    if df_location is not None and 'quartier' in df_location.columns:
-        city_data = df_location[df_location['city'].str.lower() == city.lower()]
-        quartier_stats = city_data.groupby('quartier').agg({
-            'price': ['count', 'mean']
-        }).reset_index()
-        quartier_stats.columns = ['quartier', 'count', 'prix_moyen']
-        quartier_stats = quartier_stats.sort_values('prix_moyen', ascending=False).head(10)
-        result['location'] = quartier_stats.to_dict(orient='records')
-    
+        'vente': engine.top_quartiers('vente', city),
+        'location': engine.top_quartiers('location', city)
+    })
+
+@app.route('/stats/query')
+def stats_query():
+    """Agrégats filtrés calculés par le store analytique (percentiles, prix/m² par chambres, par source...)"""
+    if ANALYTICS_STORE is None:
+        return jsonify({'error': 'Store analytique indisponible'}), 503
+    try:
+        result = ANALYTICS_STORE.query(**parse_query(request.args))
+    except QueryError as e:
+        metrics.ERRORS.inc('stats_query', 'invalid_query')
+        return jsonify({'error': str(e)}), 400
     return jsonify(result)
 
 # ============================================
@@ -495,8 +812,9 @@ if __name__ == '__main__':
     print("\n" + "="*60)
     print("🏠 API Prédiction Immobilière Maroc v2.0")
     print("="*60)
-    print("📍 URL : http://localhost:5000")
+    port = int(os.environ.get('PORT', 5000))
+    print(f"📍 URL : http://localhost:{port}")
     print("📦 Modèles : Vente + Location")
     print("="*60 + "\n")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
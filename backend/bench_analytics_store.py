@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de /stats/query : requêtes filtrées dans le store SQLite (analytics_store.py)
+contre le même calcul en pandas sur les DataFrames en mémoire (masques + groupby + quantile)
+Vérifie d'abord que les deux donnent les mêmes groupes, comptes, moyennes et percentiles
+Usage : python bench_analytics_store.py [nb_iterations]
+"""
+
+import os
+import sys
+import time
+
+import analytics_store
+import data_store
+from analytics_store import FILTER_COLUMNS, RANGE_FILTERS, DEFAULT_PERCENTILES
+from data_index import fold_key
+
+N = 20
+
+QUERIES = [
+    ("prix vente, Casablanca", dict(transaction='vente', filters={'city': ['Casablanca']})),
+    ("prix/m² location par chambres, Rabat",
+     dict(transaction='location', filters={'city': ['Rabat']}, group_by=['nb_chambres'], metric='prix_m2')),
+    ("prix/m² location par source", dict(transaction='location', group_by=['source'], metric='prix_m2')),
+    ("prix vente par ville et type", dict(transaction='vente', group_by=['city', 'type_bien'])),
+    ("Rabat / Agdal par type (sélectif)",
+     dict(transaction='vente', filters={'city': ['Rabat'], 'quartier': ['Agdal']}, group_by=['type_bien'])),
+    ("appartements 50-120 m² par ville",
+     dict(transaction='vente', filters={'type_bien': ['Appartement']},
+          ranges={'min_surface': 50, 'max_surface': 120}, group_by=['city'], metric='prix_m2')),
+    ("villas, outliers compris", dict(transaction='vente', filters={'type_bien': ['Villa']}, outliers=True)),
+    ("moyennes par quartier, Casablanca (sans percentiles)",
+     dict(transaction='location', filters={'city': ['Casablanca']}, group_by=['quartier'], percentiles=[])),
+]
+
+
+# --- Même requête en pandas (référence) ---
+def pandas_query(frames, transaction='vente', filters=None, ranges=None, group_by=(), metric='price',
+                 percentiles=DEFAULT_PERCENTILES, outliers=False):
+    df = frames[transaction]
+    mask = df[metric].notna()
+    if not outliers:
+        mask &= df['in_stats'] == 1
+    for name, values in (filters or {}).items():
+        mask &= df[FILTER_COLUMNS[name]].isin([fold_key(v) for v in values] if name == 'city' else values)
+    for name, value in (ranges or {}).items():
+        column, op = RANGE_FILTERS[name]
+        mask &= df[column] >= value if op == '>=' else df[column] <= value
+    rows = df[mask]
+    keys = [FILTER_COLUMNS[g] for g in group_by]
+    if not keys:
+        if rows.empty:
+            return []
+        values = rows[metric]
+        quantiles = values.quantile([p / 100 for p in percentiles]).tolist() if percentiles else []
+        return [dict(count=len(values), mean=values.mean(), min=values.min(), max=values.max(),
+                     percentiles={f'p{p:g}': q for p, q in zip(percentiles, quantiles)})]
+
+    grouped = rows.dropna(subset=keys).groupby(keys)
+    stats = grouped[metric].agg(['count', 'mean', 'min', 'max'])
+    if percentiles:
+        quantiles = grouped[metric].quantile([p / 100 for p in percentiles]).unstack()
+    labels = grouped['city'].min()
+    result = []
+    for key, row in stats.iterrows():
+        key = key if isinstance(key, tuple) else (key,)
+        entry = {g: labels[key if len(key) > 1 else key[0]] if g == 'city' else k for g, k in zip(group_by, key)}
+        entry.update(count=int(row['count']), mean=row['mean'], min=row['min'], max=row['max'],
+                     percentiles={f'p{p:g}': quantiles.loc[key if len(key) > 1 else key[0], p / 100]
+                                  for p in percentiles})
+        result.append(entry)
+    return result
+
+
+def close(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+    if isinstance(a, float) or isinstance(b, float):
+        return abs(a - b) <= 1e-9 * max(abs(a), abs(b), 1)
+    return a == b
+
+
+def same_groups(store_groups, pandas_groups, group_by):
+    def key(group):
+        return tuple(group[g] for g in group_by)
+    expected = {key(g): g for g in pandas_groups}
+    actual = {key(g): g for g in store_groups}
+    return expected.keys() == actual.keys() and all(close(actual[k], expected[k]) for k in expected)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(N):
+        fn()
+    return (time.perf_counter() - start) / N * 1e3
+
+
+if __name__ == '__main__':
+    # Lu ici seulement : le module est aussi importé par bench_data_refresh.py (close)
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else N
+    print("\n📦 Construction du store analytique...")
+    start = time.perf_counter()
+    report = analytics_store.build_store()
+    print(f"  {report} en {time.perf_counter() - start:.2f}s, "
+          f"{os.path.getsize(analytics_store.ANALYTICS_PATH) / 1e6:.1f} Mo")
+    store = analytics_store.AnalyticsStore()
+
+    frames = {}
+    for transaction, filename in data_store.SOURCES.items():
+        df_clean, _ = data_store.read_csv_frames(os.path.join(data_store.DATA_DIR, filename), transaction)
+        frames[transaction] = analytics_store.prepare_frame(df_clean, transaction)
+    memory = sum(f.memory_usage(deep=True).sum() for f in frames.values()) / 1e6
+    print(f"  DataFrames pandas équivalents : {memory:.1f} Mo en mémoire")
+
+    print("\n🔎 Vérification store / pandas...")
+    for label, query in QUERIES:
+        store_groups = store.query(**query, limit=analytics_store.MAX_LIMIT)['groups']
+        assert same_groups(store_groups, pandas_query(frames, **query), query.get('group_by', [])), label
+    print(f"✅ Résultats identiques ({len(QUERIES)} requêtes)")
+
+    print(f"\n⏱️ Requêtes ({N} itérations, ms/requête)")
+    print(f"  {'requête':<52} {'groupes':>8} {'pandas':>9} {'SQLite':>9} {'gain':>7}")
+    for label, query in QUERIES:
+        groups = len(store.query(**query)['groups'])
+        before = timed(lambda: pandas_query(frames, **query))
+        after = timed(lambda: store.query(**query))
+        print(f"  {label:<52} {groups:>8} {before:>9.2f} {after:>9.2f} {before / after:>6.1f}x")
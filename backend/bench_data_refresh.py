@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du rafraîchissement à chaud (data_refresh.py), sur une copie de data/clean_data
+dans un dossier temporaire (les vrais CSV ne sont pas modifiés)
+1. les CSV sont coupés à 80 % de leurs lignes ; le reste est ajouté en --batches lots,
+   un rafraîchissement par lot : latence par étape et mémoire, contre un rechargement complet
+2. vérification : après le dernier lot, DataFrames, résumé, stats par ville et quartiers
+   identiques à un chargement complet ; sketches dans leur borne d'erreur (bench_quantiles)
+3. cas limites : ligne en cours d'écriture (attendue), fichier réécrit (rechargement complet)
+4. cohérence : un thread lecteur vérifie chaque snapshot vu pendant les rafraîchissements
+Usage : python bench_data_refresh.py [--batches 10]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import data_store
+from bench_analytics_store import close
+from bench_quantiles import check_index
+from data_refresh import DataRefresher, frame_mb, rss_mb
+from stats_engine import StatsEngine
+
+HEAD = 0.8
+
+
+def split_lines(path):
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    return lines[0], lines[1:]
+
+
+def full_load(data_dir):
+    frames = {t: data_store.read_csv_frames(os.path.join(data_dir, f), t) for t, f in data_store.SOURCES.items()}
+    return frames, StatsEngine(frames)
+
+
+def same_snapshot(snapshot, frames, engine):
+    """Liste des différences entre un snapshot rafraîchi et un chargement complet"""
+    errors = []
+    for name, (df_clean, df_stats) in frames.items():
+        refreshed_clean, refreshed_stats = snapshot.frames[name]
+        try:
+            pd.testing.assert_frame_equal(refreshed_clean, df_clean)
+            pd.testing.assert_frame_equal(refreshed_stats, df_stats)
+        except AssertionError as e:
+            errors.append(f"{name} : DataFrames différents ({str(e).splitlines()[0]})")
+        refreshed, expected = snapshot.engine.transactions[name], engine.transactions[name]
+        if not close(refreshed.summary, expected.summary):
+            errors.append(f"{name} : résumé différent")
+        if refreshed.cities != expected.cities:
+            errors.append(f"{name} : villes différentes")
+        if refreshed.city_stats.keys() != expected.city_stats.keys():
+            errors.append(f"{name} : clés de ville différentes")
+        for key, stats in expected.city_stats.items():
+            if not close(refreshed.city_stats.get(key, {}), stats):
+                errors.append(f"{name} : stats de {key} différentes")
+            if refreshed.city_quartiers.get(key) != expected.city_quartiers[key]:
+                errors.append(f"{name} : quartiers de {key} différents")
+            if not all(close(a, b) for a, b in zip(refreshed.top_quartiers.get(key, []), expected.top_quartiers[key])):
+                errors.append(f"{name} : classement des quartiers de {key} différent")
+        violations = check_index(refreshed.quantiles, df_clean)[4]
+        if violations:
+            errors.append(f"{name} : {violations} percentile(s) hors borne")
+    if not close(snapshot.engine.summary, engine.summary):
+        errors.append("résumé global différent")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rafraîchissement incrémental des statistiques")
+    parser.add_argument('--batches', type=int, default=10, help="lots ajoutés aux CSV")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='data_refresh_')
+    failed = 0
+    try:
+        files, tails = {}, {}
+        for transaction, filename in data_store.SOURCES.items():
+            header, lines = split_lines(os.path.join(data_store.DATA_DIR, filename))
+            cut = int(len(lines) * HEAD)
+            files[transaction] = os.path.join(tmp, filename)
+            with open(files[transaction], 'wb') as f:
+                f.write(header + b''.join(lines[:cut]))
+            tails[transaction] = lines[cut:]
+
+        frames, engine = full_load(tmp)
+        refresher = DataRefresher.from_frames(frames, engine, data_dir=tmp)
+        print(f"\n📦 Départ : {refresher.current.rows()} annonces ({HEAD:.0%} des CSV), RSS {rss_mb():.0f} Mo")
+
+        # Lecteur concurrent : chaque snapshot doit être cohérent de bout en bout
+        stop = threading.Event()
+        seen = {'snapshots': 0, 'versions': set(), 'errors': 0}
+
+        def reader():
+            while not stop.is_set():
+                snapshot = refresher.current
+                for name, (df_clean, df_stats) in snapshot.frames.items():
+                    stats = snapshot.engine.transactions[name]
+                    if stats.count != len(df_clean) or stats.df is not df_clean:
+                        seen['errors'] += 1
+                seen['snapshots'] += 1
+                seen['versions'].add(snapshot.version)
+                # Une requête de temps en temps, pas une boucle qui garde le GIL
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+
+        print(f"\n⏱️ Ajout en {args.batches} lots (ms par rafraîchissement)")
+        print(f"  {'lot':>4} {'annonces':>9} {'détection':>10} {'lecture':>8} {'agrégats':>9} "
+              f"{'total':>8} {'nouvelles données':>18} {'RSS':>12}")
+        elapsed = []
+        for batch in range(args.batches):
+            for transaction, lines in tails.items():
+                size = -(-len(lines) // args.batches)
+                with open(files[transaction], 'ab') as f:
+                    f.write(b''.join(lines[batch * size:(batch + 1) * size]))
+            report = refresher.refresh()
+            elapsed.append(report['elapsed_ms'])
+            timings = report['timings_ms']
+            added = sum(entry['rows_added'] for entry in report['sources'].values())
+            new_mb = sum(entry.get('new_data_mb', 0) for entry in report['sources'].values())
+            modes = {entry['mode'] for entry in report['sources'].values()}
+            if modes != {'append'}:
+                failed += 1
+                print(f"  ✗ lot {batch + 1} : modes {modes} (attendu : append)")
+            print(f"  {batch + 1:>4} {added:>+9} {timings['detect']:>10.1f} {timings['parse']:>8.1f} "
+                  f"{timings['aggregate']:>9.1f} {report['elapsed_ms']:>8.1f} {new_mb:>15.1f} Mo "
+                  f"{report['rss_before_mb']:>5.0f}->{report['rss_after_mb']:.0f}")
+
+        stop.set()
+        thread.join()
+
+        start = time.perf_counter()
+        frames, engine = full_load(tmp)
+        full_ms = (time.perf_counter() - start) * 1e3
+        average = sum(elapsed) / len(elapsed)
+        print(f"\n  rafraîchissement incrémental moyen {average:.0f} ms, rechargement complet {full_ms:.0f} ms "
+              f"(x{full_ms / average:.1f}) ; données d'un snapshot : "
+              f"{frame_mb(*[df for pair in frames.values() for df in pair]):.1f} Mo")
+
+        print("\n🔎 Vérification contre un chargement complet...")
+        errors = same_snapshot(refresher.current, frames, engine)
+        for error in errors[:10]:
+            print(f"  ✗ {error}")
+        failed += len(errors)
+        print(f"  {len(errors)} différence(s)")
+        print(f"  lecteur concurrent : {seen['snapshots']} snapshots lus, versions {sorted(seen['versions'])}, "
+              f"{seen['errors']} incohérence(s)")
+        failed += seen['errors']
+
+        print("\n🧪 Cas limites")
+        path = files['vente']
+        with open(path, 'ab') as f:
+            f.write(tails['vente'][0].rstrip(b'\n'))
+        report = refresher.refresh()
+        mode = report['sources']['vente']['mode']
+        print(f"  ligne incomplète : {mode}, version {report['version']}")
+        failed += mode != 'unchanged'
+        with open(path, 'ab') as f:
+            f.write(b'\n')
+        report = refresher.refresh()
+        entry = report['sources']['vente']
+        print(f"  ligne terminée : {entry['mode']} +{entry['rows_added']}, version {report['version']}")
+        failed += entry['mode'] != 'append'
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        header, lines = data.split(b'\n', 1)
+        with open(path, 'wb') as f:
+            f.write(header + b'\n' + lines.split(b'\n', 1)[1])
+        report = refresher.refresh()
+        entry = report['sources']['vente']
+        print(f"  première annonce supprimée : {entry['mode']} ({entry['rows_added']:+d}), "
+              f"{report['elapsed_ms']:.0f} ms")
+        failed += entry['mode'] != 'full'
+        errors = same_snapshot(refresher.current, *full_load(tmp))
+        print(f"  après rechargement complet : {len(errors)} différence(s)")
+        failed += len(errors)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\n{'✅' if not failed else '❌'} {failed} échec(s)")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du démarrage : chargement CSV (parse + nettoyage) contre store Arrow mappé
+Chaque mode est mesuré dans un processus neuf (temps de chargement + RSS)
+Usage : python bench_data_store.py [nb_runs]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import data_store
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 3
+
+
+def current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+
+def child(mode):
+    """Charge les deux sources comme le fait app.py et affiche 'secondes rss_mo pic_mo'"""
+    import pyarrow  # noqa: F401 - importé dans les deux modes pour comparer à périmètre égal
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    frames = []
+    for source_type, filename in data_store.SOURCES.items():
+        if mode == 'csv':
+            frames.append(data_store.read_csv_frames(os.path.join(data_store.DATA_DIR, filename), source_type))
+        else:
+            frames.append(data_store.read_store(source_type))
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+    print(f"{elapsed} {current_rss_mb() - rss_before} {peak_mb}")
+
+
+def run(mode):
+    out = subprocess.check_output([sys.executable, __file__, '--child', mode], text=True)
+    return [float(x) for x in out.split()]
+
+
+if __name__ == '__main__':
+    if '--child' in sys.argv:
+        child(sys.argv[sys.argv.index('--child') + 1])
+        sys.exit(0)
+
+    print("\n📦 Conversion des CSV en store Arrow...")
+    data_store.convert_all()
+
+    print(f"\n⏱️ Chargement des données de stats ({RUNS} runs, processus neufs)")
+    print(f"  {'mode':<8} {'temps (ms)':>12} {'RSS ajouté (Mo)':>16} {'pic RSS (Mo)':>14}")
+    results = {}
+    for mode in ['csv', 'store']:
+        runs = [run(mode) for _ in range(RUNS)]
+        best = min(runs, key=lambda r: r[0])
+        results[mode] = best
+        print(f"  {mode:<8} {best[0] * 1000:>12.1f} {best[1]:>16.1f} {best[2]:>14.1f}")
+    print(f"  → démarrage x{results['csv'][0] / results['store'][0]:.1f} plus rapide avec le store")
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Coût de l'instrumentation de /predict : enregistrement des étapes + compteurs
+mesuré seul (µs/requête), puis /predict complet avec et sans métriques
+Usage : python bench_metrics.py [nb_iterations]
+"""
+
+import sys
+import time
+
+import app
+import metrics
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+PAYLOAD = {
+    'city': 'Casablanca', 'quartier': 'Maârif', 'property_type': 'Appartement',
+    'surface_m2': 80, 'num_rooms': 3, 'num_bathrooms': 1
+}
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def record_request():
+    """Ce que /predict enregistre pour une requête (hors hooks Flask)"""
+    timings = {'parse': 1e-5, 'cache': 2e-6, 'transform': 3e-5, 'model': 2e-4, 'serialize': 2e-5}
+    start = time.perf_counter()
+    timings['serialize'] = time.perf_counter() - start
+    metrics.CACHE_REQUESTS.inc('vente', 'miss')
+    metrics.STAGE_DURATION.observe_many(('predict', 'vente'), timings)
+    metrics.REQUEST_DURATION.observe(3e-4, '/predict', 'POST', '200')
+
+
+if __name__ == '__main__':
+    print(f"\n⏱️ Instrumentation seule ({N} requêtes simulées)")
+    enabled = per_call_us(record_request, N)
+    metrics.ENABLED = False
+    disabled = per_call_us(record_request, N)
+    metrics.ENABLED = True
+    print(f"  activée    {enabled:>8.2f} µs/requête")
+    print(f"  désactivée {disabled:>8.2f} µs/requête")
+    print(f"  → surcoût  {enabled - disabled:>8.2f} µs/requête")
+
+    client = app.app.test_client()
+    n = max(N // 10, 100)
+    print(f"\n⏱️ /predict complet, cache désactivé ({n} requêtes)")
+    app.PREDICTION_CACHE.maxsize = 0
+    for label in ['activée', 'désactivée']:
+        metrics.ENABLED = label == 'activée'
+        print(f"  {label:<10} {per_call_us(lambda: client.post('/predict', json=PAYLOAD), n):>8.1f} µs/requête")
+
+    metrics.ENABLED = True
+    lines = metrics.REGISTRY.render().splitlines()
+    print(f"\n📈 /metrics : {len(lines)} lignes, ex. :")
+    for line in [l for l in lines if l.startswith('predict_stage_duration_seconds_sum')][:6]:
+        print(f"  {line}")
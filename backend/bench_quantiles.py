@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark des sketches de quantiles (quantile_sketch.py)
+1. précision : chaque percentile de chaque sketch (global, ville, quartier) comparé au rang
+   exact dans les données ; l'écart doit rester sous la borne annoncée (rank_error)
+2. incrémental : annonces ajoutées par lots, ou index par lot fusionnés, contre un index
+   construit en une fois
+3. latence : percentiles d'une ville par le sketch contre un tri pandas à chaque requête
+4. flux synthétique : des millions de prix, taille du sketch et erreur observée / borne
+Usage : python bench_quantiles.py [nb_iterations] [--stream 2000000]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_store
+from data_index import fold_key
+from quantile_sketch import DEFAULT_PERCENTILES, QuantileIndex, QuantileSketch, metric_values
+
+CITIES = ['Casablanca', 'marrakech', 'Rabat', 'Tanger', 'Fès']
+BATCHES = 10
+
+
+def rank_error(sorted_values, value, q):
+    """Écart (fraction de n) entre le rang demandé q·n et l'intervalle de rangs de la valeur"""
+    n = len(sorted_values)
+    low = np.searchsorted(sorted_values, value, side='left')
+    high = np.searchsorted(sorted_values, value, side='right')
+    return max(0.0, low - q * n, q * n - high) / n
+
+
+def check_index(index, df):
+    """(sketches vérifiés, sketches exacts, erreur max observée, borne max, dépassements)"""
+    values = metric_values(df)
+    cities = df['city_key'].astype(object).to_numpy()
+    quartiers = df['quartier'].astype(object).map(fold_key, na_action='ignore').to_numpy()
+    checked = exact = violations = 0
+    worst = bound = 0.0
+    for (metric, city, quartier), sketch in index.sketches.items():
+        mask = np.ones(len(df), dtype=bool)
+        if city is not None:
+            mask &= cities == city
+        if quartier is not None:
+            mask &= quartiers == quartier
+        data = values[metric][mask]
+        data = np.sort(data[~np.isnan(data)])
+        if not len(data):
+            continue
+        checked += 1
+        exact += sketch.error == 0
+        bound = max(bound, sketch.rank_error())
+        for p in DEFAULT_PERCENTILES:
+            error = rank_error(data, sketch.quantile(p / 100), p / 100)
+            worst = max(worst, error)
+            # tolérance d'un rang : le percentile discret d'une valeur observée
+            violations += error > sketch.rank_error() + 1 / len(data)
+    return checked, exact, worst, bound, violations
+
+
+def timed(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précision et coût des sketches de quantiles")
+    parser.add_argument('iterations', nargs='?', type=int, default=200)
+    parser.add_argument('--stream', type=int, default=2_000_000, help="valeurs du flux synthétique")
+    args = parser.parse_args()
+
+    frames = {t: data_store.read_csv_frames(os.path.join(data_store.DATA_DIR, f), t)[0]
+              for t, f in data_store.SOURCES.items()}
+    failed = 0
+
+    for transaction, df in frames.items():
+        print(f"\n=== {transaction.upper()} : {len(df)} annonces ===")
+        start = time.perf_counter()
+        index = QuantileIndex.from_frame(df)
+        build = time.perf_counter() - start
+        sketches, retained = index.size()
+        print(f"  construction : {build * 1e3:.1f} ms, {sketches} sketches, {retained} valeurs retenues")
+
+        checked, exact, worst, bound, violations = check_index(index, df)
+        failed += violations
+        print(f"  précision : {checked} sketches ({exact} exacts), erreur de rang max {worst:.3%} "
+              f"pour une borne max {bound:.3%}, {violations} dépassement(s)")
+
+        # Incrémental : lots ajoutés à un index existant, ou index par lot puis fusion
+        shuffled = df.sample(frac=1, random_state=0)
+        batches = [shuffled.iloc[positions] for positions in np.array_split(np.arange(len(df)), BATCHES)]
+        streamed, merged = QuantileIndex(), QuantileIndex()
+        start = time.perf_counter()
+        for batch in batches:
+            streamed.add(batch)
+        add_ms = (time.perf_counter() - start) / BATCHES * 1e3
+        start = time.perf_counter()
+        for batch in batches:
+            merged.merge(QuantileIndex.from_frame(batch))
+        merge_ms = (time.perf_counter() - start) / BATCHES * 1e3
+        for label, incremental in [('ajout par lot', streamed), ('fusion de lots', merged)]:
+            checked, exact, worst, bound, violations = check_index(incremental, df)
+            failed += violations
+            print(f"  {label:<15}: {add_ms if label == 'ajout par lot' else merge_ms:.1f} ms/lot "
+                  f"({len(df) // BATCHES} annonces), erreur max {worst:.3%}, borne max {bound:.3%}, "
+                  f"{violations} dépassement(s)")
+
+        # Latence : percentiles d'une ville à chaque requête
+        ps = [p / 100 for p in DEFAULT_PERCENTILES]
+        n = args.iterations
+        sketch_us = timed(lambda: [index.percentiles('prix_m2', c) for c in CITIES], n) / len(CITIES) * 1e6
+        prix_m2 = pd.Series(metric_values(df)['prix_m2'])
+        keys = df['city_key'].astype(object)
+        pandas_us = timed(lambda: [prix_m2[keys == fold_key(c)].quantile(ps) for c in CITIES], n) / len(CITIES) * 1e6
+        print(f"  latence prix/m² par ville : sketch {sketch_us:.1f} µs, tri pandas {pandas_us:.1f} µs "
+              f"(x{pandas_us / sketch_us:.0f})")
+
+    # Flux synthétique : prix log-normaux par lots de 10 000
+    print(f"\n=== Flux synthétique : {args.stream:,} prix ===")
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=14, sigma=0.8, size=args.stream)
+    sketch = QuantileSketch()
+    start = time.perf_counter()
+    for chunk in np.array_split(values, max(1, args.stream // 10_000)):
+        sketch.update(chunk)
+    elapsed = time.perf_counter() - start
+    exact_values = np.sort(values)
+    worst = max(rank_error(exact_values, sketch.quantile(q), q) for q in np.arange(0.01, 1, 0.01))
+    print(f"  {args.stream / elapsed:,.0f} valeurs/s, {sketch.size()} valeurs retenues ({len(sketch.levels)} niveaux)")
+    print(f"  erreur de rang max observée (p1..p99) {worst:.3%}, borne {sketch.rank_error():.3%}")
+    failed += worst > sketch.rank_error()
+
+    print(f"\n{'✅' if not failed else '❌'} {failed} dépassement(s) de borne")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
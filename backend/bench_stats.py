@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark des endpoints /stats/* : ancien code (scan du DataFrame à chaque requête)
+contre le moteur précalculé (StatsEngine)
+Usage : python bench_stats.py [nb_iterations]
+"""
+
+import sys
+import time
+
+import pandas as pd
+
+import app
+from data_index import fold_key
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CITIES = ['Casablanca', 'marrakech', 'Rabat', 'Tanger', 'Fès', 'Ville inconnue']
+
+
+# --- Ancienne implémentation (référence, inchangée) ---
+def scan_city(df, city):
+    city_data = df[df['city'].str.lower() == city.lower()]
+    if len(city_data) == 0:
+        return None, []
+    stats = {
+        'count': int(len(city_data)),
+        'prix_moyen': float(city_data['price'].mean()),
+        'prix_min': float(city_data['price'].min()),
+        'prix_max': float(city_data['price'].max()),
+        'prix_m2_moyen': float(city_data['price'].mean() / city_data['surface_m2'].mean()),
+        'surface_moyenne': float(city_data['surface_m2'].mean())
+    }
+    return stats, sorted(city_data['quartier'].dropna().unique().tolist())
+
+
+def scan_quartiers(df, city):
+    city_data = df[df['city'].str.lower() == city.lower()]
+    quartier_stats = city_data.groupby('quartier').agg({'price': ['count', 'mean']}).reset_index()
+    quartier_stats.columns = ['quartier', 'count', 'prix_moyen']
+    quartier_stats = quartier_stats.sort_values('prix_moyen', ascending=False).head(10)
+    return quartier_stats.to_dict(orient='records')
+
+
+def legacy_frame(df):
+    """Colonnes texte comme avant les Categorical : l'ancien code tourne sur ses données d'origine"""
+    return df.astype({col: object for col in ['city', 'quartier', 'type_bien', 'source'] if col in df.columns})
+
+
+def spellings(df, city):
+    """Graphies (minuscules) que la clé normalisée de city regroupe"""
+    lowered = pd.Series(df['city'].unique()).dropna().str.lower()
+    return sorted({name for name in lowered if fold_key(name) == fold_key(city)})
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    for _ in range(N):
+        for city in CITIES:
+            fn(city)
+    elapsed = (time.perf_counter() - start) / (N * len(CITIES)) * 1e6
+    print(f"  {label:<28} {elapsed:>10.1f} µs/requête")
+    return elapsed
+
+
+def close(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+    if isinstance(a, float):
+        return abs(a - b) <= 1e-9 * max(abs(a), abs(b), 1)
+    return a == b
+
+
+if __name__ == '__main__':
+    engine = app.STATS_ENGINE
+    frames = {'vente': legacy_frame(app.df_vente), 'location': legacy_frame(app.df_location)}
+
+    print("\n🔎 Vérification de la cohérence ancien code / moteur précalculé...")
+    for transaction, df in frames.items():
+        for city in CITIES:
+            names = spellings(df, city)
+            if names not in ([], [city.lower()]):
+                # Casse et accents ignorés par le moteur (ex. 'Fès' -> 'fes') : écart voulu,
+                # le moteur doit cumuler exactement les graphies que l'ancien code sépare
+                counts = [scan_city(df, name)[0]['count'] for name in names]
+                print(f"  ℹ️ {transaction} {city!r} : ancien code {scan_city(df, city)[0]}, "
+                      f"moteur = graphies {names} ({sum(counts)} annonces)")
+                assert engine.city(transaction, city)['count'] == sum(counts), (transaction, city)
+                if len(names) == 1:
+                    city = names[0]
+                else:
+                    continue
+            stats, quartiers = scan_city(df, city)
+            assert close(stats, engine.city(transaction, city)), (transaction, city)
+            assert quartiers == engine.quartiers(transaction, city), (transaction, city)
+            expected = {r['quartier']: r for r in scan_quartiers(df, city)}
+            actual = {r['quartier']: r for r in engine.top_quartiers(transaction, city)}
+            assert expected.keys() == actual.keys(), (transaction, city, expected.keys() ^ actual.keys())
+            assert all(close(expected[q], actual[q]) for q in expected), (transaction, city)
+            sliced = engine.transactions[transaction].rows(city)
+            assert len(sliced) == (stats['count'] if stats else 0), (transaction, city)
+    print("✅ Résultats identiques")
+
+    client = app.app.test_client()
+    for endpoint in ['city', 'quartiers']:
+        print(f"\n⏱️ /stats/{endpoint}/<city> ({N} x {len(CITIES)} villes)")
+        if endpoint == 'city':
+            before = timed('scan DataFrame', lambda c: [scan_city(df, c) for df in frames.values()])
+            after = timed('StatsEngine', lambda c: [engine.city(t, c) for t in frames])
+        else:
+            before = timed('scan DataFrame + groupby', lambda c: [scan_quartiers(df, c) for df in frames.values()])
+            after = timed('StatsEngine', lambda c: [engine.top_quartiers(t, c) for t in frames])
+        timed('endpoint Flask complet', lambda c: client.get(f'/stats/{endpoint}/{c}'))
+        if endpoint == 'city':
+            timed('tranche CityIndex', lambda c: [engine.transactions[t].rows(c) for t in frames])
+        print(f"  → gain x{before / after:,.0f}")
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Vérification hors ligne de l'API (client de test Flask, sans serveur)
+- /predict/batch : lignes invalides (surface nulle ou négative, inf / NaN) rejetées une à
+  une, sans changer le résultat des autres lignes du même groupe
+- build_prediction : pas d'exception sur une surface nulle
+- feature_pipeline : avertissement « noms de features » masqué pour l'appel NumPy seulement
+- /predict?pipeline=... : cache ni lu ni alimenté (modèle remplacé par une fonction factice)
+- /stats/query : filtres sans résultat (avec ou sans percentiles) -> liste de groupes vide,
+  limit nul ou négatif refusé (400)
+- /stats/percentiles : ?quartier= sans ville refusé (400) plutôt qu'un succès vide
+- rechargement des modèles : CSV de performances modifié seul -> nouvelle version, nouveau RMSE
+- store analytique : plusieurs processus qui le trouvent périmé en même temps (workers
+  gunicorn après un rafraîchissement des données) -> une seule reconstruction, tous l'ouvrent
+Fonctionne avec ou sans les modèles : sans modèle, les lignes valides portent l'erreur
+« modèle indisponible », les lignes invalides leur propre erreur de validation
+Usage : python check_api.py
+Code de sortie 1 si une vérification échoue
+"""
+
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import warnings
+from types import SimpleNamespace
+
+import pandas as pd
+
+import analytics_store
+import app
+import feature_pipeline
+from data_store import DATA_DIR, SOURCES
+from model_registry import PICKLE_KEYS, ModelRegistry
+
+VALID_ROW = {'city': 'Casablanca', 'quartier': 'Maarif', 'property_type': 'Appartement',
+             'surface_m2': '80', 'num_rooms': '3', 'num_bathrooms': '2'}
+
+failures = []
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def post_batch_csv(client, rows):
+    csv = pd.DataFrame(rows).to_csv(index=False)
+    return client.post('/predict/batch', data=csv, content_type='text/csv')
+
+
+def check_batch_validation():
+    print("\n🔎 Validation par ligne (validate_batch)")
+    rows = [VALID_ROW,
+            dict(VALID_ROW, surface_m2='0'),
+            dict(VALID_ROW, surface_m2='-20'),
+            dict(VALID_ROW, surface_m2='inf'),
+            dict(VALID_ROW, num_rooms='-inf'),
+            dict(VALID_ROW, num_bathrooms='nan'),
+            dict(VALID_ROW, surface_m2='abc')]
+    df, errors = app.validate_batch(pd.DataFrame(rows, dtype=str))
+    check(errors[0] is None, "ligne valide acceptée")
+    check(errors[1] == errors[2] == 'surface_m2 doit être strictement positive', "surface nulle ou négative rejetée")
+    check(errors[3] == 'Valeur invalide pour surface_m2', "surface infinie rejetée")
+    check(errors[4] == 'Valeur invalide pour num_rooms', "nombre de chambres infini rejeté")
+    check(errors[5] == 'Valeur invalide pour num_bathrooms', "NaN rejeté")
+    check(errors[6] == 'Valeur invalide pour surface_m2', "texte non numérique rejeté")
+
+
+def check_build_prediction():
+    print("\n🔎 build_prediction")
+    for surface in [0.0, float('nan'), float('inf')]:
+        try:
+            result = app.build_prediction(1_000_000.0, surface, 'vente', 50_000.0)
+            check(result['price_per_m2'] is None, f"surface {surface} : prix/m² absent, pas d'exception")
+        except Exception as e:
+            check(False, f"surface {surface} : {type(e).__name__} {e}")
+    check(app.build_prediction(1_000_000.0, 100.0, 'vente', 50_000.0)['price_per_m2'] == 10_000.0,
+          "surface positive : prix/m² inchangé")
+
+
+def check_feature_name_warning():
+    print("\n🔎 Avertissement sur les noms de features")
+    from sklearn.linear_model import LinearRegression
+    X = pd.DataFrame({'surface_m2': [50.0, 80.0, 120.0], 'num_rooms': [2.0, 3.0, 4.0]})
+    model = LinearRegression().fit(X, [1.0, 2.0, 3.0])
+
+    def warned(fn):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            fn()
+        return any('valid feature names' in str(w.message) for w in caught)
+
+    def masked():
+        with feature_pipeline.numpy_input():
+            model.predict(X.to_numpy())
+
+    check(not warned(masked), "appel NumPy du pipeline compilé : masqué")
+    check(warned(lambda: model.predict(X.to_numpy())), "hors du pipeline compilé : émis")
+    global_filters = [f for f in warnings.filters if f[1] is not None and 'feature names' in f[1].pattern]
+    check(not global_filters, "aucun filtre global installé à l'import (chemin pandas, compare)")
+
+
+def check_pipeline_bypass(client):
+    print("\n🔎 /predict?pipeline= : cache court-circuité")
+    bundle = SimpleNamespace(fingerprint='check-api', rmse=50_000.0, version=1)
+    # Une valeur par chemin : une réponse venue du cache se reconnaît
+    values = {None: 1_000_000.0, 'pandas': 2_000_000.0, 'compare': 3_000_000.0}
+    get_model_bundle, predict_single = app.get_model_bundle, app.predict_single
+    app.get_model_bundle = lambda transaction_type: bundle
+    app.predict_single = lambda data, transaction_type, bundle, mode, timings: values[mode]
+    app.PREDICTION_CACHE.clear()
+    try:
+        def predicted(query=''):
+            response = client.post(f'/predict{query}', json=VALID_ROW)
+            return response.get_json()['prediction']['price_dh'] if response.status_code == 200 else response.status_code
+
+        check(predicted('?pipeline=pandas') == values['pandas'], "?pipeline=pandas : chemin imposé")
+        check(predicted('?pipeline=compare') == values['compare'], "?pipeline=compare : chemin imposé")
+        check(predicted() == values[None], "requête suivante sans ?pipeline= : pas servie depuis le cache")
+        check(predicted('?pipeline=pandas') == values['pandas'], "?pipeline= après une requête mise en cache : cache non lu")
+    finally:
+        app.get_model_bundle, app.predict_single = get_model_bundle, predict_single
+        app.PREDICTION_CACHE.clear()
+
+
+def check_batch_isolation(client):
+    print("\n🔎 /predict/batch : isolation des lignes")
+    alone = post_batch_csv(client, [VALID_ROW])
+    bad = [dict(VALID_ROW, surface_m2='0'), dict(VALID_ROW, surface_m2='inf'),
+           dict(VALID_ROW, num_rooms='nan', transaction_type='location')]
+    mixed = post_batch_csv(client, [VALID_ROW] + bad)
+    check(mixed.status_code == 200 and mixed.is_json, f"batch avec lignes invalides : HTTP {mixed.status_code} JSON")
+    if not (mixed.is_json and alone.is_json):
+        return
+    results = mixed.get_json()['results']
+    check(results[0] == alone.get_json()['results'][0], "résultat de la ligne valide identique, seule ou accompagnée")
+    check([r['error'] for r in results[1:]] == ['surface_m2 doit être strictement positive',
+                                                'Valeur invalide pour surface_m2',
+                                                'Valeur invalide pour num_rooms'],
+          "chaque ligne invalide porte sa propre erreur")
+    check(mixed.get_json()['failed'] == len(bad) + (not results[0]['success']), "compteur d'échecs cohérent")
+    if not results[0]['success']:
+        print(f"    (modèles indisponibles ici : {results[0]['error'][:60]}...)")
+
+
+def check_stats_query(client):
+    print("\n🔎 /stats/query")
+    if app.ANALYTICS_STORE is None:
+        check(False, "store analytique indisponible")
+        return
+    for percentiles in ['none', '10,50,90']:
+        for group_by in ['', '&group_by=type_bien']:
+            url = f'/stats/query?city=VilleInexistante&percentiles={percentiles}{group_by}'
+            response = client.get(url)
+            check(response.status_code == 200 and response.get_json()['groups'] == [],
+                  f"aucune annonce ({percentiles}{group_by}) : HTTP {response.status_code}, groupes vides")
+    found = client.get('/stats/query?city=Casablanca&percentiles=none').get_json()['groups']
+    check(len(found) == 1 and found[0]['count'] > 0, "ville connue : un groupe non vide")
+    for limit in ['0', '-5']:
+        response = client.get(f'/stats/query?limit={limit}')
+        check(response.status_code == 400, f"limit={limit} refusé : HTTP {response.status_code}")
+    check(len(client.get('/stats/query?group_by=quartier&limit=3').get_json()['groups']) == 3, "limit=3 respecté")
+
+
+def check_percentiles(client):
+    print("\n🔎 /stats/percentiles")
+    response = client.get('/stats/percentiles?quartier=Maarif')
+    check(response.status_code == 400, f"?quartier= sans ville : HTTP {response.status_code}")
+    response = client.get('/stats/percentiles/Casablanca?quartier=Maarif')
+    check(response.status_code == 200 and response.get_json()['vente'] is not None,
+          f"?quartier= avec ville : HTTP {response.status_code}, percentiles vente présents")
+
+
+def check_performance_reload():
+    print("\n🔎 Rechargement : CSV de performances modifié seul")
+    spec = dict(app.MODEL_REGISTRY.specs['vente'])
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Artefacts factices : seuls les fichiers comptent pour le registre (pas de hook de validation)
+        for key in PICKLE_KEYS:
+            with open(os.path.join(model_dir, spec[key]), 'wb') as f:
+                pickle.dump({'numeric_features': [], 'categorical_features': []} if key == 'features' else key, f)
+        performance = os.path.join(model_dir, spec['performance'])
+        pd.DataFrame([{spec['rmse_key']: 100000.0, spec['r2_key']: 0.8}]).to_csv(performance, index=False)
+
+        registry = ModelRegistry(model_dir, specs={'vente': spec})
+        check(registry.performance('vente')[spec['rmse_key']] == 100000.0, "performances lues sans charger le modèle")
+        first = registry.get('vente')
+        pd.DataFrame([{spec['rmse_key']: 250000.0, spec['r2_key']: 0.8}]).to_csv(performance, index=False)
+        result = registry.reload('vente')
+        check(result['status'] == 'swapped', f"rechargement : {result['status']} (attendu : swapped)")
+        bundle = registry.get('vente')
+        check(bundle.version == first.version + 1 and bundle.rmse == 250000.0, f"RMSE servi : {bundle.rmse:.0f}")
+        check(registry.performance('vente')[spec['rmse_key']] == 250000.0, "performances de /model-info à jour")
+        check(registry.reload('vente')['status'] == 'unchanged', "second rechargement sans changement : unchanged")
+
+
+def open_store_counting_builds(path, data_dir, start, queue):
+    """Processus enfant : attend le signal de départ, ouvre le store et rapporte ses reconstructions"""
+    builds = []
+    build_store = analytics_store.build_store
+
+    def counting_build(*args, **kwargs):
+        builds.append(os.getpid())
+        return build_store(*args, **kwargs)
+
+    analytics_store.build_store = counting_build
+    start.wait()
+    try:
+        store = analytics_store.AnalyticsStore.open(path, data_dir)
+        queue.put((len(builds), store.counts()))
+    except Exception as e:
+        queue.put((len(builds), f"{type(e).__name__} {e}"))
+
+
+def check_store_rebuild(workers=4, rows=2000):
+    print("\n🔎 Store analytique : reconstruction par un seul processus")
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'clean_data')
+        os.makedirs(data_dir)
+        for filename in SOURCES.values():
+            with open(os.path.join(DATA_DIR, filename), 'rb') as src, open(os.path.join(data_dir, filename), 'wb') as dst:
+                dst.writelines(line for _, line in zip(range(rows + 1), src))
+        path = os.path.join(tmp, 'store', 'analytics.sqlite')
+        # Store d'une version précédente des CSV, puis CSV vente complet : périmé pour tous
+        analytics_store.build_store(path, data_dir)
+        shutil.copy(os.path.join(DATA_DIR, SOURCES['vente']), os.path.join(data_dir, SOURCES['vente']))
+        check(not analytics_store.store_is_fresh(path, data_dir), "store périmé après modification d'un CSV")
+
+        context = multiprocessing.get_context('fork')
+        start, queue = context.Event(), context.Queue()
+        processes = [context.Process(target=open_store_counting_builds, args=(path, data_dir, start, queue))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        start.set()
+        results = [queue.get(timeout=120) for _ in processes]
+        for process in processes:
+            process.join()
+        builds = sum(count for count, _ in results)
+        counts = [result for _, result in results]
+        check(builds == 1, f"{workers} processus : {builds} reconstruction(s) (attendu : 1)")
+        check(all(c == counts[0] and isinstance(c, dict) for c in counts), f"même store ouvert partout : {counts[0]}")
+        check(analytics_store.store_is_fresh(path, data_dir), "store à jour ensuite")
+        check(not [f for f in os.listdir(os.path.dirname(path)) if f.endswith('.tmp')], "aucun fichier temporaire restant")
+
+
+def main():
+    client = app.app.test_client()
+    check_batch_validation()
+    check_build_prediction()
+    check_feature_name_warning()
+    check_pipeline_bypass(client)
+    check_batch_isolation(client)
+    check_stats_query(client)
+    check_percentiles(client)
+    check_performance_reload()
+    check_store_rebuild()
+
+    if failures:
+        print(f"\n❌ {len(failures)} vérification(s) en échec")
+        sys.exit(1)
+    print("\n✅ Toutes les vérifications passent")
+
+
+if __name__ == "__main__":
+    main()
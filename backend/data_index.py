@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Index des DataFrames de statistiques
+- colonnes texte converties en Categorical (une seule copie de chaque valeur)
+- clé de ville normalisée (casse + accents) calculée sur les catégories, pas sur les lignes
+- index ville -> tranche de lignes contiguës sur des données triées par ville
+"""
+
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['city', 'quartier', 'type_bien', 'source']
+
+
+def fold_key(text):
+    """'  Fès ' -> 'fes' : casse et accents ignorés pour les recherches"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def categorize(df):
+    """Convertit les colonnes texte en Categorical et ajoute la clé de ville 'city_key'"""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # La normalisation ne porte que sur les catégories distinctes (quelques centaines)
+    cities = df['city'].cat
+    keys = pd.Index([fold_key(c) for c in cities.categories])
+    key_categories = pd.Index(sorted(set(keys)))
+    codes = np.where(cities.codes >= 0, key_categories.get_indexer(keys)[cities.codes], -1)
+    df['city_key'] = pd.Categorical.from_codes(codes, categories=key_categories)
+    return df
+
+
+def sort_by_city(df):
+    """Tri stable par clé de ville : chaque ville occupe un bloc de lignes contigu"""
+    return df.sort_values('city_key', kind='stable').reset_index(drop=True)
+
+
+class CityIndex:
+    """Index ville -> slice de positions, pour un DataFrame trié par 'city_key'"""
+
+    def __init__(self, df):
+        codes = df['city_key'].cat.codes.to_numpy()
+        categories = df['city_key'].cat.categories
+        bounds = np.searchsorted(codes, np.arange(len(categories) + 1), side='left')
+        self.slices = {
+            key: slice(int(bounds[i]), int(bounds[i + 1]))
+            for i, key in enumerate(categories)
+            if bounds[i] < bounds[i + 1]
+        }
+
+    def __contains__(self, city):
+        return fold_key(city) in self.slices
+
+    def rows(self, df, city):
+        """Lignes d'une ville : tranche iloc contiguë, sans masque booléen ni copie"""
+        bounds = self.slices.get(fold_key(city))
+        if bounds is None:
+            return df.iloc[0:0]
+        return df.iloc[bounds]
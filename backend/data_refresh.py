@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Rafraîchissement à chaud des données de statistiques (data/clean_data), sans redémarrer l'API
+- détection : taille / date de modification de chaque CSV servi (data_store.SOURCES)
+- ajout en fin de fichier (les octets déjà lus sont inchangés, vérifié par empreinte SHA-1) :
+  seules les nouvelles lignes sont lues et nettoyées, leur cube et leurs sketches de
+  quantiles sont cumulés aux existants (TransactionStats.extended)
+- fichier réécrit autrement (imputations recalculées, lignes supprimées...) : rechargement
+  complet de ce fichier seulement
+- une ligne sans saut de ligne final (écriture en cours) est laissée pour le relevé suivant
+- copy-on-write : le nouveau DataSnapshot est construit à côté de l'actif, qui reste servi
+  pendant la construction, puis substitué en une affectation. Les parties inchangées
+  (l'autre type de transaction, les sketches non touchés) sont partagées entre les deux
+- chaque rafraîchissement est mesuré : latence par étape, lignes ajoutées, RSS avant /
+  après la substitution et taille des nouvelles données (copie tenue tant que l'ancien
+  snapshot est référencé par une requête en cours)
+"""
+
+import hashlib
+import io
+import logging
+import os
+import resource
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import pandas as pd
+
+from data_index import categorize, sort_by_city
+from data_store import DATA_DIR, SOURCES, MissingColumnsError, clean_frame, stats_mask
+from stats_engine import StatsEngine, TransactionStats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SourceState:
+    """Ce qui a été lu d'un CSV : signature du fichier et octets consommés"""
+    size: int
+    mtime_ns: int
+    offset: int     # octets lus (lignes complètes)
+    digest: str     # SHA-1 des octets [0, offset)
+    header: bytes   # ligne d'en-tête, rejouée devant les nouvelles lignes
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """Données servies à un instant donné ; jamais modifié après publication"""
+    version: int
+    frames: dict                    # transaction -> (df_clean, df_stats)
+    engine: StatsEngine
+    sources: dict                   # transaction -> SourceState (None : fichier absent)
+    loaded_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def rows(self):
+        return {name: len(df) for name, (df, _) in self.frames.items() if df is not None}
+
+
+def rss_mb():
+    """Mémoire résidente du processus (Mo) ; pic du processus si /proc est absent"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def frame_mb(*frames):
+    return float(sum(df.memory_usage(deep=True).sum() for df in frames if df is not None)) / 1e6
+
+
+def read_source(path, loaded_all=False):
+    """
+    (octets du fichier, état) ; l'état ne couvre que les lignes complètes, sauf si
+    loaded_all (les données en mémoire ont été lues par pandas, dernière ligne comprise)
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    end = len(data) if loaded_all else data.rfind(b'\n') + 1
+    header_end = data.find(b'\n') + 1 or len(data)
+    state = SourceState(stat.st_size, stat.st_mtime_ns, end, hashlib.sha1(data[:end]).hexdigest(),
+                        data[:header_end])
+    return data, state
+
+
+def append_frames(df_clean, new_rows, source_type):
+    """(df_clean, df_stats) après ajout des nouvelles lignes nettoyées, comme un chargement complet"""
+    df = pd.concat([df_clean, new_rows], ignore_index=True)
+    # Catégories recalculées (triées) : mêmes codes et même ordre qu'une lecture du fichier entier
+    df = sort_by_city(categorize(df))
+    return df, df[stats_mask(df, source_type)]
+
+
+class DataRefresher:
+    """Snapshot actif + rafraîchissement incrémental ; on_swap(snapshot) appelé à chaque substitution"""
+
+    def __init__(self, snapshot, data_dir=DATA_DIR, sources=SOURCES, on_swap=None):
+        self.data_dir = data_dir
+        self.sources = sources
+        self.on_swap = on_swap
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._watcher_thread = None
+        self.last_report = None
+
+    @classmethod
+    def from_frames(cls, frames, engine, data_dir=DATA_DIR, sources=SOURCES, on_swap=None):
+        """Reprend les données déjà chargées au démarrage (CSV ou store Arrow à jour)"""
+        states = {}
+        for name, filename in sources.items():
+            path = os.path.join(data_dir, filename)
+            loaded = frames.get(name, (None, None))[0] is not None
+            states[name] = read_source(path, loaded_all=True)[1] if loaded and os.path.exists(path) else None
+        return cls(DataSnapshot(1, dict(frames), engine, states), data_dir, sources, on_swap)
+
+    @property
+    def current(self):
+        """Snapshot actif : à lire une fois par requête, il reste cohérent jusqu'à la fin"""
+        return self._snapshot
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, self.sources[name])
+
+    def signatures(self):
+        signatures = {}
+        for name in self.sources:
+            try:
+                stat = os.stat(self._path(name))
+                signatures[name] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                signatures[name] = None
+        return signatures
+
+    def _refresh_source(self, name, snapshot, timings):
+        """(df_clean, df_stats, stats, état, entrée du rapport) ou None si rien à faire"""
+        state = snapshot.sources.get(name)
+        df_clean, df_stats = snapshot.frames.get(name, (None, None))
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        if state is not None and (stat.st_size, stat.st_mtime_ns) == (state.size, state.mtime_ns):
+            return None
+
+        start = time.perf_counter()
+        data, new_state = read_source(path)
+        appended = (state is not None and df_clean is not None and state.offset > 0
+                    and new_state.offset >= state.offset
+                    and data[state.offset - 1:state.offset] == b'\n'
+                    and hashlib.sha1(data[:state.offset]).hexdigest() == state.digest)
+        timings['detect'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if appended:
+            chunk = data[state.offset:new_state.offset]
+            if not chunk.strip():
+                # Rien de complet à lire (ligne en cours d'écriture) : état mis à jour seulement
+                timings['parse'] += time.perf_counter() - start
+                state = SourceState(stat.st_size, stat.st_mtime_ns, state.offset, state.digest, state.header)
+                return None, None, None, state, {'mode': 'unchanged', 'rows_added': 0}
+            new_rows, _ = clean_frame(pd.read_csv(io.BytesIO(state.header + chunk)), name)
+        else:
+            new_clean, new_stats = clean_frame(pd.read_csv(io.BytesIO(data[:new_state.offset])), name)
+        timings['parse'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if appended:
+            new_clean, new_stats = append_frames(df_clean, new_rows, name)
+            current = snapshot.engine.transactions.get(name)
+            stats = (current.extended(new_rows, new_clean, new_stats) if current is not None
+                     else TransactionStats(new_clean, new_stats))
+            entry = {'mode': 'append', 'rows_added': int(len(new_rows))}
+        else:
+            stats = TransactionStats(new_clean, new_stats)
+            entry = {'mode': 'full', 'rows_added': int(len(new_clean) - (len(df_clean) if df_clean is not None else 0))}
+        timings['aggregate'] += time.perf_counter() - start
+        entry.update(rows=int(len(new_clean)), new_data_mb=round(frame_mb(new_clean, new_stats), 2))
+        return new_clean, new_stats, stats, new_state, entry
+
+    def refresh(self):
+        """
+        Relit les CSV modifiés et publie un nouveau snapshot s'il y a du nouveau
+        En cas d'erreur sur un fichier, ses données actuelles restent servies
+        """
+        with self._lock:
+            total = time.perf_counter()
+            rss_before = rss_mb()
+            snapshot = self._snapshot
+            timings = {'detect': 0.0, 'parse': 0.0, 'aggregate': 0.0, 'swap': 0.0, 'publish': 0.0}
+            frames, sources, engine = dict(snapshot.frames), dict(snapshot.sources), snapshot.engine
+            report = {'sources': {}}
+
+            for name in self.sources:
+                try:
+                    result = self._refresh_source(name, snapshot, timings)
+                except (MissingColumnsError, pd.errors.ParserError, UnicodeDecodeError, OSError) as e:
+                    logger.error("❌ Rafraîchissement %s refusé, données actuelles conservées : %s", name, e)
+                    report['sources'][name] = {'mode': 'failed', 'error': str(e)}
+                    continue
+                if result is None:
+                    continue
+                df_clean, df_stats, stats, state, entry = result
+                report['sources'][name] = entry
+                sources[name] = state
+                if entry['mode'] != 'unchanged':
+                    frames[name] = (df_clean, df_stats)
+                    engine = engine.with_transaction(name, stats)
+
+            changed = [name for name, entry in report['sources'].items() if entry['mode'] in ('append', 'full')]
+            if changed or sources != snapshot.sources:
+                start = time.perf_counter()
+                new = DataSnapshot(snapshot.version + (1 if changed else 0), frames, engine, sources)
+                self._snapshot = new
+                timings['swap'] = time.perf_counter() - start
+                # publish : travail de on_swap (globals de l'API, store analytique)
+                start = time.perf_counter()
+                if changed and self.on_swap is not None:
+                    self.on_swap(new)
+                timings['publish'] = time.perf_counter() - start
+
+            report.update(
+                status='swapped' if changed else 'unchanged',
+                version=self._snapshot.version,
+                rows=self._snapshot.rows(),
+                timings_ms={step: round(seconds * 1e3, 2) for step, seconds in timings.items()},
+                elapsed_ms=round((time.perf_counter() - total) * 1e3, 2),
+                rss_before_mb=round(rss_before, 1),
+                rss_after_mb=round(rss_mb(), 1),
+                at=datetime.now().isoformat()
+            )
+            if changed:
+                logger.info("✅ Données v%d actives en %.0f ms (%s), RSS %.1f -> %.1f Mo",
+                               report['version'], report['elapsed_ms'],
+                               ', '.join(f"{name} {report['sources'][name]['mode']} "
+                                         f"+{report['sources'][name]['rows_added']}" for name in changed),
+                               report['rss_before_mb'], report['rss_after_mb'])
+            self.last_report = report
+            return report
+
+    def watch(self, interval):
+        """Surveille les CSV et rafraîchit quand leur signature est stable sur deux relevés"""
+        def run():
+            known = self.signatures()
+            pending = None
+            while True:
+                time.sleep(interval)
+                signatures = self.signatures()
+                if signatures == known:
+                    pending = None
+                    continue
+                # Écriture terminée : deux relevés identiques
+                if signatures != pending:
+                    pending = signatures
+                    continue
+                pending = None
+                known = signatures
+                logger.info("👀 Données modifiées dans %s", self.data_dir)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.exception("❌ Rafraîchissement des données interrompu : %s", e)
+
+        self._watcher_thread = threading.Thread(target=run, name='data-watcher', daemon=True)
+        self._watcher_thread.start()
+        return self._watcher_thread
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'loaded_at': snapshot.loaded_at,
+            'rows': snapshot.rows(),
+            'last_refresh': self.last_report
+        }
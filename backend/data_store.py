@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage colonnaire des données de statistiques (Arrow IPC / Feather v2)
+
+Le nettoyage (coercition numérique, suppression des NaNs, filtrage des outliers,
+colonnes catégorielles, tri par ville) est fait une seule fois à la conversion.
+Au démarrage, l'API lit directement les partitions 'clean' et 'stats' en mémoire
+mappée au lieu de reparser les CSV.
+
+Conversion : python data_store.py [--compression uncompressed|lz4|zstd]
+"""
+
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from data_index import categorize, sort_by_city
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(CURRENT_DIR)
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data', 'clean_data')
+STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'store')
+STORE_FORMAT_VERSION = 1
+
+# Fichiers CSV servis par /stats/* : type de transaction -> fichier source
+SOURCES = {
+    'vente': 'annonces_nettoyees_mubawab.csv',
+    'location': 'location_all_sources.csv'
+}
+
+COLUMN_MAPPING = {
+    'ville': 'city',
+    'prix': 'price',
+    'surface': 'surface_m2',
+    'quartier': 'quartier'
+}
+REQUIRED_COLUMNS = ['city', 'price', 'surface_m2']
+
+
+class MissingColumnsError(ValueError):
+    pass
+
+
+def clean_frame(df, source_type='vente'):
+    """CSV brut -> (df_clean, df_stats) : même nettoyage que l'API a toujours appliqué"""
+    # Standardisation des colonnes
+    df = df.rename(columns=COLUMN_MAPPING)
+
+    # Vérification des colonnes requises
+    if not all(col in df.columns for col in REQUIRED_COLUMNS):
+        raise MissingColumnsError(f"Colonnes: {df.columns.tolist()}")
+
+    # Nettoyage numérique
+    for col in ['price', 'surface_m2']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Colonnes catégorielles + clé de ville normalisée (casse et accents)
+    df = categorize(df)
+
+    # Suppression des NaNs, puis tri par ville (blocs contigus pour CityIndex)
+    df_clean = sort_by_city(df.dropna(subset=['price', 'surface_m2', 'city']))
+    df_stats = df_clean[stats_mask(df_clean, source_type)]
+
+    return df_clean, df_stats
+
+
+def stats_mask(df_clean, source_type='vente'):
+    """Filtrage des outliers POUR LES MOYENNES : lignes de df_clean retenues dans df_stats"""
+    if source_type == 'vente':
+        # Prix entre 100k et 50M DH
+        keep = (df_clean['price'] > 100000) & (df_clean['price'] < 50000000)
+    else:
+        # Loyer entre 500 et 50k DH
+        keep = (df_clean['price'] > 500) & (df_clean['price'] < 50000)
+
+    # Surface entre 10 et 1000 m²
+    keep &= (df_clean['surface_m2'] > 10) & (df_clean['surface_m2'] < 1000)
+    return keep
+
+
+def read_csv_frames(filepath, source_type='vente'):
+    return clean_frame(pd.read_csv(filepath), source_type)
+
+
+# ============================================
+# STORE ARROW
+# ============================================
+def _partition_path(source_type, partition, store_dir=STORE_DIR):
+    return os.path.join(store_dir, source_type, f'{partition}.arrow')
+
+
+def _manifest_path(source_type, store_dir=STORE_DIR):
+    return os.path.join(store_dir, source_type, 'manifest.json')
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def write_store(csv_path, source_type, store_dir=STORE_DIR, compression='uncompressed'):
+    """Nettoie le CSV et écrit les partitions clean / stats + un manifeste"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    df_clean, df_stats = read_csv_frames(csv_path, source_type)
+    os.makedirs(os.path.dirname(_manifest_path(source_type, store_dir)), exist_ok=True)
+
+    for partition, frame in [('clean', df_clean), ('stats', df_stats)]:
+        table = pa.Table.from_pandas(frame.reset_index(drop=True), preserve_index=False)
+        tmp_path = _partition_path(source_type, partition, store_dir) + '.tmp'
+        feather.write_feather(table, tmp_path, compression=compression)
+        os.replace(tmp_path, _partition_path(source_type, partition, store_dir))
+
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'source': os.path.basename(csv_path),
+        'source_signature': _source_signature(csv_path),
+        'compression': compression,
+        'rows_clean': len(df_clean),
+        'rows_stats': len(df_stats)
+    }
+    with open(_manifest_path(source_type, store_dir), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def store_is_fresh(csv_path, source_type, store_dir=STORE_DIR):
+    """Le store existe et a été produit à partir de la version actuelle du CSV"""
+    try:
+        with open(_manifest_path(source_type, store_dir), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get('format_version') != STORE_FORMAT_VERSION:
+        return False
+    if os.path.exists(csv_path) and manifest.get('source_signature') != _source_signature(csv_path):
+        return False
+    return all(os.path.exists(_partition_path(source_type, p, store_dir)) for p in ['clean', 'stats'])
+
+
+def read_store(source_type, store_dir=STORE_DIR):
+    """Lit les partitions en mémoire mappée (zéro copie si le store n'est pas compressé)"""
+    import pyarrow as pa
+
+    frames = []
+    for partition in ['clean', 'stats']:
+        source = pa.memory_map(_partition_path(source_type, partition, store_dir), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        frames.append(table.to_pandas(split_blocks=True))
+    return frames[0], frames[1]
+
+
+def convert_all(compression='uncompressed', data_dir=DATA_DIR, store_dir=STORE_DIR):
+    for source_type, filename in SOURCES.items():
+        csv_path = os.path.join(data_dir, filename)
+        if not os.path.exists(csv_path):
+            print(f"⚠️ Fichier introuvable: {csv_path}")
+            continue
+        manifest = write_store(csv_path, source_type, store_dir, compression)
+        size = sum(os.path.getsize(_partition_path(source_type, p, store_dir)) for p in ['clean', 'stats'])
+        print(f"✅ {source_type.upper()} : {manifest['rows_clean']} lignes "
+              f"({manifest['rows_stats']} pour stats) -> {size / 1e6:.1f} Mo [{compression}]")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Conversion des CSV de statistiques en store Arrow")
+    parser.add_argument('--compression', default='uncompressed', choices=['uncompressed', 'lz4', 'zstd'],
+                        help="uncompressed = memory-map sans copie ; lz4/zstd = fichiers plus petits")
+    args = parser.parse_args()
+    convert_all(args.compression)
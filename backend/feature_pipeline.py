@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de features compilé pour les prédictions unitaires
+Transforme un dict de requête en une ligne NumPy sans passer par pandas
+"""
+
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_CATEGORY = '__categorie_inconnue__'
+
+# catch_warnings modifie les filtres du processus : deux threads qui se chevauchent
+# pourraient restaurer l'état de l'autre, d'où un verrou
+_numpy_input_lock = threading.Lock()
+
+
+@contextmanager
+def numpy_input():
+    """
+    Scaler et modèle ont été entraînés sur des DataFrames : on leur passe ici un tableau
+    NumPy dans le même ordre de colonnes, l'avertissement sur les noms de features est
+    attendu et masqué pour cet appel seulement (pas sur le chemin pandas ni en compare)
+    """
+    with _numpy_input_lock, warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        yield
+
+
+def derive_features(surface_m2, num_rooms, num_bathrooms, price_per_m2):
+    """Features dérivées, valables pour des scalaires comme pour des colonnes pandas"""
+    total_rooms = num_rooms + num_bathrooms
+    return {
+        'surface_m2': surface_m2,
+        'num_rooms': num_rooms,
+        'num_bathrooms': num_bathrooms,
+        'surface_rooms': surface_m2 * num_rooms,
+        'bathrooms_rooms_ratio': num_bathrooms / (num_rooms + 1),
+        'total_rooms': total_rooms,
+        'surface_per_room': surface_m2 / (total_rooms + 1),
+        'price_per_m2': price_per_m2
+    }
+
+
+def _known_categories(target_encoder, col):
+    """Catégories vues à l'entraînement (category_encoders ou sklearn), None si inconnues"""
+    ordinal = getattr(target_encoder, 'ordinal_encoder', None)
+    for mapping in getattr(ordinal, 'category_mapping', None) or []:
+        if mapping.get('col') == col:
+            return [c for c in mapping['mapping'].index if isinstance(c, str)]
+
+    feature_names = list(getattr(target_encoder, 'feature_names_in_', []))
+    categories = getattr(target_encoder, 'categories_', None)
+    if categories is not None and col in feature_names:
+        return [c for c in categories[feature_names.index(col)] if isinstance(c, str)]
+    return None
+
+
+class CompiledPipeline:
+    """
+    Pipeline figé au démarrage pour un type de transaction :
+    - ordre des colonnes résolu une fois (numériques puis catégorielles)
+    - target encoding par lookup dans un dict
+    - standardisation par vecteurs mean/scale précalculés
+    """
+
+    def __init__(self, transaction_type, features_dict, target_encoder, scaler, model, price_per_m2):
+        self.transaction_type = transaction_type
+        self.num_features = list(features_dict.get('numeric_features', []))
+        self.cat_features = list(features_dict.get('categorical_features', []))
+        self.target_encoder = target_encoder
+        self.scaler = scaler
+        self.model = model
+        self.price_per_m2 = price_per_m2
+        self.n_num = len(self.num_features)
+        self._local = threading.local()
+
+        # Standardisation : mêmes opérations que StandardScaler.transform
+        mean = getattr(scaler, 'mean_', None) if getattr(scaler, 'with_mean', True) else None
+        scale = getattr(scaler, 'scale_', None) if getattr(scaler, 'with_std', True) else None
+        self.affine = hasattr(scaler, 'mean_')
+        self.mean = np.zeros(self.n_num) if mean is None else np.asarray(mean, dtype=float)
+        self.scale = np.ones(self.n_num) if scale is None else np.asarray(scale, dtype=float)
+
+        self.encodings = {}
+        self.unknown = {}
+        self._compile_encodings()
+
+    def _encode_frame(self, values):
+        """Appel unique à l'encodeur d'origine (utilisé à la compilation et en repli)"""
+        frame = pd.DataFrame({
+            col: values.get(col, [UNKNOWN_CATEGORY] * len(next(iter(values.values()))))
+            for col in self.cat_features
+        })
+        return self.target_encoder.transform(frame)
+
+    def _compile_encodings(self):
+        for col in self.cat_features:
+            categories = _known_categories(self.target_encoder, col) or []
+            self.encodings[col] = {}
+            if categories:
+                encoded = self._encode_frame({col: categories})[col].to_numpy(dtype=float)
+                self.encodings[col] = dict(zip(categories, encoded.tolist()))
+            try:
+                self.unknown[col] = float(self._encode_frame({col: [UNKNOWN_CATEGORY]})[col].iloc[0])
+            except Exception:
+                # handle_unknown='error' : on laisse l'encodeur lever l'erreur d'origine
+                self.unknown[col] = None
+
+    def _encode(self, col, value):
+        encoded = self.encodings[col].get(value)
+        if encoded is not None:
+            return encoded
+        if self.unknown[col] is not None and not self.encodings[col]:
+            # Catégories non exposées par l'encodeur : mémoriser le résultat de l'appel lent
+            encoded = float(self._encode_frame({col: [value]})[col].iloc[0])
+            if len(self.encodings[col]) < 10000:
+                self.encodings[col][value] = encoded
+            return encoded
+        if self.unknown[col] is not None:
+            return self.unknown[col]
+        return float(self._encode_frame({col: [value]})[col].iloc[0])
+
+    def _row(self):
+        # Une ligne préallouée par thread (le serveur Flask est multi-thread)
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = np.empty((1, self.n_num + len(self.cat_features)))
+            self._local.row = row
+        return row
+
+    def transform(self, data):
+        """dict de requête -> ligne (1, n_features) encodée et standardisée"""
+        values = derive_features(
+            float(data['surface_m2']), int(data['num_rooms']), int(data['num_bathrooms']),
+            self.price_per_m2
+        )
+        row = self._row()
+        num = row[0, :self.n_num]
+        num[:] = [values[f] for f in self.num_features]
+        if self.affine:
+            num -= self.mean
+            num /= self.scale
+        else:
+            with numpy_input():
+                num[:] = self.scaler.transform(num.reshape(1, -1))[0]
+        row[0, self.n_num:] = [self._encode(col, data[col]) for col in self.cat_features]
+        return row
+
+    def predict(self, data, timings=None):
+        start = time.perf_counter()
+        row = self.transform(data)
+        transformed = time.perf_counter()
+        with numpy_input():
+            prediction = float(self.model.predict(row)[0])
+        if timings is not None:
+            timings['transform'] = transformed - start
+            timings['model'] = time.perf_counter() - transformed
+        if self.transaction_type == 'location' and prediction < 100:
+            prediction = float(np.exp(prediction))
+        return prediction
+
+    def verify(self, reference_predict, samples, rtol=1e-9):
+        """Compare le chemin compilé au chemin pandas sur des échantillons ; retourne les écarts"""
+        mismatches = []
+        for sample in samples:
+            fast = self.predict(sample)
+            reference = reference_predict(sample)
+            if not np.isclose(fast, reference, rtol=rtol, atol=0):
+                mismatches.append({'input': sample, 'fast': fast, 'pandas': reference})
+        return mismatches
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Lancement en production : gunicorn -c gunicorn.conf.py
+
+Le master importe app.py (modèles + données de stats) AVANT de forker les workers :
+les pages mémoire des modèles et des DataFrames sont partagées en copy-on-write.
+Paramètres (variables d'environnement) :
+- GUNICORN_BIND (défaut 0.0.0.0:5000)
+- WEB_CONCURRENCY : nombre de workers (défaut : nombre de CPU)
+- GUNICORN_THREADS : threads par worker (défaut 1)
+- GUNICORN_TIMEOUT : délai avant de tuer un worker bloqué (défaut 30s)
+- GUNICORN_GRACEFUL_TIMEOUT : délai pour terminer les requêtes en cours à l'arrêt (défaut 30s)
+- GUNICORN_MAX_REQUESTS : recyclage d'un worker après N requêtes (défaut 0 = jamais)
+"""
+
+import gc
+import os
+
+# Lu par app.py à l'import : les threads d'arrière-plan sont démarrés après le fork
+os.environ['APP_PRELOAD'] = '1'
+# Préchargement complet par défaut : c'est ce qui est partagé entre workers
+os.environ.setdefault('MODEL_LOADING', 'eager')
+
+wsgi_app = 'app:app'
+preload_app = True
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+
+def on_starting(server):
+    """Dans le master, après le préchargement de l'app et avant le premier fork"""
+    import app
+
+    # MODEL_LOADING=background : on attend la fin du préchauffage pour que les
+    # workers héritent de modèles prêts au lieu de les recharger chacun
+    if app.MODEL_LOADING != 'lazy':
+        app.MODEL_REGISTRY.warm_up(background=False)
+
+    # Les objets déjà créés sortent du suivi du GC : ses passages n'écrivent plus
+    # dans leurs en-têtes, les pages restent partagées entre workers
+    gc.collect()
+    gc.freeze()
+    server.log.info("Modèles et données préchargés, %s workers", workers)
+
+
+def post_fork(server, worker):
+    import app
+    import logging_setup
+
+    logging_setup.after_fork()
+    app.start_model_watcher()
+    app.start_data_refresher()
+
+
+def worker_int(worker):
+    worker.log.info("Worker %s interrompu", worker.pid)
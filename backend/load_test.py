@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Test de charge de l'API : requêtes/s et latences p50/p99 sur /predict et /stats/*
+
+Usage :
+  python load_test.py --url http://localhost:5000            # serveur déjà lancé
+  python load_test.py --start dev --start gunicorn           # lance et compare les deux
+Options : --concurrency 8 --duration 10 --endpoint predict --endpoint stats_city ...
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PREDICT_BODY = json.dumps({
+    'city': 'Casablanca',
+    'quartier': 'Maârif',
+    'property_type': 'Appartement',
+    'surface_m2': 80,
+    'num_rooms': 3,
+    'num_bathrooms': 1,
+    'transaction_type': 'vente'
+})
+
+# nom -> (méthode, chemin, corps)
+ENDPOINTS = {
+    'predict': ('POST', '/predict', PREDICT_BODY),
+    'stats_summary': ('GET', '/stats/summary', None),
+    'stats_city': ('GET', '/stats/city/Casablanca', None),
+    'stats_quartiers': ('GET', '/stats/quartiers/Marrakech', None)
+}
+
+# Serveurs lancés par --start : nom -> (commande, port)
+SERVERS = {
+    'dev': ([sys.executable, 'app.py'], 5000),
+    'gunicorn': ([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], 5001)
+}
+
+
+def client(url, endpoint, duration, queue):
+    """Boucle d'un client : une connexion keep-alive, requêtes enchaînées pendant `duration`"""
+    method, path, body = ENDPOINTS[endpoint]
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    headers = {'Content-Type': 'application/json'} if body else {}
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    queue.put((latencies, errors))
+
+
+def run_endpoint(url, endpoint, concurrency, duration):
+    """Lance `concurrency` processus clients (pas de GIL partagé côté client)"""
+    queue = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(url, endpoint, duration, queue))
+             for _ in range(concurrency)]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = np.array([l for r in results for l in r[0]]) * 1000
+    errors = sum(r[1] for r in results)
+    if len(latencies) == 0:
+        return {'requests': 0, 'errors': errors, 'rps': 0.0, 'p50_ms': float('nan'), 'p99_ms': float('nan')}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99))
+    }
+
+
+def wait_ready(url, timeout=180):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request('GET', '/health')
+            payload = json.loads(conn.getresponse().read())
+            conn.close()
+            if payload.get('ready'):
+                return True
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_server(name):
+    command, port = SERVERS[name]
+    env = dict(os.environ, PORT=str(port), GUNICORN_BIND=f'127.0.0.1:{port}')
+    # Nouveau groupe de processus : le reloader du serveur de dev et les workers gunicorn
+    # sont arrêtés avec le processus principal
+    proc = subprocess.Popen(command, cwd=CURRENT_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, f'http://127.0.0.1:{port}'
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=60)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def bench(label, url, endpoints, concurrency, duration):
+    print(f"\n⏱️ {label} ({url}) : {concurrency} clients, {duration:g}s par endpoint")
+    print(f"  {'endpoint':<18} {'req/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'erreurs':>8}")
+    results = {}
+    for endpoint in endpoints:
+        r = run_endpoint(url, endpoint, concurrency, duration)
+        results[endpoint] = r
+        print(f"  {endpoint:<18} {r['rps']:>10.0f} {r['p50_ms']:>10.2f} {r['p99_ms']:>10.2f} {r['errors']:>8}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test de charge de l'API")
+    parser.add_argument('--url', action='append', default=[], help="serveur déjà lancé (répétable)")
+    parser.add_argument('--start', action='append', default=[], choices=list(SERVERS),
+                        help="lance le serveur avant le test (répétable)")
+    parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS),
+                        help="endpoints testés (défaut : tous)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or list(ENDPOINTS)
+    urls = args.url or ([] if args.start else ['http://localhost:5000'])
+
+    summary = {}
+    for url in urls:
+        summary[url] = bench('serveur', url, endpoints, args.concurrency, args.duration)
+
+    for name in args.start:
+        print(f"\n🚀 Démarrage du serveur {name}...")
+        proc, url = start_server(name)
+        try:
+            if not wait_ready(url):
+                print(f"❌ Le serveur {name} n'a pas démarré")
+                continue
+            summary[name] = bench(name, url, endpoints, args.concurrency, args.duration)
+        finally:
+            stop_server(proc)
+
+    if len(summary) > 1:
+        baseline, *others = list(summary)
+        for other in others:
+            print(f"\n📊 {other} / {baseline}")
+            for endpoint in endpoints:
+                a, b = summary[baseline][endpoint], summary[other][endpoint]
+                if a['rps']:
+                    print(f"  {endpoint:<18} débit x{b['rps'] / a['rps']:.1f}, "
+                          f"p99 {a['p99_ms']:.1f} → {b['p99_ms']:.1f} ms")
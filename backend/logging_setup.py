@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Journalisation de l'API
+- niveaux configurables (LOG_LEVEL), sortie texte ou JSON (LOG_FORMAT)
+- les handlers n'écrivent jamais dans le thread de la requête : les enregistrements
+  passent par une file bornée vidée par un thread dédié (QueueListener)
+- échantillonnage des lignes DEBUG par requête (LOG_SAMPLE_RATE) : toutes les lignes
+  d'une requête échantillonnée sont gardées, aucune pour les autres
+- identifiant de requête (en-tête X-Request-ID, généré sinon) et champs de timing
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+QUEUE_SIZE = 10000
+SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_sampled = contextvars.ContextVar('sampled', default=True)
+
+_handler = None
+_listener = None
+_output = None
+
+# Attributs standard d'un LogRecord (le reste vient de extra=...)
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+class ContextFilter(logging.Filter):
+    """Ajoute request_id et écarte les lignes DEBUG des requêtes non échantillonnées"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return record.levelno > logging.DEBUG or _sampled.get()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler non bloquant : si la file est pleine, l'enregistrement est compté et perdu"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        # Champs passés avec extra={...} (durées, statut, chemin...)
+        payload.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_handler.queue, _output, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging(default_level='WARNING'):
+    """Installe le handler de file sur le logger racine (idempotent)"""
+    global _handler, _output
+    if _handler is not None:
+        return
+
+    level = os.environ.get('LOG_LEVEL', default_level).upper()
+    _output = logging.StreamHandler(sys.stdout)
+    _output.setFormatter(JsonFormatter() if os.environ.get('LOG_FORMAT', 'text').lower() == 'json'
+                         else TextFormatter())
+
+    # prepare() de QueueHandler est remplacé : le formatage se fait dans le thread du listener
+    _handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    _handler.prepare = lambda record: record
+    _handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(level)
+    _start_listener()
+    atexit.register(stop_logging)
+
+
+def after_fork():
+    """Le thread du listener ne survit pas au fork : nouvelle file et nouveau listener"""
+    if _handler is None:
+        return
+    _handler.queue = queue.Queue(QUEUE_SIZE)
+    _start_listener()
+
+
+def stop_logging():
+    """Vide la file avant l'arrêt du processus"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+# ============================================
+# CONTEXTE DE REQUÊTE
+# ============================================
+def begin_request(request_id=None):
+    """Ouvre le contexte d'une requête : identifiant + tirage de l'échantillonnage"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    tokens = (_request_id.set(request_id), _sampled.set(random.random() < SAMPLE_RATE))
+    return request_id, tokens, time.perf_counter()
+
+
+def end_request(tokens):
+    _request_id.reset(tokens[0])
+    _sampled.reset(tokens[1])
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def init_app(app):
+    """Hooks Flask : X-Request-ID, ligne de synthèse DEBUG échantillonnée, requêtes lentes en WARNING"""
+    from flask import g, request
+
+    logger = logging.getLogger('api.request')
+    slow_ms = float(os.environ.get('LOG_SLOW_MS', 1000))
+
+    @app.before_request
+    def _begin():
+        g.request_id, g.log_tokens, g.request_start = begin_request(request.headers.get(REQUEST_ID_HEADER))
+
+    @app.after_request
+    def _finish(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        duration_ms = (time.perf_counter() - start) * 1000
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        fields = {'method': request.method, 'path': request.path,
+                  'status': response.status_code, 'duration_ms': round(duration_ms, 3)}
+        if duration_ms >= slow_ms:
+            logger.warning("Requête lente %s %s : %.0f ms", request.method, request.path, duration_ms, extra=fields)
+        else:
+            logger.debug("%s %s -> %s (%.2f ms)", request.method, request.path,
+                         response.status_code, duration_ms, extra=fields)
+        return response
+
+    @app.teardown_request
+    def _end(exc):
+        tokens = g.pop('log_tokens', None)
+        if tokens is not None:
+            end_request(tokens)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques de l'API au format texte Prometheus (endpoint /metrics)
+- Counter / Histogram minimalistes : un verrou par métrique, buckets fixes
+- observe_many() enregistre toutes les étapes d'une requête sous un seul verrou
+- collecteurs appelés au scrape pour les valeurs déjà tenues ailleurs (cache, modèles)
+Désactivable avec METRICS_ENABLED=0 (les enregistrements deviennent des no-ops)
+Avec gunicorn, chaque worker expose ses propres compteurs
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+
+# Secondes : de 50 µs (pipeline compilé) à 10 s (batch volumineux)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [compteurs par bucket (non cumulés, +Inf en dernier), somme, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _serie(self, labels):
+        serie = self._series.get(labels)
+        if serie is None:
+            serie = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return serie
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._serie(labels)
+            serie[0][index] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def observe_many(self, prefix, values):
+        """values : {dernier label: secondes} ; prefix : valeurs des premiers labels"""
+        if not ENABLED or not values:
+            return
+        buckets = self.buckets
+        with self._lock:
+            for last, value in values.items():
+                serie = self._serie(prefix + (last,))
+                serie[0][bisect_left(buckets, value)] += 1
+                serie[1] += value
+                serie[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """collector() -> liste de (nom, type, aide, {labels}, valeur)"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            declared = set()
+            for name, kind, documentation, labels, value in collector():
+                if name not in declared:
+                    lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {kind}'])
+                    declared.add(name)
+                lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.histogram(
+    'http_request_duration_seconds', "Durée des requêtes HTTP", ('endpoint', 'method', 'status'))
+STAGE_DURATION = REGISTRY.histogram(
+    'predict_stage_duration_seconds', "Durée de chaque étape du pipeline de prédiction",
+    ('endpoint', 'transaction_type', 'stage'))
+CACHE_REQUESTS = REGISTRY.counter(
+    'predict_cache_requests_total', "Consultations du cache de prédictions", ('transaction_type', 'result'))
+ERRORS = REGISTRY.counter(
+    'predict_errors_total', "Erreurs des endpoints de prédiction", ('endpoint', 'error'))
+BATCH_ROWS = REGISTRY.counter(
+    'predict_batch_rows_total', "Lignes traitées par /predict/batch", ('transaction_type', 'result'))
+
+
+def init_app(app):
+    """Durée de chaque requête, étiquetée par la route (pas l'URL : cardinalité bornée)"""
+    from flask import g, request
+
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - start, rule, request.method, str(response.status_code))
+        return response
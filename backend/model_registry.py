@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Registre des modèles : chargement à la demande, par type de transaction
+- chaque bundle (modèle + encoder + scaler + features) est chargé au premier usage
+- un seul thread charge un bundle donné, les autres attendent sur son verrou
+- préchauffage optionnel en arrière-plan
+- rechargement à chaud : nouveau bundle chargé et validé à côté de l'actif, puis
+  substitué atomiquement (les requêtes en cours terminent sur l'ancienne version)
+Politique (variable MODEL_LOADING) : eager (au démarrage), background, lazy
+"""
+
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from prediction_cache import model_fingerprint
+
+# Fichiers et métadonnées de chaque bundle
+BUNDLE_SPECS = {
+    'vente': {
+        'label': 'VENTE',
+        'model_type': 'Gradient Boosting Regressor',
+        'model': 'gradient_boosting_model.pkl',
+        'target_encoder': 'target_encoder.pkl',
+        'scaler': 'scaler.pkl',
+        'features': 'feature_names.pkl',
+        'performance': 'model_performance_summary.csv',
+        'rmse_key': 'rmse_test',
+        'r2_key': 'r2_test'
+    },
+    'location': {
+        'label': 'LOCATION',
+        'model_type': 'Stacking Ensemble',
+        'model': 'model_Location_final_stacking.pkl',
+        'target_encoder': 'location_target_encoder.pkl',
+        'scaler': 'location_scaler.pkl',
+        'features': 'location_feature_names.pkl',
+        'performance': 'location_model_performance_summary.csv',
+        'rmse_key': 'rmse_test_dh',
+        'r2_key': 'r2_test_log'
+    }
+}
+
+PICKLE_KEYS = ['model', 'target_encoder', 'scaler', 'features']
+WATCHED_KEYS = PICKLE_KEYS + ['performance']
+
+logger = logging.getLogger(__name__)
+
+# Délai avant de retenter un bundle dont le chargement a échoué
+RETRY_AFTER_SECONDS = 30
+
+
+class ModelUnavailableError(RuntimeError):
+    pass
+
+
+def load_performance(model_dir, spec):
+    """Première ligne du CSV de performances (dict vide si absent)"""
+    path = os.path.join(model_dir, spec['performance'])
+    if not os.path.exists(path):
+        return {}
+    return pd.read_csv(path).iloc[0].to_dict()
+
+
+def performance_fingerprint(model_dir, spec):
+    """Empreinte du CSV de performances (None si absent) : RMSE de l'intervalle de confiance"""
+    path = os.path.join(model_dir, spec['performance'])
+    return model_fingerprint([path]) if os.path.exists(path) else None
+
+
+class ModelBundle:
+    """Artefacts chargés d'un type de transaction"""
+
+    def __init__(self, name, spec, model_dir):
+        start = time.perf_counter()
+        self.name = name
+        self.spec = spec
+        self.model_dir = model_dir
+
+        artifacts = {}
+        for key in PICKLE_KEYS:
+            with open(os.path.join(model_dir, spec[key]), 'rb') as f:
+                artifacts[key] = pickle.load(f)
+        self.model = artifacts['model']
+        self.target_encoder = artifacts['target_encoder']
+        self.scaler = artifacts['scaler']
+        self.features_dict = artifacts['features']
+        self.num_features = list(self.features_dict.get('numeric_features', []))
+        self.cat_features = list(self.features_dict.get('categorical_features', []))
+
+        self.performance_fingerprint = performance_fingerprint(model_dir, spec)
+        self.performance = load_performance(model_dir, spec)
+        self.rmse_key = spec['rmse_key']
+        self.fingerprint = model_fingerprint([os.path.join(model_dir, spec[key]) for key in PICKLE_KEYS])
+        self.loaded_at = datetime.now()
+        self.load_seconds = time.perf_counter() - start
+
+        # Numéro de version attribué par le registre au moment de l'activation
+        self.version = None
+
+        # Pipeline compilé attaché par le hook on_load de l'API (None = chemin pandas)
+        self.pipeline = None
+
+    @property
+    def rmse(self):
+        return float(self.performance.get(self.rmse_key, 0))
+
+
+def files_signature(model_dir, spec):
+    """(taille, mtime) des fichiers d'un bundle, pour détecter un redéploiement"""
+    signature = []
+    for key in WATCHED_KEYS:
+        try:
+            stat = os.stat(os.path.join(model_dir, spec[key]))
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ModelRegistry:
+    """Accès thread-safe aux bundles, chargés au premier get()"""
+
+    def __init__(self, model_dir, specs=BUNDLE_SPECS, on_load=None, validate=None, on_swap=None):
+        self.model_dir = model_dir
+        self.specs = specs
+        self.on_load = on_load
+        self.validate = validate
+        self.on_swap = on_swap
+        self._bundles = {}
+        self._locks = {name: threading.Lock() for name in specs}
+        # pickle.load importe des modules sklearn : deux chargements concurrents peuvent
+        # provoquer un interblocage d'import, on sérialise donc la désérialisation
+        self._unpickle_lock = threading.Lock()
+        self._states = {name: 'not_loaded' for name in specs}
+        self._errors = {}
+        self._performance = {}
+        self._warmup_thread = None
+        self._versions = {name: 0 for name in specs}
+        self._reload_locks = {name: threading.Lock() for name in specs}
+        self._reloads = {name: {'state': 'idle'} for name in specs}
+        self._watcher_thread = None
+
+    @property
+    def names(self):
+        return list(self.specs)
+
+    def is_ready(self, name):
+        return name in self._bundles
+
+    def get(self, name):
+        bundle = self._bundles.get(name)
+        if bundle is not None:
+            return bundle
+        with self._locks[name]:
+            # Un autre thread a pu charger le bundle pendant l'attente du verrou
+            bundle = self._bundles.get(name)
+            if bundle is not None:
+                return bundle
+            error = self._errors.get(name)
+            if error and time.monotonic() - error[0] < RETRY_AFTER_SECONDS:
+                raise ModelUnavailableError(f"Modèle {name} indisponible : {error[1]}")
+            return self._load(name)
+
+    def _build(self, name):
+        """Charge un bundle hors du registre : désérialisation, hook on_load, validation"""
+        with self._unpickle_lock:
+            bundle = ModelBundle(name, self.specs[name], self.model_dir)
+        if self.on_load is not None:
+            self.on_load(bundle)
+        if self.validate is not None:
+            self.validate(bundle)
+        return bundle
+
+    def _activate(self, name, bundle):
+        """Substitution atomique : les nouvelles requêtes voient le nouveau bundle"""
+        self._versions[name] += 1
+        bundle.version = self._versions[name]
+        self._bundles[name] = bundle
+        self._errors.pop(name, None)
+        self._states[name] = 'ready'
+        if self.on_swap is not None:
+            self.on_swap(bundle)
+
+    def _load(self, name):
+        spec = self.specs[name]
+        self._states[name] = 'loading'
+        logger.info("📦 Chargement du modèle %s...", spec['label'])
+        try:
+            bundle = self._build(name)
+        except Exception as e:
+            self._states[name] = 'error'
+            self._errors[name] = (time.monotonic(), str(e))
+            logger.error("❌ Erreur lors du chargement du modèle %s : %s", spec['label'], e)
+            raise ModelUnavailableError(f"Modèle {name} indisponible : {e}") from e
+        self._activate(name, bundle)
+        logger.info("✅ Modèle %s v%d chargé en %.2fs (RMSE: %.0f DH, empreinte %s)",
+                    spec['label'], bundle.version, bundle.load_seconds, bundle.rmse, bundle.fingerprint,
+                    extra={'load_seconds': round(bundle.load_seconds, 3)})
+        return bundle
+
+    def reload(self, name):
+        """
+        Recharge un bundle depuis MODEL_DIR sans interrompre le service
+        L'ancien bundle reste actif si le chargement ou la validation échoue
+        """
+        spec = self.specs[name]
+        with self._reload_locks[name]:
+            self._performance.pop(name, None)
+            self._reloads[name] = {'state': 'reloading', 'started_at': datetime.now().isoformat()}
+            current = self._bundles.get(name)
+            logger.info("🔁 Rechargement du modèle %s...", spec['label'])
+            try:
+                bundle = self._build(name)
+            except Exception as e:
+                self._reloads[name] = {'state': 'failed', 'error': str(e), 'at': datetime.now().isoformat()}
+                logger.error("❌ Rechargement %s refusé, version active conservée : %s", spec['label'], e)
+                return {'name': name, 'status': 'failed', 'error': str(e),
+                        'active_version': current.version if current else None}
+
+            # Modèle et performances (RMSE) inchangés : un CSV de performances mis à jour seul
+            # est une nouvelle version, comme pour le watcher (WATCHED_KEYS)
+            if (current is not None and bundle.fingerprint == current.fingerprint
+                    and bundle.performance_fingerprint == current.performance_fingerprint):
+                self._reloads[name] = {'state': 'idle', 'last_result': 'unchanged', 'at': datetime.now().isoformat()}
+                return {'name': name, 'status': 'unchanged', 'active_version': current.version}
+
+            with self._locks[name]:
+                self._activate(name, bundle)
+            self._reloads[name] = {'state': 'idle', 'last_result': 'swapped', 'at': datetime.now().isoformat()}
+            logger.info("✅ Modèle %s v%d actif (empreinte %s)", spec['label'], bundle.version, bundle.fingerprint)
+            return {'name': name, 'status': 'swapped', 'active_version': bundle.version,
+                    'previous_version': current.version if current else None,
+                    'fingerprint': bundle.fingerprint}
+
+    def reload_async(self, names=None):
+        """Lance les rechargements dans un thread ; l'avancement est visible dans status()"""
+        thread = threading.Thread(
+            target=lambda: [self.reload(name) for name in (names or self.names)],
+            name='model-reload', daemon=True
+        )
+        thread.start()
+        return thread
+
+    def watch(self, interval):
+        """Surveille MODEL_DIR et recharge un bundle dont les fichiers ont changé"""
+        def run():
+            known = {name: files_signature(self.model_dir, spec) for name, spec in self.specs.items()}
+            pending = {}
+            while True:
+                time.sleep(interval)
+                for name, spec in self.specs.items():
+                    signature = files_signature(self.model_dir, spec)
+                    if signature == known[name]:
+                        pending.pop(name, None)
+                        continue
+                    # On attend deux relevés identiques : la copie des fichiers doit être terminée
+                    if pending.get(name) != signature:
+                        pending[name] = signature
+                        continue
+                    pending.pop(name, None)
+                    known[name] = signature
+                    if name in self._bundles:
+                        logger.info("👀 Fichiers du modèle %s modifiés", spec['label'])
+                        self.reload(name)
+
+        self._watcher_thread = threading.Thread(target=run, name='model-watcher', daemon=True)
+        self._watcher_thread.start()
+        return self._watcher_thread
+
+    def warm_up(self, background=True):
+        """Charge tous les bundles, dans un thread démon si background=True"""
+        def run():
+            for name in self.names:
+                try:
+                    self.get(name)
+                except ModelUnavailableError:
+                    pass
+
+        if not background:
+            run()
+            return None
+        self._warmup_thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def performance(self, name):
+        """Performances d'entraînement (CSV seulement, sans charger le modèle)"""
+        bundle = self._bundles.get(name)
+        if bundle is not None:
+            return bundle.performance
+        if name not in self._performance:
+            self._performance[name] = load_performance(self.model_dir, self.specs[name])
+        return self._performance[name]
+
+    def fingerprint(self):
+        """Empreinte combinée des bundles chargés"""
+        return '|'.join(f"{name}:{self._bundles[name].fingerprint}" for name in self.names if name in self._bundles) or None
+
+    def status(self):
+        result = {}
+        for name in self.names:
+            bundle = self._bundles.get(name)
+            entry = {'state': self._states[name]}
+            if bundle is not None:
+                entry.update({
+                    'version': bundle.version,
+                    'fingerprint': bundle.fingerprint,
+                    'loaded_at': bundle.loaded_at.isoformat(),
+                    'load_seconds': round(bundle.load_seconds, 3),
+                    'compiled_pipeline': bundle.pipeline is not None
+                })
+            if name in self._errors:
+                entry['error'] = self._errors[name][1]
+            entry['reload'] = self._reloads[name]
+            result[name] = entry
+        return result
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Cache des prédictions : LRU borné en taille + expiration TTL
+La clé inclut l'empreinte des modèles chargés : un rechargement invalide le cache
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def model_fingerprint(paths):
+    """Empreinte SHA-1 du contenu des fichiers de modèles (ordre des chemins respecté)"""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def prediction_key(data, transaction_type):
+    """Tuple normalisé des entrées : mêmes conversions que /predict (float / int)"""
+    return (
+        transaction_type,
+        data['city'],
+        data['quartier'],
+        data['property_type'],
+        float(data['surface_m2']),
+        int(data['num_rooms']),
+        int(data['num_bathrooms'])
+    )
+
+
+class PredictionCache:
+    """Cache en mémoire du processus, thread-safe"""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=10000, ttl=3600, fingerprint=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.fingerprint = fingerprint
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        key = (self.fingerprint, key)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        key = (self.fingerprint, key)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def set_fingerprint(self, fingerprint):
+        """Nouveaux modèles : les anciennes entrées ne sont plus jamais servies"""
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self.fingerprint = fingerprint
+                self._data.clear()
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'enabled': self.enabled,
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'model_fingerprint': self.fingerprint
+        }
+
+
+class RedisPredictionCache(PredictionCache):
+    """
+    Variante partagée entre tous les workers (nécessite le paquet `redis`)
+    L'éviction LRU est déléguée au serveur (maxmemory-policy allkeys-lru)
+    """
+
+    backend = 'redis'
+
+    def __init__(self, url, maxsize=10000, ttl=3600, fingerprint=None):
+        import redis
+        super().__init__(maxsize, ttl, fingerprint)
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._client.ping()
+
+    def _redis_key(self, key):
+        return 'immo:predict:' + hashlib.sha1(repr((self.fingerprint, key)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        try:
+            value = self._client.get(self._redis_key(key))
+        except Exception:
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return float(value)
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        try:
+            self._client.set(self._redis_key(key), repr(float(value)), ex=max(1, int(self.ttl)))
+        except Exception:
+            pass  # Cache indisponible : la prédiction reste servie
+
+    def set_fingerprint(self, fingerprint):
+        # Les clés Redis contiennent l'empreinte : l'ancienne génération expire seule
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.invalidations += 1
+
+    def clear(self):
+        for key in self._client.scan_iter('immo:predict:*'):
+            self._client.delete(key)
+
+    def stats(self):
+        result = super().stats()
+        result['size'] = None
+        return result
+
+
+def create_prediction_cache(fingerprint=None):
+    """Instancie le cache selon PREDICTION_CACHE_URL / _SIZE / _TTL"""
+    maxsize = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+    ttl = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+    url = os.environ.get('PREDICTION_CACHE_URL')
+    if url:
+        try:
+            return RedisPredictionCache(url, maxsize, ttl, fingerprint)
+        except Exception as e:
+            logger.warning("⚠️ Cache partagé indisponible (%s), repli sur le cache en mémoire", e)
+    return PredictionCache(maxsize, ttl, fingerprint)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Sketches de quantiles (type KLL) pour les percentiles par ville et quartier
+
+Un QuantileSketch résume un flux de valeurs en au plus k valeurs par niveau :
+- niveau h : valeurs de poids 2^h ; quand un niveau atteint k valeurs, il est trié et une
+  valeur sur deux (décalage aléatoire) monte au niveau h + 1 avec un poids doublé
+- update() ajoute un tableau de valeurs, merge() fusionne deux sketches niveau par niveau :
+  les sketches se construisent au chargement et se complètent sans relire les données
+- un groupe de moins de k valeurs n'est jamais compacté : ses percentiles sont exacts
+
+Borne d'erreur (déterministe, tenue par chaque sketch) : une compaction au niveau h déplace
+le rang de n'importe quelle valeur d'au plus 2^h. Le sketch cumule ces décalages dans
+`error` ; le percentile p renvoyé est une valeur observée dont le rang est à moins de
+`error` du rang p·n. Avec k identique à tous les niveaux, un niveau h est compacté au plus
+n / (k·2^h) fois, d'où error <= H·n / k (H : nombre de niveaux, ~log2(n / k)) :
+avec k = 256 et 10 millions de valeurs, rang à ±6 % au pire. Les décalages aléatoires se
+compensant, l'erreur observée reste sous 1 % (bench_quantiles.py : ~0,5 % sur les annonces
+et sur 2 millions de prix synthétiques).
+
+Réponse en temps constant par rapport au nombre d'annonces : la vue triée (k·H valeurs au
+plus) est calculée une fois après chaque mise à jour, puis chaque percentile est une
+recherche dichotomique dans les poids cumulés
+"""
+
+import random
+
+import numpy as np
+import pandas as pd
+
+from data_index import fold_key
+
+DEFAULT_K = 256
+DEFAULT_PERCENTILES = [10, 25, 50, 75, 90]
+
+# Métriques résumées par annonce
+METRICS = ['price', 'prix_m2', 'surface_m2']
+
+
+class QuantileSketch:
+    __slots__ = ('k', 'levels', 'count', 'error', 'min', 'max', '_view')
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.error = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._view = None
+
+    def copy(self):
+        """Copie indépendante : les tableaux des niveaux ne sont jamais modifiés sur place"""
+        other = QuantileSketch(self.k)
+        other.levels = list(self.levels)
+        other.count, other.error, other.min, other.max = self.count, self.error, self.min, self.max
+        return other
+
+    def update(self, values):
+        """Ajoute des valeurs (NaN ignorés)"""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Ajoute le contenu d'un autre sketch (mêmes garanties : les erreurs s'additionnent)"""
+        if not other.count:
+            return self
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self.error += other.error
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        self._view = None
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) >= self.k:
+                items = np.sort(items)
+                # Une valeur gardée telle quelle si le nombre est impair, les autres par paires
+                odd = len(items) % 2
+                offset = random.getrandbits(1)
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[odd + offset::2]])
+                self.levels[h] = items[:odd]
+                self.error += 2 ** h
+            h += 1
+
+    def _sorted_view(self):
+        if self._view is None:
+            values = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(self.levels)])
+            order = np.argsort(values, kind='stable')
+            self._view = (values[order], np.cumsum(weights[order]))
+        return self._view
+
+    def quantile(self, q):
+        """Valeur observée de rang ~q·n (0 <= q <= 1) ; min et max sont exacts"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._sorted_view()
+        index = min(int(np.searchsorted(cumulative, q * self.count, side='left')), len(values) - 1)
+        return float(values[index])
+
+    def rank_error(self):
+        """Borne de l'erreur de rang, en fraction de n (0 : percentiles exacts)"""
+        return self.error / self.count if self.count else 0.0
+
+    def size(self):
+        """Valeurs retenues (mémoire du sketch)"""
+        return sum(len(items) for items in self.levels)
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        return {
+            'count': self.count,
+            'percentiles': {f'p{p:g}': self.quantile(p / 100) for p in percentiles},
+            'rank_error': self.rank_error(),
+            'exact': self.error == 0
+        }
+
+
+def metric_values(df):
+    """Valeurs de chaque métrique (NaN si non définie : prix/m² sans surface)"""
+    price = df['price'].to_numpy(dtype=float)
+    surface = df['surface_m2'].to_numpy(dtype=float)
+    return {
+        'price': price,
+        'prix_m2': np.divide(price, surface, out=np.full(len(price), np.nan), where=surface > 0),
+        'surface_m2': surface
+    }
+
+
+class QuantileIndex:
+    """
+    Sketches par métrique pour l'ensemble des annonces, chaque ville et chaque (ville, quartier)
+    Clés : (métrique, clé de ville ou None, clé de quartier ou None), casse et accents ignorés
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.sketches = {}
+
+    @classmethod
+    def from_frame(cls, df, k=DEFAULT_K):
+        return cls(k).add(df)
+
+    def _sketch(self, key):
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = QuantileSketch(self.k)
+        return sketch
+
+    def add(self, df):
+        """Ajoute des annonces (colonnes city_key, quartier, price, surface_m2)"""
+        if not len(df):
+            return self
+        values = metric_values(df)
+        cities = df['city_key'].astype(object).to_numpy()
+        if 'quartier' in df.columns:
+            quartiers = df['quartier'].astype(object)
+            quartiers = quartiers.map(fold_key, na_action='ignore').to_numpy()
+        else:
+            quartiers = np.full(len(df), None, dtype=object)
+
+        groups = pd.DataFrame({'city': cities, 'quartier': quartiers})
+        for metric, column in values.items():
+            self._sketch((metric, None, None)).update(column)
+        for city, positions in groups.groupby('city', sort=False).indices.items():
+            for metric, column in values.items():
+                self._sketch((metric, city, None)).update(column[positions])
+        for (city, quartier), positions in groups.groupby(['city', 'quartier'], sort=False).indices.items():
+            for metric, column in values.items():
+                self._sketch((metric, city, quartier)).update(column[positions])
+        return self
+
+    def merge(self, other):
+        """Fusionne un autre index (par exemple construit sur les nouvelles annonces seulement)"""
+        for key, sketch in other.sketches.items():
+            self._sketch(key).merge(sketch)
+        return self
+
+    def merged(self, other):
+        """
+        Nouvel index self + other, sans modifier self (copy-on-write) : les sketches que other
+        ne touche pas sont partagés, les autres copiés puis complétés
+        """
+        result = QuantileIndex(self.k)
+        result.sketches = dict(self.sketches)
+        for key, sketch in other.sketches.items():
+            current = result.sketches.get(key)
+            result.sketches[key] = sketch if current is None else current.copy().merge(sketch)
+        return result
+
+    def get(self, metric, city=None, quartier=None):
+        return self.sketches.get((metric, fold_key(city) if city else None, fold_key(quartier) if quartier else None))
+
+    def percentiles(self, metric, city=None, quartier=None, percentiles=DEFAULT_PERCENTILES):
+        sketch = self.get(metric, city, quartier)
+        if sketch is None or not sketch.count:
+            return None
+        return sketch.summary(percentiles)
+
+    def size(self):
+        """(nombre de sketches, valeurs retenues au total)"""
+        return len(self.sketches), sum(s.size() for s in self.sketches.values())
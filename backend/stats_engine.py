@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de statistiques précalculées
+Les agrégats sont calculés une fois au chargement des données ; les endpoints
+/stats/* ne font plus que des lookups dans des dicts
+Les percentiles (prix, prix/m², surface) viennent de sketches de quantiles construits
+au chargement par ville et par quartier (quantile_sketch.py)
+"""
+
+import pandas as pd
+
+from data_index import CityIndex, fold_key
+from quantile_sketch import DEFAULT_PERCENTILES, QuantileIndex
+
+TOP_QUARTIERS = 10
+
+
+def is_latin_text(text):
+    """Vérifie si le texte contient principalement des caractères latins"""
+    if not text or not isinstance(text, str):
+        return False
+    latin_chars = sum(1 for c in text if c.isascii() or c in 'éèêëàâäùûüôöîïç')
+    return latin_chars / max(len(text), 1) > 0.5
+
+
+def filter_cities(cities_list):
+    """Filtre les villes pour ne garder que celles en caractères latins"""
+    return [city for city in cities_list if is_latin_text(city)]
+
+
+def city_key(city):
+    """Clé de recherche d'une ville (casse et accents ignorés, cf. data_index.fold_key)"""
+    return fold_key(city)
+
+
+def summarize(df_stats):
+    """Moyennes globales sur les données filtrées (outliers exclus)"""
+    return {
+        'prix_moyen': float(df_stats['price'].mean()),
+        'prix_m2_moyen': float(df_stats['price'].mean() / df_stats['surface_m2'].mean()),
+        'surface_moyenne': float(df_stats['surface_m2'].mean())
+    }
+
+
+def build_cube(df):
+    """
+    Agrégats count/sum/min/max par (ville, quartier, type de bien)
+    Les quartiers / types manquants forment leur propre cellule (NaN)
+    """
+    keyed = pd.DataFrame({
+        'city_key': df['city_key'],
+        'quartier': df['quartier'] if 'quartier' in df.columns else None,
+        'type_bien': df['type_bien'] if 'type_bien' in df.columns else None,
+        'price': df['price'],
+        'surface_m2': df['surface_m2']
+    })
+    return keyed.groupby(['city_key', 'quartier', 'type_bien'], dropna=False, sort=False, observed=True).agg(
+        count=('price', 'size'),
+        price_sum=('price', 'sum'),
+        price_min=('price', 'min'),
+        price_max=('price', 'max'),
+        surface_sum=('surface_m2', 'sum'),
+        surface_min=('surface_m2', 'min'),
+        surface_max=('surface_m2', 'max')
+    )
+
+
+def merge_cubes(cube, other):
+    """Cumul de deux cubes : comptes et sommes additionnés, min / max combinés"""
+    cells = pd.concat([cube.reset_index(), other.reset_index()], ignore_index=True)
+    levels = list(cube.index.names)
+    for level in levels:
+        cells[level] = cells[level].astype(object)
+    return cells.groupby(levels, dropna=False, sort=False).agg(
+        count=('count', 'sum'),
+        price_sum=('price_sum', 'sum'),
+        price_min=('price_min', 'min'),
+        price_max=('price_max', 'max'),
+        surface_sum=('surface_sum', 'sum'),
+        surface_min=('surface_min', 'min'),
+        surface_max=('surface_max', 'max')
+    )
+
+
+def cell_payload(row):
+    """Agrégats d'une cellule (ou d'un cumul de cellules) au format de l'API"""
+    count = int(row['count'])
+    prix_moyen = float(row['price_sum']) / count
+    surface_moyenne = float(row['surface_sum']) / count
+    return {
+        'count': count,
+        'prix_moyen': prix_moyen,
+        'prix_min': float(row['price_min']),
+        'prix_max': float(row['price_max']),
+        'prix_m2_moyen': prix_moyen / surface_moyenne if surface_moyenne else 0,
+        'surface_moyenne': surface_moyenne
+    }
+
+
+class TransactionStats:
+    """Agrégats précalculés pour un type de transaction (vente ou location)"""
+
+    def __init__(self, df, df_stats, cube=None, quantiles=None):
+        self.df = df
+        self.index = CityIndex(df)
+        self.count = int(len(df))
+        self.summary = dict({'count': self.count}, **summarize(df_stats))
+        self.cities = filter_cities(df['city'].dropna().unique().tolist())
+
+        self.cube = build_cube(df) if cube is None else cube
+        cells = self.cube.reset_index()
+
+        # Sketches de quantiles : ensemble, par ville, par (ville, quartier)
+        self.quantiles = QuantileIndex.from_frame(df) if quantiles is None else quantiles
+
+        # Cumul par ville
+        by_city = cells.groupby('city_key', sort=False, observed=True).agg(
+            count=('count', 'sum'),
+            price_sum=('price_sum', 'sum'),
+            price_min=('price_min', 'min'),
+            price_max=('price_max', 'max'),
+            surface_sum=('surface_sum', 'sum')
+        )
+        self.city_stats = {key: cell_payload(row) for key, row in by_city.iterrows()}
+
+        # Quartiers par ville : liste triée + classement par prix moyen
+        with_quartier = cells.dropna(subset=['quartier'])
+        by_quartier = with_quartier.groupby(['city_key', 'quartier'], observed=True).agg(
+            count=('count', 'sum'),
+            price_sum=('price_sum', 'sum')
+        ).reset_index()
+        by_quartier['prix_moyen'] = by_quartier['price_sum'] / by_quartier['count']
+
+        self.city_quartiers = {key: [] for key in self.city_stats}
+        self.top_quartiers = {key: [] for key in self.city_stats}
+        for key, group in by_quartier.groupby('city_key', sort=False, observed=True):
+            self.city_quartiers[key] = sorted(group['quartier'].tolist())
+            top = group.sort_values('prix_moyen', ascending=False, kind='stable').head(TOP_QUARTIERS)
+            self.top_quartiers[key] = [
+                {'quartier': q, 'count': int(n), 'prix_moyen': float(p)}
+                for q, n, p in zip(top['quartier'], top['count'], top['prix_moyen'])
+            ]
+
+    def extended(self, new_rows, df, df_stats):
+        """
+        Statistiques après ajout d'annonces (copy-on-write, self n'est pas modifié) :
+        cube et sketches de new_rows seulement, cumulés aux existants
+        df / df_stats : toutes les annonces, nouvelles comprises
+        """
+        return TransactionStats(df, df_stats, cube=merge_cubes(self.cube, build_cube(new_rows)),
+                                quantiles=self.quantiles.merged(QuantileIndex.from_frame(new_rows)))
+
+    def rows(self, city):
+        """Annonces d'une ville (tranche contiguë de df, sans copie) pour les filtres ad hoc"""
+        return self.index.rows(self.df, city)
+
+
+class StatsEngine:
+    """Ensemble des statistiques servies par /stats/*, immuable une fois construit"""
+
+    def __init__(self, frames, transactions=None):
+        # frames : {'vente': (df_clean, df_stats), 'location': (df_clean, df_stats)}
+        self.transactions = dict(transactions or {})
+        self.transactions.update({
+            name: TransactionStats(df, df_stats)
+            for name, (df, df_stats) in frames.items()
+            if df is not None and df_stats is not None
+        })
+        self.summary = self._build_summary()
+
+    def with_transaction(self, name, stats):
+        """Nouveau moteur où les statistiques d'un type de transaction sont remplacées"""
+        return StatsEngine({}, dict(self.transactions, **{name: stats}))
+
+    def _build_summary(self):
+        result = {'vente': {}, 'location': {}, 'cities': []}
+        vente = self.transactions.get('vente')
+        location = self.transactions.get('location')
+        if vente is not None:
+            result['vente'] = vente.summary
+            result['cities'] = vente.cities
+        if location is not None:
+            result['location'] = location.summary
+            # Combiner les villes (filtrées)
+            if vente is not None:
+                result['cities'] = sorted(set(vente.cities) | set(location.cities))
+        return result
+
+    def city(self, transaction, city):
+        stats = self.transactions.get(transaction)
+        return stats.city_stats.get(city_key(city)) if stats is not None else None
+
+    def quartiers(self, transaction, city):
+        stats = self.transactions.get(transaction)
+        return stats.city_quartiers.get(city_key(city), []) if stats is not None else []
+
+    def top_quartiers(self, transaction, city):
+        stats = self.transactions.get(transaction)
+        return stats.top_quartiers.get(city_key(city), []) if stats is not None else []
+
+    def percentiles(self, transaction, metric, city=None, quartier=None, percentiles=DEFAULT_PERCENTILES):
+        """Percentiles d'une métrique (sketch) : toutes annonces, une ville ou un quartier"""
+        stats = self.transactions.get(transaction)
+        if stats is None:
+            return None
+        return stats.quantiles.percentiles(metric, city, quartier, percentiles)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction en une seule passe des champs du texte d'une annonce Avito (prix, surface,
+chambres + salons, salles de bain), sans la douzaine de re.search de la version de
+référence (étapes 3 à 5 de avito_pages.details_from_text) ni ses regex f-string
+reconstruites pour chaque mot-clé de surface :
+- un tokenizer précompilé repère les mots-clés (DH, surface, m², chambres...)
+- le nombre qui précède / suit chaque mot-clé est lu directement dans le texte
+- la première occurrence valide de chaque champ est retenue, comme avec re.search
+Même résultat que la référence, vérifié par : python bench_avito_extract.py
+"""
+
+import re
+
+# Sans groupe capturant : sre garde alors son préfiltre sur le premier caractère
+# (d, s, m, c), environ 10x plus rapide que des alternatives nommées (?P<...>)
+# Sans le "s" final facultatif de chambres? / salons? : consommé, il masquerait
+# un mot-clé collé ("1 salonsurface")
+TOKENS = re.compile(r'dh|s(?:urface(?: totale)?|alon|alle\s*de\s*bain)|m[²2]|chambre')
+
+# Jeton -> champ ; "salle de bain" (espaces variables) est le cas par défaut
+KINDS = {
+    'dh': 'dh',
+    'surface totale': 'surface_totale',
+    'surface': 'surface',
+    'm²': 'm2_sup',
+    'm2': 'm2',
+    'chambre': 'chambres',
+    'salon': 'salons',
+}
+
+# Ordre de priorité de l'ancienne boucle surface_keywords : (mot-clé, nombre avant ?)
+SURFACE_PRIORITY = [
+    (key, before)
+    for key in ('surface totale', 'm²', 'm2', 'surface')
+    for before in (True, False)
+]
+
+# Occurrences d'un groupe du tokenizer valant pour chaque mot-clé de surface :
+# "surface totale" est aussi une occurrence de "surface" (nombre avant uniquement,
+# après "surface" vient " totale")
+SURFACE_KEYS = {
+    'surface_totale': ('surface totale', 'surface'),
+    'surface': ('surface',),
+    'm2_sup': ('m²',),
+    'm2': ('m2',),
+}
+
+
+def _digits_before(text, pos):
+    """(\\d+)\\s* terminé en pos : nombre, ou None"""
+    end = pos
+    while end > 0 and text[end - 1].isspace():
+        end -= 1
+    start = end
+    while start > 0 and text[start - 1].isdecimal():
+        start -= 1
+    return text[start:end] if start < end else None
+
+
+def _digits_after(text, pos, separators=':'):
+    """[:\\s]*(\\d+) commençant en pos : nombre, ou None"""
+    n = len(text)
+    while pos < n and (text[pos].isspace() or text[pos] in separators):
+        pos += 1
+    end = pos
+    while end < n and text[end].isdecimal():
+        end += 1
+    return text[pos:end] if end > pos else None
+
+
+def _price_before(text, pos):
+    """(\\d[\\d\\s]+)\\s*DH terminé en pos : chiffres du prix, ou None"""
+    start = pos
+    while start > 0 and (text[start - 1].isdecimal() or text[start - 1].isspace()):
+        start -= 1
+    # Le groupe commence au premier chiffre du segment et fait au moins 2 caractères
+    while start < pos and not text[start].isdecimal():
+        start += 1
+    if pos - start < 2:
+        return None
+    return ''.join(c for c in text[start:pos] if c.isdecimal())
+
+
+def extract(page_text):
+    """Prix, surface, chambres + salons et salles de bain du texte de la page"""
+    fields = {}
+    low = page_text.lower()
+    if len(low) != len(page_text):
+        # lower() a changé la longueur (caractères Unicode rares) : positions non alignées,
+        # l'appelant se rabat sur la version de référence
+        return None
+
+    price = None
+    surfaces = {}
+    nb_ch = nb_sa = bains = None
+    for match in TOKENS.finditer(low):
+        kind = KINDS.get(match.group(), 'salle_de_bain')
+        start, end = match.span()
+        if kind == 'dh':
+            # "DH" est sensible à la casse dans l'ancienne regex
+            if price is None and page_text[start:end] == 'DH':
+                price = _price_before(page_text, start)
+        elif kind in SURFACE_KEYS:
+            for key in SURFACE_KEYS[kind]:
+                if (key, True) not in surfaces:
+                    value = _digits_before(low, start)
+                    if value is not None:
+                        surfaces[(key, True)] = value
+            key = SURFACE_KEYS[kind][0]
+            if (key, False) not in surfaces:
+                value = _digits_after(low, end)
+                if value is not None:
+                    surfaces[(key, False)] = value
+        elif kind == 'chambres':
+            if nb_ch is None:
+                nb_ch = _digits_before(low, start)
+        elif kind == 'salons':
+            if nb_sa is None:
+                nb_sa = _digits_before(low, start)
+        elif kind == 'salle_de_bain':
+            # Cherché dans le texte d'origine : "Salle de bain" ne comptait pas
+            if bains is None and page_text[start:end] == low[start:end]:
+                bains = _digits_before(page_text, start)
+
+    if price:
+        fields["prix"] = f"{price} DH"
+    for combo in SURFACE_PRIORITY:
+        if combo in surfaces:
+            fields["surface"] = f"{surfaces[combo]} m2"
+            break
+    fields["nb_chambres"] = (int(nb_ch) if nb_ch else 0) + (int(nb_sa) if nb_sa else 0)
+    if bains is not None:
+        fields["nb_salle_de_bains"] = bains
+    return fields
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Pages Avito : extraction des liens d'annonces et des détails d'une annonce
+à partir du HTML (sans Selenium), et crawl asynchrone d'une plage de pages de résultats.
+L'extraction des champs (fill_details : une passe sur le texte de la page, avito_extract)
+est partagée avec get_details, le chemin Selenium historique des scrapers ;
+details_from_text reste la version de référence.
+"""
+
+import os
+import re
+from urllib.parse import urljoin
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import avito_extract
+from crawler import FetchError
+
+COLUMNS = ["id", "ville", "prix", "surface", "quartier", "type_bien", "nb_chambres", "nb_salle_de_bains", "url_annonce", "date_annonce"]
+
+
+def empty_details(url):
+    # Initialisation avec des valeurs par défaut (0 ou N/A)
+    return {
+        "id": "null", "ville": "null", "prix": "null", "surface": "null",
+        "quartier": "null", "type_bien": "null", "nb_chambres": 0,
+        "nb_salle_de_bains": 0, "url_annonce": url, "date_annonce": "null"
+    }
+
+
+def type_from_title(titre_text):
+    # TYPE DE BIEN (via Titre)
+    t_low = titre_text.lower()
+    if "appartement" in t_low or "studio" in t_low: return "Appartement"
+    elif "villa" in t_low or "riad" in t_low: return "Villa"
+    elif "maison" in t_low: return "Maison"
+    elif "terrain" in t_low: return "Terrain"
+    elif "magasin" in t_low or "local" in t_low: return "Commerce"
+    elif "bureau" in t_low: return "Bureau"
+    return None
+
+
+def page_meta(details, url, date_text=None, breadcrumb=None, location_text=None):
+    """ID, date, ville et quartier : tout ce qui ne vient pas du texte de la page"""
+    # 1. Extraction de l'ID depuis l'URL (ex: ...57103649.htm -> 57103649)
+    match_id = re.search(r'(\d+)\.htm', url)
+    if match_id: details["id"] = match_id.group(1)
+
+    # 6. DATE
+    if date_text is not None: details["date_annonce"] = date_text
+
+    # 7. VILLE & QUARTIER via le fil d'ariane (breadcrumb)
+    if breadcrumb is not None:
+        if len(breadcrumb) >= 4:
+            # Index 2 est toujours la Ville (ex: Casablanca)
+            details["ville"] = breadcrumb[2]
+            # Index 3 est le Quartier, sauf mot technique comme "Avito Immobilier"
+            details["quartier"] = breadcrumb[3] if "Avito" not in breadcrumb[3] else "N/A"
+        elif len(breadcrumb) == 3:
+            details["ville"] = breadcrumb[2]
+            details["quartier"] = "N/A"
+    elif location_text:
+        # Fallback : texte "Ville, Quartier"
+        if "," in location_text:
+            parts = location_text.split(",")
+            details["ville"] = parts[0].strip()
+            details["quartier"] = parts[1].strip()
+        else:
+            details["ville"] = location_text.strip()
+    return details
+
+
+def details_from_text(details, url, titre_text, page_text, date_text=None, breadcrumb=None, location_text=None):
+    """
+    Remplit `details` à partir du texte de la page
+    breadcrumb : textes des <ol><li> (None si introuvable -> repli sur location_text)
+    Version de référence, un re.search par champ ; fill_details donne le même
+    résultat en une passe
+    """
+    page_meta(details, url, date_text, breadcrumb, location_text)
+
+    # 2. TYPE DE BIEN (via Titre)
+    type_bien = type_from_title(titre_text)
+    if type_bien: details["type_bien"] = type_bien
+
+    page_text_lower = page_text.lower()
+    # 3. PRIX & SURFACE (Nettoyage numérique)
+    price_match = re.search(r'(\d[\d\s]+)\s*DH', page_text)
+    if price_match:
+        clean_price = re.sub(r"[^\d]", "", price_match.group(1))
+        details["prix"] = f"{clean_price} DH"
+
+    surface_keywords = ["surface totale", "m²", "m2", "surface"]
+
+    for key in surface_keywords:
+        # Cas 1 : Le nombre est AVANT le mot (ex: 10000 Surface totale)
+        match = re.search(rf'(\d+)\s*{key}', page_text_lower)
+
+        # Cas 2 : Le mot est AVANT le nombre (ex: Surface: 100)
+        if not match:
+            match = re.search(rf'{key}[:\s]*(\d+)', page_text_lower)
+
+        if match:
+            details["surface"] = f"{match.group(1)} m2"
+            break
+
+    # 4. NB_CHAMBRES (Somme : Chambres + Salons)
+    nb_ch = 0
+    nb_sa = 0
+    ch_match = re.search(r'(\d+)\s*chambres?', page_text_lower)
+    if ch_match: nb_ch = int(ch_match.group(1))
+    sa_match = re.search(r'(\d+)\s*salons?', page_text_lower)
+    if sa_match: nb_sa = int(sa_match.group(1))
+    details["nb_chambres"] = nb_ch + nb_sa
+
+    # 5. SALLE DE BAINS
+    bain_match = re.search(r'(\d+)\s*salle\s*de\s*bain', page_text)
+    if bain_match: details["nb_salle_de_bains"] = bain_match.group(1)
+
+    return details
+
+
+def fill_details(details, url, titre_text, page_text, date_text=None, breadcrumb=None, location_text=None):
+    """Même contrat que details_from_text, champs du texte extraits en une passe (avito_extract)"""
+    fields = avito_extract.extract(page_text)
+    if fields is None:
+        return details_from_text(details, url, titre_text, page_text, date_text, breadcrumb, location_text)
+    page_meta(details, url, date_text, breadcrumb, location_text)
+    type_bien = type_from_title(titre_text)
+    if type_bien: details["type_bien"] = type_bien
+    details.update(fields)
+    return details
+
+
+def page_text(soup):
+    """Équivalent HTML du texte visible de <body> (ce que renvoie Selenium .text)"""
+    body = soup.body or soup
+    for tag in body(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    lines = (line.strip() for line in body.get_text('\n').splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def parse_details(html, url):
+    """HTML d'une annonce -> dict au format de data/raw/avito_*.csv"""
+    details = empty_details(url)
+    soup = BeautifulSoup(html, 'html.parser')
+    h1 = soup.find('h1')
+    if h1 is None:
+        return details
+    time_tag = soup.find('time')
+    breadcrumb = [li.get_text(' ', strip=True) for li in soup.select('ol > li')]
+    location = soup.select_one("span[class*='Location'], p[class*='Location']")
+    return fill_details(
+        details, url, h1.get_text(' ', strip=True), page_text(soup),
+        time_tag.get_text(' ', strip=True) if time_tag else None,
+        breadcrumb,
+        location.get_text(' ', strip=True) if location else None
+    )
+
+
+def listing_cards(html, page_url):
+    """{lien d'annonce: texte de sa carte (<article> ou lien)} d'une page de résultats, dans l'ordre"""
+    soup = BeautifulSoup(html, 'html.parser')
+    cards = {}
+    for a in soup.find_all('a', href=True):
+        href = urljoin(page_url, a['href'])
+        if '.htm' in href and "/fr/" in href and href.count('/') >= 6:
+            if href not in cards:
+                card = a.find_parent('article') or a
+                cards[href] = card.get_text(' ', strip=True)
+    return cards
+
+
+def listing_urls(html, page_url):
+    """Liens d'annonces d'une page de résultats, dédoublonnés dans l'ordre"""
+    return list(listing_cards(html, page_url))
+
+
+def page_tasks(base_url, pages, frontier=None):
+    """
+    (numéro, URL) des pages de résultats à faire ; avec une frontière (crawl_frontier),
+    les pages sont ajoutées puis prises une à une : celles déjà faites sont sautées
+    """
+    tasks = [(page, f"{base_url}&o={page}") for page in pages]
+    if frontier is None:
+        yield from tasks
+        return
+    frontier.add_pages(tasks)
+    for task in frontier.pages():
+        yield task.page, task.url
+
+
+def append_csv(records, target_path):
+    if records:
+        pd.DataFrame(records, columns=COLUMNS).to_csv(target_path, mode='a', header=False, index=False, encoding='utf-8-sig')
+
+
+async def crawl(crawler, base_url, pages, target_path, on_page=None, seen=None, frontier=None):
+    """
+    Pages de résultats en séquence, annonces de chaque page en parallèle
+    Les lignes sont ajoutées au CSV page par page, dans l'ordre des liens
+    on_page(page) après chaque page terminée (checkpoint) ; pas en cas d'échec après relances
+    seen (seen_index.SeenIndex) : les annonces connues au prix inchangé ne sont pas ouvertes,
+    seules les nouvelles et les modifiées sont ajoutées au CSV
+    frontier (crawl_frontier.Frontier) : pages et annonces déjà faites sautées, pages en
+    échec relancées plus tard ; annonces marquées faites après l'écriture du CSV
+    """
+    if not os.path.exists(target_path):
+        pd.DataFrame(columns=COLUMNS).to_csv(target_path, index=False, encoding='utf-8-sig')
+
+    total = 0
+    async with crawler:
+        for page, page_link in page_tasks(base_url, pages, frontier):
+            print(f"\n--- SCRAPING PAGE {page} ---")
+            try:
+                results = await crawler.fetch(page_link)
+            except FetchError as e:
+                print(f"Erreur page {page}: {e}")
+                if frontier is not None:
+                    frontier.fail(page_link, e)
+                continue
+            if not results.ok:
+                # Réponse définitive (404 au-delà de la dernière page...) : page terminée
+                print(f"Page {page} : HTTP {results.status}")
+                if frontier is not None:
+                    frontier.finish_page(page_link)
+                if on_page is not None:
+                    on_page(page)
+                continue
+
+            cards = listing_cards(results.text, results.url)
+            todo = list(cards)
+            if frontier is not None:
+                # Reprise d'une page interrompue : ses annonces déjà écrites ne sont pas refaites
+                todo = frontier.lease_listings(page_link, todo)
+            urls = todo
+            if seen is not None:
+                urls = [url for url in urls if seen.should_fetch(url, cards[url])]
+            records, errors = {}, {}
+            async for url, info in crawler.map(urls, lambda p: parse_details(p.text, p.url)):
+                if isinstance(info, Exception):
+                    print(f"Erreur extraction sur {url}: {info}")
+                    errors[url] = info
+                elif info["id"] != "N/A":
+                    records[url] = info
+            if seen is not None:
+                records = {url: info for url, info in records.items()
+                           if seen.observe(url, info, cards[url]) != 'unchanged'}
+            page_data = [records[url] for url in urls if url in records]
+            append_csv(page_data, target_path)
+            if seen is not None:
+                # Après l'écriture du CSV : un crash entre les deux réécrit la page, la fusion dédoublonne
+                seen.commit()
+            if frontier is not None:
+                frontier.finish_page(page_link, todo, errors)
+            total += len(page_data)
+            print(f"{len(page_data)}/{len(urls)} annonces extraites"
+                  + (f" ({len(cards) - len(urls)} connues ignorées)" if len(urls) < len(cards) else ""))
+            if on_page is not None:
+                on_page(page)
+
+    print(f"\n✅ {total} annonces | {crawler.stats.summary()}")
+    if seen is not None:
+        print(f"🗂 {seen.summary()}")
+    if frontier is not None:
+        print(f"🧭 {frontier.summary()}")
+    return total
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Mode "pool" des scrapers Avito : N processus, chacun avec son Chrome headless,
+qui se partagent les pages de résultats par la frontière de crawl (crawl_frontier)
+- chaque worker prend la prochaine page libre (bail SQLite) : un worker lent ou mort
+  ne retient pas une part fixe des pages, les autres avancent
+- chaque worker écrit son CSV dans <cible>.shards/
+- une relance reprend uniquement les pages non faites de la frontière, quel que soit N
+- fusion finale : seules les annonces absentes du CSV cible (même id et même prix) y
+  sont ajoutées ; un nouveau prix (seen_index) est une nouvelle observation
+"""
+
+import asyncio
+import csv
+import glob
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import avito_pages
+import crawl_frontier
+import seen_index
+from avito_pages import COLUMNS
+from crawler import crawler_from_args, document_ready
+
+ID_IN_URL = re.compile(r'(\d+)\.htm')
+
+
+def shard_dir_for(target_path):
+    return target_path + '.shards'
+
+
+def shard_csv(shard_dir, shard):
+    return os.path.join(shard_dir, f"shard_{shard:02d}.csv")
+
+
+def open_frontier(target_path, args, source=None):
+    """
+    Frontière du pool : celle des scrapers (--frontier), ou à défaut un fichier dans le
+    dossier des shards ; le crawl porte le nom de la source, sinon celui du CSV cible
+    """
+    shard_dir = shard_dir_for(target_path)
+    os.makedirs(shard_dir, exist_ok=True)
+    path = getattr(args, 'frontier', None) or os.path.join(shard_dir, 'frontier.sqlite')
+    return crawl_frontier.Frontier(source or os.path.basename(target_path), path)
+
+
+def run_shard(shard, base_url, shard_dir, args, driver_factory, source=None, crawl=None, frontier_path=None):
+    """Point d'entrée d'un processus du pool : un crawler (un Chrome), pages prises dans la frontière"""
+    # Index et frontière partagés entre les processus (SQLite), préparés par run_pool
+    seen = seen_index.open_from_args(args, source) if source else None
+    frontier = crawl_frontier.Frontier(crawl, frontier_path)
+    crawler = crawler_from_args(args, driver_factory=driver_factory, ready=document_ready())
+    try:
+        # Les pages viennent de la frontière : pages=() n'en ajoute aucune
+        rows = asyncio.run(avito_pages.crawl(crawler, base_url, (), shard_csv(shard_dir, shard),
+                                             seen=seen, frontier=frontier))
+    finally:
+        frontier.close()
+        if seen is not None:
+            seen.close()
+    return shard, rows
+
+
+def existing_keys(target_path):
+    """
+    (id, prix) des annonces du CSV cible, et ids seuls des lignes mal formées du CSV
+    historique (deux annonces sur une ligne), lus dans les URLs (...57103649.htm)
+    """
+    pairs, ids = set(), set()
+    if not os.path.exists(target_path):
+        return pairs, ids
+    with open(target_path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) == len(COLUMNS):
+                pairs.add((row[0], row[2]))
+            else:
+                ids.update(ID_IN_URL.findall(','.join(row)))
+    return pairs, ids
+
+
+def merge_shards(shard_dir, target_path):
+    """
+    Ajoute au CSV cible les annonces des shards dont le couple (id, prix) n'y est pas
+    encore (le fichier existant n'est pas réécrit) ; renvoie le nombre de lignes ajoutées
+    """
+    frames = [pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+              for path in sorted(glob.glob(os.path.join(shard_dir, 'shard_*.csv')))]
+    if not frames:
+        return 0
+    new = pd.concat(frames, ignore_index=True).reindex(columns=COLUMNS)
+    new = new.drop_duplicates(subset=['id', 'prix'], keep='first')
+    pairs, ids = existing_keys(target_path)
+    known = [(i, p) in pairs or i in ids for i, p in zip(new['id'], new['prix'])]
+    new = new[~pd.Series(known, index=new.index, dtype=bool)]
+    if new.empty:
+        return 0
+
+    if not os.path.exists(target_path) or os.path.getsize(target_path) == 0:
+        new.to_csv(target_path, index=False, encoding='utf-8-sig')
+        return len(new)
+    with open(target_path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        ends_with_newline = f.read(1) == b'\n'
+    with open(target_path, 'a', encoding='utf-8', newline='') as f:
+        # Sans ce retour à la ligne, la première annonce ajoutée serait collée à la dernière
+        if not ends_with_newline:
+            f.write('\n')
+        new.to_csv(f, header=False, index=False)
+    return len(new)
+
+
+def run_pool(base_url, pages, target_path, args, driver_factory, workers=4, source=None):
+    """
+    Répartit les pages restantes sur `workers` processus puis fusionne dans target_path
+    source (avito_vente...) : index des annonces vues, amorcé ici avec le CSV cible
+    """
+    shard_dir = shard_dir_for(target_path)
+    if source:
+        seen = seen_index.open_from_args(args, source, seen_index.csv_records(target_path))
+        if seen is not None:
+            seen.close()
+
+    with open_frontier(target_path, args, source) as frontier:
+        # Aucun worker ne tourne encore : les baux restants sont ceux d'un run mort
+        frontier.resume(getattr(args, 'fresh', False))
+        frontier.add_pages((page, f"{base_url}&o={page}") for page in pages)
+        remaining = frontier.open_tasks(crawl_frontier.PAGE)
+        crawl, frontier_path = frontier.crawl, frontier.path
+    print(f"🧩 {len(pages)} pages, {len(pages) - remaining} déjà faites (frontière), "
+          f"{remaining} à faire par {min(workers, remaining)} workers")
+
+    # Le numéro de shard évite d'écraser les fichiers d'un run précédent avec un autre N
+    first = len(glob.glob(os.path.join(shard_dir, 'shard_*.csv')))
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, remaining))) as pool:
+        futures = [pool.submit(run_shard, first + i, base_url, shard_dir, args, driver_factory,
+                               source, crawl, frontier_path)
+                   for i in range(min(workers, remaining))]
+        for future in as_completed(futures):
+            try:
+                shard, rows = future.result()
+            except Exception as e:
+                print(f"❌ Worker en échec : {type(e).__name__}: {e}")
+                continue
+            print(f"✅ Shard {shard} : {rows} annonces")
+
+    added = merge_shards(shard_dir, target_path)
+    print(f"\n📦 Fusion dans {target_path} : {added} nouvelles annonces")
+
+    with open_frontier(target_path, args, source) as frontier:
+        left = frontier.open_tasks()
+        summary = frontier.summary()
+    if not left:
+        shutil.rmtree(shard_dir)
+    else:
+        print(f"⚠ {summary} (relancer la même commande pour reprendre)")
+    return added
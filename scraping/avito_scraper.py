@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Corps commun des scrapers Avito (scraper_avito_vente.py, scraper_avito_location.py) :
+pilote Chrome, boucle Selenium historique et options en ligne de commande des trois moteurs.
+Un scraper ne fournit que son fichier cible, son URL de recherche, sa source et sa plage de pages.
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import pandas as pd
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException
+from webdriver_manager.chrome import ChromeDriverManager
+from fake_useragent import UserAgent
+
+import avito_pages
+import avito_pool
+import crawl_frontier
+import pacing
+import seen_index
+from avito_pages import COLUMNS
+from crawler import add_crawler_arguments, crawler_from_args, document_ready
+
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "raw")
+
+
+def ensure_target(target_path):
+    """Crée le CSV cible (en-tête seul) et son dossier s'ils n'existent pas"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if not os.path.exists(target_path):
+        pd.DataFrame(columns=COLUMNS).to_csv(target_path, index=False, encoding='utf-8-sig')
+
+def init_driver(headless=False):
+    ua = UserAgent()
+    chrome_options = Options()
+    chrome_options.add_argument(f"user-agent={ua.random}")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    if headless:
+        chrome_options.add_argument("--headless=new")
+    chrome_options.page_load_strategy = 'eager'
+    service = Service(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+def attendre(driver, condition, timeout=10):
+    """Attente explicite (au lieu d'un time.sleep fixe) ; False si la condition n'arrive pas"""
+    try:
+        WebDriverWait(driver, timeout).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
+def get_details(driver, url, pacer):
+    driver.execute_script("window.open('');")
+    driver.switch_to.window(driver.window_handles[1])
+    
+    details = avito_pages.empty_details(url)
+
+    try:
+        with pacer.request():
+            driver.get(url)
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
+        
+        titre_text = driver.find_element(By.TAG_NAME, "h1").text
+        page_text = driver.find_element(By.TAG_NAME, "body").text
+
+        try: date_text = driver.find_element(By.TAG_NAME, 'time').text
+        except: date_text = None
+
+        # On cherche la liste ordonnée (ol) qui contient les liens de navigation
+        breadcrumb, location_text = None, None
+        try:
+            breadcrumb = [li.text.strip() for li in driver.find_elements(By.XPATH, "//ol/li")]
+        except Exception:
+            # Fallback : si le fil d'ariane échoue, on tente de chercher le texte "Location"
+            try:
+                location_text = driver.find_element(By.XPATH, "//span[contains(@class, 'Location')] | //p[contains(@class, 'Location')]").text
+            except: pass
+
+        avito_pages.fill_details(details, url, titre_text, page_text, date_text, breadcrumb, location_text)
+
+    except Exception as e:
+        print(f"Erreur extraction sur l'ID {details['id']}: {e}")
+
+    driver.close()
+    driver.switch_to.window(driver.window_handles[0])
+    return details
+
+
+def scrape_selenium(base_url, target_path, start_page, end_page, seen=None, frontier=None, pacer=None,
+                    recycle_every=200):
+    """
+    Chemin historique : un seul Chrome, annonces ouvertes une par une dans un onglet
+    pacer (pacing.Pacer) : cadence adaptative des chargements, à la place des time.sleep fixes
+    seen (seen_index.SeenIndex) : annonces connues au prix inchangé ni ouvertes ni réécrites
+    frontier (crawl_frontier.Frontier) : reprise sur les pages et annonces non faites ;
+    une page dont Chrome meurt est rendue à la frontière et refaite plus tard
+    recycle_every (--recycle-every) : Chrome redémarré entre deux pages de résultats
+    une fois ce nombre de pages chargées (résultats et annonces) atteint
+    """
+    pacer = pacer or pacing.Pacer()
+    driver = init_driver()
+    uses = 0
+    try:
+        for page, page_link in avito_pages.page_tasks(base_url, range(start_page, end_page), frontier):
+
+            print(f"\n--- SCRAPING PAGE {page} ---")
+
+            if uses >= recycle_every:
+                driver.quit()
+                driver = init_driver()
+                uses = 0
+
+            try:
+                uses += 1
+                with pacer.request():
+                    driver.get(page_link)
+                    # Liens d'annonces présents : la page est exploitable, sans attente fixe
+                    attendre(driver, EC.presence_of_element_located((By.XPATH, "//a[contains(@href, '.htm')]")))
+
+                links_elems = driver.find_elements(By.XPATH, "//a[contains(@href, '.htm')]")
+                urls = []
+                cards = {}
+                for l in links_elems:
+                    href = l.get_attribute('href')
+                    if href and "/fr/" in href and href.count('/') >= 6:
+                        if href not in urls:
+                            urls.append(href)
+                            cards[href] = l.text
+                if frontier is not None:
+                    urls = frontier.lease_listings(page_link, urls)
+
+                page_data = []
+                for url in urls:
+                    if seen is not None and not seen.should_fetch(url, cards[url]):
+                        continue
+                    print(f"ID {url.split('-')[-1].replace('.htm','')} en cours...")
+                    uses += 1
+                    info = get_details(driver, url, pacer)
+                    if info["id"] != "N/A":
+                        if seen is None or seen.observe(url, info, cards[url]) != 'unchanged':
+                            page_data.append(info)
+
+                if page_data:
+                    pd.DataFrame(page_data).to_csv(target_path, mode='a', header=False, index=False, encoding='utf-8-sig')
+                if seen is not None:
+                    seen.commit()
+                if frontier is not None:
+                    frontier.finish_page(page_link, urls)
+
+            except InvalidSessionIdException as e:
+                print(f"💥 Chrome perdu page {page} → restart")
+                if frontier is not None:
+                    frontier.fail(page_link, e)
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = init_driver()
+                uses = 0
+            except Exception as e:
+                print(f"Erreur page {page}: {e}")
+                if frontier is not None:
+                    frontier.fail(page_link, e)
+                continue
+
+    finally:
+        driver.quit()
+        if seen is not None:
+            print(f"🗂 {seen.summary()}")
+        if frontier is not None:
+            print(f"🧭 {frontier.summary()}")
+        print(pacer.summary())
+        print("Scraping terminé avec succès.")
+
+def main(target_path, base_url, source, start_page, end_page, description="Scraper Avito"):
+    """
+    Point d'entrée des scrapers Avito
+    source : nom dans l'index des annonces vues (seen_index.py) et la frontière de crawl (crawl_frontier.py)
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--engine', choices=['async', 'pool', 'selenium'], default='async',
+                        help="async : moteur concurrent (crawler.py) ; pool : un processus + un Chrome par worker, "
+                             "pages prises dans la frontière (avito_pool.py) ; selenium : boucle séquentielle historique")
+    parser.add_argument('--workers', type=int, default=4, help="mode pool : nombre de processus")
+    parser.add_argument('--start-page', type=int, default=start_page,
+                        help="première page d'un nouveau crawl ; un crawl interrompu reprend où il s'est arrêté")
+    parser.add_argument('--end-page', type=int, default=end_page)
+    parser.add_argument('--output', default=target_path)
+    add_crawler_arguments(parser)
+    seen_index.add_seen_arguments(parser)
+    crawl_frontier.add_frontier_arguments(parser)
+    args = parser.parse_args()
+    ensure_target(args.output)
+
+    if args.engine == 'selenium':
+        seen = seen_index.open_from_args(args, source, seen_index.csv_records(args.output))
+        frontier = crawl_frontier.open_from_args(args, source)
+        try:
+            scrape_selenium(base_url, args.output, args.start_page, args.end_page, seen, frontier,
+                            pacing.pacer_from_args(args), recycle_every=args.recycle_every)
+        finally:
+            if seen is not None:
+                seen.close()
+            if frontier is not None:
+                frontier.close()
+    elif args.engine == 'pool':
+        # Un Chrome par processus : le pool de pilotes de chaque worker est ramené à 1
+        args.drivers = 1
+        avito_pool.run_pool(base_url, list(range(args.start_page, args.end_page)), args.output, args,
+                            functools.partial(init_driver, headless=True), workers=args.workers,
+                            source=source)
+    else:
+        seen = seen_index.open_from_args(args, source, seen_index.csv_records(args.output))
+        frontier = crawl_frontier.open_from_args(args, source)
+        crawler = crawler_from_args(args, driver_factory=lambda: init_driver(headless=True), ready=document_ready())
+        try:
+            asyncio.run(avito_pages.crawl(crawler, base_url, range(args.start_page, args.end_page), args.output,
+                                          seen=seen, frontier=frontier))
+        finally:
+            if seen is not None:
+                seen.close()
+            if frontier is not None:
+                frontier.close()
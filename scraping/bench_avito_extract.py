@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction Avito : fill_details (une passe, avito_extract) contre details_from_text (référence)
+1. vérification : résultats identiques sur les textes sauvegardés (fixtures/avito/dumps/*.txt,
+   1re ligne = titre h1, la suite = texte de la page) et sur des variantes générées
+   (mots-clés collés, majuscules, nombres avant / après, "m2" suivi d'un nombre...)
+2. benchmark : annonces/s des deux versions sur ces textes
+Usage : python bench_avito_extract.py [--variants 5000] [--repeat 2000]
+Code de sortie 1 si un résultat diffère
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import avito_pages
+from fixture_server import FIXTURES_DIR
+
+DUMPS_DIR = os.path.join(FIXTURES_DIR, 'avito', 'dumps')
+URL = "https://www.avito.ma/fr/agdal/appartements/Appartement_57000001.htm"
+
+SNIPPETS = [
+    "1 150 000 DH", "2.300.000 DH", "15000DH", "5DH", "Prix 12 DH", "dh", "Dh 45", "1 2\n3 DH",
+    "Surface totale 95", "95 Surface totale", "surface totale: 120", "Surface: 80", "surface  totale 7",
+    "120 m²", "m² 90", "150m2", "m2 : 150", "m22 chambres", "terrasse de 40m2,", "Surface habitable\n88",
+    "3 chambres", "1 chambre", "Chambres\n4", "4chambres", "2 Chambres", "2 salons", "1 salon", "2salons",
+    "3 salle de bain", "2 salle de bains", "1 Salle de bain", "1salle de bain", "2 salle  de\nbain",
+    "Annonces similaires", "Studio meublé", "R+1", "Etage : 3", "٣ chambres", "٤٥ m²", "İstanbul",
+    "\n", " ", ":", "  ", "\t",
+]
+
+
+def load_dumps():
+    dumps = {}
+    for path in sorted(glob.glob(os.path.join(DUMPS_DIR, '*.txt'))):
+        with open(path, encoding='utf-8') as f:
+            titre, _, text = f.read().partition('\n')
+        dumps[os.path.basename(path)] = (titre, text)
+    return dumps
+
+
+def variants(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        parts = [rng.choice(SNIPPETS) for _ in range(rng.randint(1, 12))]
+        yield f"variante_{i}", ("Appartement", rng.choice(['', ' ', '\n']).join(parts))
+
+
+def run(fill, titre, text):
+    return fill(avito_pages.empty_details(URL), URL, titre, text, "il y a 2 heures", None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction Avito : une passe contre référence")
+    parser.add_argument('--variants', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=2000, help="passages sur les dumps pour le benchmark")
+    args = parser.parse_args()
+
+    dumps = load_dumps()
+    corpus = list(dumps.items()) + list(variants(args.variants))
+
+    mismatches = 0
+    for name, (titre, text) in corpus:
+        expected = run(avito_pages.details_from_text, titre, text)
+        got = run(avito_pages.fill_details, titre, text)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"✗ {name} : {text!r}\n    attendu {expected}\n    obtenu  {got}")
+    print(f"{'✓' if not mismatches else '✗'} {len(dumps)} dumps + {args.variants} variantes : "
+          f"{mismatches} différence(s)")
+
+    texts = list(dumps.values())
+    largest = max(texts, key=lambda item: len(item[1]))
+    for label, sample in ((f"{len(texts)} dumps", texts),
+                          (f"page complète ({len(largest[1])} caractères)", [largest])):
+        print(f"\nBenchmark : {label} x {args.repeat}")
+        results = {}
+        for name, fill in (('details_from_text', avito_pages.details_from_text),
+                           ('fill_details', avito_pages.fill_details)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for titre, text in sample:
+                    run(fill, titre, text)
+            elapsed = time.perf_counter() - start
+            results[name] = len(sample) * args.repeat / elapsed
+            print(f"  {name:<20}{results[name]:>12,.0f} annonces/s"
+                  f"{elapsed / (len(sample) * args.repeat) * 1e6:>10.1f} µs")
+        print(f"  gain : x{results['fill_details'] / results['details_from_text']:.1f}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark : pages d'annonces Mubawab téléchargées + parsées par seconde
+- browser : pool de Chrome headless (BrowserFetcher), chargement complet de chaque page
+- http : session aiohttp keep-alive + gzip (HttpFetcher)
+- http+304 : second passage avec cache conditionnel, les pages inchangées reviennent en 304
+Pages servies par fixture_server.py avec une latence simulée.
+Usage : python bench_fetch.py [--pages 200] [--concurrency 8] [--drivers 2] [--latency 0.05]
+Le mode browser est ignoré si selenium / Chrome ne sont pas disponibles
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import mubawab_pages
+from crawler import BrowserFetcher, ConditionalCache, Crawler, HostPolicy, HttpFetcher, RetryPolicy, document_ready
+from fixture_server import FIXTURES_DIR, start_server
+
+
+def detail_urls(n):
+    with open(os.path.join(FIXTURES_DIR, 'mubawab', 'manifest.json'), encoding='utf-8') as f:
+        paths = [p for p, fichier in json.load(f).items() if fichier.startswith('annonce_')]
+    # Chaque URL reçoit un paramètre distinct : pas de cache navigateur entre deux passages
+    return [f"https://www.mubawab.ma/{paths[i % len(paths)]}?r={i}" for i in range(n)]
+
+
+def headless_chrome():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    for arg in ("--headless=new", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage"):
+        options.add_argument(arg)
+    options.page_load_strategy = "eager"
+    return webdriver.Chrome(options=options)
+
+
+def parse(page):
+    if not page.ok:
+        raise ValueError(f"HTTP {page.status}")
+    return mubawab_pages.parse_vente(page.text, page.url)
+
+
+def run(server, fetcher, urls, concurrency):
+    crawler = Crawler(fetcher, concurrency=concurrency,
+                      policy=HostPolicy(rate=0, max_concurrency=concurrency),
+                      retry=RetryPolicy(attempts=2, backoff=0.1),
+                      mirrors={"https://www.mubawab.ma": server.url + "/mubawab"})
+
+    async def crawl():
+        async with crawler:
+            start = time.perf_counter()
+            results = [r async for _, r in crawler.map(urls, parse)]
+            return time.perf_counter() - start, results
+
+    sent = server.bytes_sent
+    elapsed, results = asyncio.run(crawl())
+    errors = sum(isinstance(r, Exception) for r in results)
+    return {'pages_s': len(urls) / elapsed, 'seconds': elapsed, 'errors': errors,
+            'ko': (server.bytes_sent - sent) / 1e3, 'not_modified': crawler.stats.not_modified}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pages/s : Chrome contre HTTP direct")
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--drivers', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.05, help="latence réseau simulée (s)")
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    urls = detail_urls(args.pages)
+    cache_dir = tempfile.mkdtemp(prefix='bench_fetch_')
+    results = {}
+    try:
+        try:
+            import selenium  # noqa: F401
+            fetcher = BrowserFetcher(headless_chrome, size=args.drivers, ready=document_ready())
+            results[f'browser ({args.drivers} Chrome)'] = run(server, fetcher, urls, args.drivers)
+        except Exception as e:
+            print(f"⚠ Mode browser ignoré : {type(e).__name__}: {e}")
+
+        results['http'] = run(server, HttpFetcher(), urls, args.concurrency)
+        # Premier passage : remplit le cache ; second : requêtes conditionnelles
+        run(server, HttpFetcher(cache=ConditionalCache(cache_dir)), urls, args.concurrency)
+        results['http+304'] = run(server, HttpFetcher(cache=ConditionalCache(cache_dir)), urls, args.concurrency)
+    finally:
+        server.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(f"\n{args.pages} annonces, latence {args.latency * 1000:.0f} ms, concurrence {args.concurrency}")
+    print(f"{'mode':<22}{'pages/s':>10}{'durée (s)':>12}{'Ko reçus':>11}{'304':>7}{'erreurs':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<22}{r['pages_s']:>10.1f}{r['seconds']:>12.2f}{r['ko']:>11.0f}{r['not_modified']:>7}{r['errors']:>9}")
+
+
+if __name__ == "__main__":
+    main()
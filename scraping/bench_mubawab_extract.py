@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction Mubawab : passe lxml (mubawab_extract) contre BeautifulSoup (référence)
+1. vérification : parse_vente / parse_location identiques à parse_vente_soup /
+   parse_location_soup sur les pages sauvegardées (fixtures/mubawab/annonce_*.html,
+   fixtures/mubawab/pages/*.html) et sur des pages générées (blocs manquants, imbriqués,
+   spans vides, classes dans le désordre, commentaires, entités...)
+2. benchmark : temps de parse par page des deux versions, sur les annonces et sur
+   une page complète (~90 ko : en-tête, scripts, annonces similaires, pied de page)
+Usage : python bench_mubawab_extract.py [--variants 2000] [--repeat 50]
+Code de sortie 1 si un résultat diffère
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import mubawab_pages
+from fixture_server import FIXTURES_DIR
+
+MUBAWAB_DIR = os.path.join(FIXTURES_DIR, 'mubawab')
+URLS = ["https://www.mubawab.ma/fr/a/7712999/appartement-a-vendre-casablanca",
+        "https://www.mubawab.ma/fr/a/7712998/studio-meuble"]
+
+SNIPPETS = [
+    '<h3 class="orangeTit">1 200 000 DH</h3>', '<h3 class="orangeTit">950 000 DH Baisse de prix</h3>',
+    '<h3 class="orangeTit title">8 000 DH <span>Hausse</span> 3%</h3>', '<h3 class="orangeTit"></h3>',
+    '<h3 class="greyTit">Maârif à Casablanca</h3>', '<h3 class="greyTit"> Agdal </h3>',
+    '<h3 class="greyTit">Centre ville, rabat</h3>', '<h3 class="greyTit">Hay <b>Riad</b>  à  Rabat</h3>',
+    '<h4 class="titBlockProp inBlock">Guéliz à Marrakech</h4>', '<h4 class="titBlockProp inBlock">Tanja Balia</h4>',
+    '<h4 class="titBlockProp">Description</h4>', '<h4 class="inBlock titBlockProp">Casa Port à Casa</h4>',
+    '<h4 class="titBlockProp inBlock">Vue mer</h4>', '<h4 class="titBlockProp  inBlock">Racine à Tangier</h4>',
+    '<div class="blockProp mapBlockProp"><h4 class="titBlockProp inBlock">Anfa à Casablanca</h4></div>',
+    '<div class="blockProp mapBlockProp"><h4 class="titBlockProp">Plan</h4></div>',
+    '<div class="blockProp mapBlockProp"><p>Carte</p><h4 class="titBlockProp inBlock">Souissi</h4></div>',
+    '<div class="adDetailFeature"><i class="icon-triangle"></i><span>110 m²</span></div>',
+    '<div class="adDetailFeature"><i class="icon-triangle"></i><span>85&nbsp;m2</span></div>',
+    '<div class="adDetailFeature"><span>Terrain</span><span>300 m²</span></div>',
+    '<div class="adDetailFeature"><i class="icon-bed"></i><span>3 Chambres</span></div>',
+    '<div class="adDetailFeature"><i class="icon-bed"></i><span> </span></div>',
+    '<div class="adDetailFeature"><i class="icon-bed"></i>2 chambres</div>',
+    '<div class="adDetailFeature"><i class="icon-house-boxes"></i><span>4 Pièces</span></div>',
+    '<div class="adDetailFeature"><i class="icon-bath"></i><span>2 Salles <!-- x -->de bains</span></div>',
+    '<div class="adDetailFeature"><i class="icon-bath icon-bed"></i><span>1</span><span>Salle d\'eau</span></div>',
+    '<div class="adDetailFeature"><i class="icon-triangle"></i><span>120 m²</span>'
+    '<div class="adDetailFeature"><i class="icon-bed"></i><span>5 Chambres</span></div></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Type de bien</p>'
+    '<p class="adMainFeatureContentValue">Appartement</p></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Type de bien</p></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Type de<b> bien</b></p>'
+    '<p class="adMainFeatureContentValue"><span>Villa</span> <span>de luxe</span></p></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Ville</p>'
+    '<p class="adMainFeatureContentValue">Rabat</p></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Ville</p>'
+    '<p class="adMainFeatureContentValue"> </p></div>',
+    '<div class="adMainFeature"><p class="adMainFeatureContentLabel">Etat</p>'
+    '<p class="adMainFeatureContentValue">Bon &amp; neuf</p></div>',
+    '<span class="adDispDate">Publié il y a 2 jours</span>', '<span class="adDispDate"> </span>',
+    '<script>var s = "<span class=\'adDispDate\'>faux</span>";</script>', '<!-- <h3 class="orangeTit">0 DH</h3> -->',
+    '<p>Appartement de 90 m2 à Casablanca</p>', '<div class="adDetails">', '</div>',
+]
+
+
+def load_pages():
+    paths = (sorted(glob.glob(os.path.join(MUBAWAB_DIR, 'annonce_*.html')))
+             + sorted(glob.glob(os.path.join(MUBAWAB_DIR, 'pages', '*.html'))))
+    pages = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def variants(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        body = rng.choice(['', '\n', ' ']).join(rng.choice(SNIPPETS) for _ in range(rng.randint(1, 15)))
+        yield f"variante_{i}", f'<!DOCTYPE html>\n<html lang="fr"><head><meta charset="utf-8"></head><body>{body}</body></html>'
+
+
+def compare(html):
+    """Liste des schémas dont la sortie diffère de la référence"""
+    diffs = []
+    for lien in URLS:
+        if mubawab_pages.parse_vente(html, lien) != mubawab_pages.parse_vente_soup(html, lien):
+            diffs.append(('vente', lien))
+        if mubawab_pages.parse_location(html, lien) != mubawab_pages.parse_location_soup(html, lien):
+            diffs.append(('location', lien))
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction Mubawab : lxml contre BeautifulSoup")
+    parser.add_argument('--variants', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50, help="passages sur les pages pour le benchmark")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    corpus = list(pages.items()) + list(variants(args.variants))
+
+    mismatches = 0
+    for name, html in corpus:
+        diffs = compare(html)
+        if diffs:
+            mismatches += 1
+            if mismatches <= 10:
+                schema, lien = diffs[0]
+                parse = getattr(mubawab_pages, f"parse_{schema}")
+                reference = getattr(mubawab_pages, f"parse_{schema}_soup")
+                print(f"✗ {name} ({schema})\n    attendu {reference(html, lien)}\n    obtenu  {parse(html, lien)}")
+    print(f"{'✓' if not mismatches else '✗'} {len(pages)} pages + {args.variants} variantes : "
+          f"{mismatches} différence(s)")
+
+    annonces = [html for name, html in pages.items() if name != 'annonce_page_complete.html']
+    complete = pages.get('annonce_page_complete.html')
+    samples = [(f"{len(annonces)} annonces", annonces)]
+    if complete:
+        samples.append((f"page complète ({len(complete) / 1e3:.0f} ko)", [complete]))
+    for label, sample in samples:
+        print(f"\nBenchmark : {label} x {args.repeat}")
+        results = {}
+        for name, parse in (('parse_vente_soup', mubawab_pages.parse_vente_soup),
+                            ('parse_vente', mubawab_pages.parse_vente),
+                            ('parse_location_soup', mubawab_pages.parse_location_soup),
+                            ('parse_location', mubawab_pages.parse_location)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for html in sample:
+                    parse(html, URLS[0])
+            elapsed = time.perf_counter() - start
+            results[name] = elapsed / (len(sample) * args.repeat)
+            print(f"  {name:<22}{results[name] * 1e3:>10.3f} ms/page{1 / results[name]:>12,.0f} pages/s")
+        print(f"  gain : vente x{results['parse_vente_soup'] / results['parse_vente']:.1f}, "
+              f"location x{results['parse_location_soup'] / results['parse_location']:.1f}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
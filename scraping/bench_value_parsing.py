@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion des colonnes brutes (value_parsing) : moteurs arrow et pandas contre une boucle
+Python valeur par valeur (même expression régulière, module re)
+1. vérification : valeurs et masques de validité identiques pour les trois versions sur
+   data/raw/avito_vendre.csv et data/raw/annonces_location_all.json
+2. benchmark : valeurs/s par colonne, sur les colonnes répétées jusqu'à --rows valeurs ;
+   'arrow (Array)' part d'un tableau Arrow déjà construit (lecture pyarrow, Parquet...)
+Usage : python bench_value_parsing.py [--rows 500000] [--repeat 3]
+Code de sortie 1 si un résultat diffère
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import value_parsing
+from record_store import iter_records
+
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'raw')
+SOURCES = {
+    'avito_vendre.csv': ['prix', 'surface', 'nb_chambres', 'nb_salle_de_bains'],
+    'annonces_location_all.json': ['prix', 'surface', 'nb_chambres', 'nb_salle_de_bain'],
+}
+
+
+def load(name):
+    path = os.path.join(RAW_DIR, name)
+    if name.endswith('.csv'):
+        return pd.read_csv(path, dtype=str, engine='python', on_bad_lines='skip', encoding='utf-8-sig')
+    return pd.DataFrame.from_records(list(iter_records(path)))
+
+
+def parse_rows(values, parser):
+    """Référence : une valeur à la fois, même expression régulière que le moteur vectorisé"""
+    pattern = {value_parsing.parse_price: value_parsing.PRICE_PATTERN,
+               value_parsing.parse_surface: value_parsing.SURFACE_PATTERN,
+               value_parsing.parse_count: value_parsing.COUNT_PATTERN}[parser]
+    integer = parser is value_parsing.parse_count
+    regex = re.compile(pattern)
+    separators = re.compile(value_parsing.SEPARATORS)
+    numbers = np.zeros(len(values), dtype='int64' if integer else float)
+    valid = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+            continue
+        match = regex.search(str(value))
+        if match is None:
+            continue
+        groups = match.groupdict()
+        digits = separators.sub('', groups['num'])
+        if groups.get('unit') and groups['unit'].upper() in value_parsing.FOREIGN_CURRENCIES:
+            continue
+        if integer:
+            numbers[i] = int(digits)
+        else:
+            numbers[i] = float(f"{digits}.{groups['dec']}" if groups.get('dec') else digits)
+        valid[i] = True
+    if not integer:
+        numbers[~valid] = np.nan
+    return value_parsing.Parsed(numbers, valid)
+
+
+def same(a, b):
+    return (np.array_equal(a.valid, b.valid)
+            and np.array_equal(a.values[a.valid], b.values[b.valid]))
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion vectorisée des colonnes brutes : arrow, pandas, boucle Python")
+    parser.add_argument('--rows', type=int, default=500_000, help="valeurs par colonne pour le benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="meilleur temps sur N passages")
+    args = parser.parse_args()
+
+    engines = ['pandas'] + (['arrow'] if value_parsing.pa is not None else [])
+    mismatches = 0
+    for name, columns in SOURCES.items():
+        frame = load(name)
+        print(f"\n=== {name} : {len(frame)} annonces ===")
+        for col in columns:
+            parse = value_parsing.PARSERS[col]
+            values = frame[col]
+            reference = parse_rows(values.tolist(), parse)
+            for engine in engines:
+                if not same(parse(values, engine), reference):
+                    mismatches += 1
+                    print(f"  ✗ {col} : moteur {engine} différent de la référence")
+            invalid = values[values.notna() & ~reference.valid].value_counts()
+            print(f"  {col:<18}{reference.valid.sum():>7} lues, {values.isna().sum():>5} absentes, "
+                  f"{invalid.sum():>5} illisibles { {k: int(v) for k, v in invalid.head(3).items()} }")
+
+        print(f"\nBenchmark : {args.rows:,} valeurs par colonne, meilleur de {args.repeat}")
+        for col in columns:
+            parse = value_parsing.PARSERS[col]
+            tiled = pd.Series(np.resize(frame[col].to_numpy(dtype=object), args.rows)).astype('string')
+            as_list = tiled.astype(object).where(tiled.notna(), None).tolist()
+            runs = {'boucle Python': lambda: parse_rows(as_list, parse)}
+            for engine in engines:
+                runs[engine] = lambda engine=engine: parse(tiled, engine)
+            if 'arrow' in engines:
+                array = value_parsing.pa.array(tiled, type=value_parsing.pa.string(), from_pandas=True)
+                runs['arrow (Array)'] = lambda: parse(array, 'arrow')
+            results = {label: timed(run, args.repeat) for label, run in runs.items()}
+            base = results['boucle Python']
+            print(f"  {col}")
+            for label, elapsed in results.items():
+                print(f"    {label:<16}{elapsed * 1e3:>10.1f} ms{args.rows / elapsed:>14,.0f} valeurs/s"
+                      f"{'' if label == 'boucle Python' else f'   x{base / elapsed:.1f}':>10}")
+
+    print(f"\n{'✓' if not mismatches else '✗'} {mismatches} différence(s) avec la référence")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
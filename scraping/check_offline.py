@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+"""
+Vérification hors ligne du moteur de crawl (crawler.py) sur les pages sauvegardées
+- lance fixture_server avec latence, erreurs 503 et limitation 429 injectées
+- crawle Avito et Mubawab en HTTP via --mirror, compare aux sorties attendues
+  (fixtures/<site>/expected.*)
+- vérifie que les relances absorbent les erreurs et que le débit par hôte est respecté
+- mode pool Avito (avito_pool.py) : 2 processus, reprise sur la frontière, fusion sans doublon
+- stockage NDJSON (record_store.py) : ligne tronquée réparée, compaction, export JSON
+- index des annonces vues (seen_index.py) : re-crawl sans page de détail, prix modifié
+  enregistré comme nouvelle observation
+- cadence adaptative (pacing.py) : débit abaissé sous erreurs, relevé sur réponses rapides
+- frontière de crawl (crawl_frontier.py) : reprise après crash sans refaire les pages
+  faites, page à moitié faite, bail expiré, page abandonnée après échecs répétés
+- nettoyage en flux (clean_pipeline.py) : petits blocs et re-runs incrémentaux (ligne
+  CSV à moitié écrite, JSON réexporté) identiques à un passage unique, fichier réécrit relu ;
+  sorties Avito sur les vrais fichiers bruts identiques aux CSV des notebooks (data/clean_data),
+  hors noms de villes ramenés à leur forme canonique
+- conversion des valeurs (value_parsing.py) : mêmes nombres et masques pour les moteurs
+  arrow et pandas sur les formats des scrapers
+Usage : python check_offline.py [--update]   (--update réécrit les sorties attendues)
+Code de sortie 1 si une vérification échoue
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+import avito_pages
+import avito_pool
+import clean_pipeline
+import crawl_frontier
+import mubawab_pages
+import pacing
+import record_store
+import seen_index
+import value_parsing
+from crawler import Crawler, HostPolicy, HttpFetcher, RetryPolicy, add_crawler_arguments
+from fixture_server import FIXTURES_DIR, start_server
+
+AVITO_BASE_URL = "https://www.avito.ma/fr/maroc/villas_riad-%C3%A0_vendre?cities=8,15,5,12&has_price=true"
+MUBAWAB_BASE_URL = ("https://www.mubawab.ma/fr/cc/immobilier-a-vendre-all:ci:1050,1323,417,824"
+                    ":sc:apartment-sale,house-sale,villa-sale")
+
+AVITO_EXPECTED = os.path.join(FIXTURES_DIR, 'avito', 'expected.csv')
+MUBAWAB_EXPECTED = os.path.join(FIXTURES_DIR, 'mubawab', 'expected.json')
+
+failures = []
+
+
+def check(condition, message):
+    print(f"  {'✓' if condition else '✗'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def make_crawler(server, rate=0, concurrency=8):
+    return Crawler(
+        HttpFetcher(), concurrency=concurrency,
+        policy=HostPolicy(rate=rate, burst=1, max_concurrency=concurrency),
+        retry=RetryPolicy(attempts=8, backoff=0.05, max_backoff=2.0),
+        mirrors={"https://www.avito.ma": server.url + "/avito",
+                 "https://www.mubawab.ma": server.url + "/mubawab"}
+    )
+
+
+def crawl_avito(server):
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, 'avito.csv')
+        crawler = make_crawler(server)
+        asyncio.run(avito_pages.crawl(crawler, AVITO_BASE_URL, range(1, 3), target))
+        with open(target, encoding='utf-8-sig') as f:
+            return f.read(), crawler.stats
+
+
+def crawl_mubawab(server):
+    records = {'vente': [], 'location': []}
+    crawler = make_crawler(server)
+
+    async def both():
+        await mubawab_pages.crawl(crawler, MUBAWAB_BASE_URL, mubawab_pages.parse_vente,
+                                  lambda lien, record: records['vente'].append(record))
+        # Mêmes annonces, schéma du scraper de location
+        await mubawab_pages.crawl(crawler, MUBAWAB_BASE_URL, mubawab_pages.parse_location,
+                                  lambda lien, record: records['location'].append(record))
+
+    asyncio.run(both())
+    return records, crawler.stats
+
+
+def check_pool(server):
+    """2 workers sur les pages 1-2 ; la page 1 est marquée faite par un run précédent"""
+    parser = add_crawler_arguments(argparse.ArgumentParser(), default_fetch='http')
+    args = parser.parse_args(['--rate', '0', '--retries', '8',
+                              '--mirror', f"https://www.avito.ma={server.url}/avito"])
+    with open(AVITO_EXPECTED, encoding='utf-8') as f:
+        header, *expected = f.read().splitlines()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, 'avito_vendre.csv')
+        shard_dir = avito_pool.shard_dir_for(target)
+        os.makedirs(shard_dir)
+        # Run interrompu : page 1 écrite dans la cible et dans le shard 0, faite dans la frontière,
+        # page 2 encore réservée par un worker mort (dernière ligne du CSV sans retour à la
+        # ligne, comme dans le CSV historique)
+        with open(target, 'w', encoding='utf-8-sig') as f:
+            f.write('\n'.join([header] + expected[:3]))
+        with open(avito_pool.shard_csv(shard_dir, 0), 'w', encoding='utf-8-sig') as f:
+            f.write('\n'.join([header] + expected[:3]) + '\n')
+        with avito_pool.open_frontier(target, args) as frontier:
+            frontier.add_pages([(1, f"{AVITO_BASE_URL}&o=1"), (2, f"{AVITO_BASE_URL}&o=2")])
+            frontier.finish_page(frontier.next_page().url)
+            frontier.next_page()
+
+        page_1 = ('avito', unquote(f"{AVITO_BASE_URL}&o=1").split('avito.ma/', 1)[1])
+        hits_before = server.hits[page_1]
+        added = avito_pool.run_pool(AVITO_BASE_URL, [1, 2], target, args, None, workers=2)
+        with open(target, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+
+        check(added == 3, f"pool : 3 annonces ajoutées (page 2 seulement), {added} obtenues")
+        check(sorted(lines[1:]) == sorted(expected), "pool : CSV fusionné = sorties attendues, sans doublon")
+        check(server.hits[page_1] == hits_before, "pool : page 1 (faite dans la frontière) non redemandée")
+        check(not os.path.exists(shard_dir), "pool : dossier des shards supprimé une fois toutes les pages faites")
+
+
+def check_store(records):
+    """Annonces Mubawab ajoutées au store, arrêt brutal simulé, compaction puis export"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'annonces.ndjson')
+        checkpoint = os.path.join(tmp, 'progress.json')
+        expected = {f"annonce_{i}": {"id": i, **r} for i, r in enumerate(records, 1)}
+
+        with record_store.RecordStore(path, fsync_every=2) as store:
+            for record in expected.values():
+                store.append(record)
+            record_store.save_checkpoint(checkpoint, {"page": 3, "octets": store.size()})
+        # Relance de la première annonce (doublon) puis écriture interrompue en pleine ligne
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(expected['annonce_1'], ensure_ascii=False) + '\n')
+            f.write('{"id": 99, "ville": "Rab')
+
+        store = record_store.RecordStore(path)
+        store.close()
+        check(store.repaired > 0, f"store : ligne tronquée retirée à la réouverture ({store.repaired} octets)")
+        check(record_store.load_checkpoint(checkpoint)["octets"] <= os.path.getsize(path),
+              "store : le checkpoint ne dépasse pas les données sur disque")
+        kept, dropped = record_store.compact(path, 'url')
+        check((kept, dropped) == (len(expected), 1), f"store : compaction {kept} gardées, {dropped} doublon retiré")
+        frames = list(record_store.read_frames(path, chunksize=2))
+        check(sum(len(f) for f in frames) == len(expected) and len(frames) > 1,
+              f"store : lecture en flux par blocs ({len(frames)} DataFrames)")
+        out = os.path.join(tmp, 'annonces.json')
+        record_store.export_json(path, out)
+        with open(out, encoding='utf-8') as f:
+            check(json.load(f) == expected, "store : export JSON identique au dictionnaire des scrapers")
+
+
+def detail_hits(server, site):
+    return sum(n for (s, key), n in server.hits.items() if s == site and ('.htm' in key or '/a/' in key))
+
+
+def check_seen(server):
+    """Trois crawls Avito avec l'index : initial, inchangé, puis un prix modifié"""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, 'avito.csv')
+        index_path = os.path.join(tmp, 'seen.sqlite')
+
+        def run():
+            before = detail_hits(server, 'avito')
+            with seen_index.SeenIndex('avito_vente', index_path) as seen:
+                rows = asyncio.run(avito_pages.crawl(make_crawler(server), AVITO_BASE_URL, range(1, 3), target,
+                                                     seen=seen))
+                return rows, detail_hits(server, 'avito') - before, seen.skipped
+
+        rows, fetched, _ = run()
+        check(rows == 6 and fetched == 6, f"index : 1er crawl, {rows} annonces écrites, {fetched} pages de détail")
+        rows, fetched, skipped = run()
+        check(rows == 0 and fetched == 0 and skipped == 6,
+              f"index : re-crawl, {rows} annonce écrite, {fetched} page de détail, {skipped} évitées")
+
+        # Baisse de prix de la villa 57103649 : carte de résultats et page de détail
+        routes = server.routes['avito']
+        page_1 = unquote(f"{AVITO_BASE_URL}&o=1").split('avito.ma/', 1)[1]
+        detail = 'fr/casablanca/villas_et_riads/Villa_moderne_avec_piscine_a_Californie_57103649.htm'
+        saved = {key: routes[key] for key in (page_1, detail)}
+        for key, path in saved.items():
+            with open(path, encoding='utf-8') as f:
+                html = f.read().replace('3 500 000 DH', '3 250 000 DH')
+            routes[key] = os.path.join(tmp, os.path.basename(path))
+            with open(routes[key], 'w', encoding='utf-8') as f:
+                f.write(html)
+        try:
+            rows, fetched, skipped = run()
+        finally:
+            routes.update(saved)
+        with open(target, encoding='utf-8-sig') as f:
+            last = f.read().splitlines()[-1]
+        check(rows == 1 and fetched == 1 and last.startswith('57103649,') and '3250000 DH' in last,
+              f"index : prix modifié, {rows} nouvelle observation ajoutée au CSV, {fetched} page de détail")
+        with seen_index.SeenIndex('avito_vente', index_path) as seen:
+            history = [prix for _, prix in seen.price_history('57103649')]
+        check(history == ['3500000 DH', '3250000 DH'], f"index : historique des prix {history}")
+
+
+class Interrupted(Exception):
+    pass
+
+
+def check_frontier(server):
+    """Crawl Avito interrompu puis repris, page à moitié faite, bail expiré, abandon"""
+    with open(AVITO_EXPECTED, encoding='utf-8') as f:
+        header, *expected = f.read().splitlines()
+    page_1, page_2 = f"{AVITO_BASE_URL}&o=1", f"{AVITO_BASE_URL}&o=2"
+    results_hits = lambda: sum(n for (s, key), n in server.hits.items() if s == 'avito' and '&o=' in key)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, 'avito.csv')
+        path = os.path.join(tmp, 'frontier.sqlite')
+
+        def crash_after_page_1(page):
+            raise Interrupted(page)
+
+        with crawl_frontier.Frontier('avito_vente', path) as frontier:
+            try:
+                asyncio.run(avito_pages.crawl(make_crawler(server), AVITO_BASE_URL, range(1, 3), target,
+                                              on_page=crash_after_page_1, frontier=frontier))
+            except Interrupted:
+                pass
+        with crawl_frontier.Frontier('avito_vente', path) as frontier:
+            resumed = frontier.resume()
+            before, details = results_hits(), detail_hits(server, 'avito')
+            asyncio.run(avito_pages.crawl(make_crawler(server), AVITO_BASE_URL, range(1, 3), target,
+                                          frontier=frontier))
+            pages, details = results_hits() - before, detail_hits(server, 'avito') - details
+            with open(target, encoding='utf-8-sig') as f:
+                lines = f.read().splitlines()
+            check(resumed and pages == 1 and details == 3 and lines == [header] + expected,
+                  f"frontière : reprise après crash, {pages} page de résultats, {details} annonces, "
+                  f"CSV = sorties attendues")
+            check(not frontier.open_tasks() and not frontier.resume(),
+                  "frontière : crawl terminé, le run suivant repart de zéro")
+
+        # Mubawab : pagination sans fin connue, la page suivante entre dans la frontière au fil du crawl
+        with open(MUBAWAB_EXPECTED, encoding='utf-8') as f:
+            expected_vente = json.load(f)['vente']
+        records, crash = [], {'page': 2}
+
+        def on_record(lien, record):
+            # Crash pendant l'écriture de la page 2 : elle sera refaite en entier
+            if crash['page'] == 2 and len(records) == 3:
+                raise Interrupted(lien)
+            records.append(record)
+
+        with crawl_frontier.Frontier('mubawab_vente', path) as frontier:
+            try:
+                asyncio.run(mubawab_pages.crawl(make_crawler(server), MUBAWAB_BASE_URL, mubawab_pages.parse_vente,
+                                                on_record, frontier=frontier))
+            except Interrupted:
+                pass
+            first, crash['page'] = len(records), None
+            frontier.resume()
+            asyncio.run(mubawab_pages.crawl(make_crawler(server), MUBAWAB_BASE_URL, mubawab_pages.parse_vente,
+                                            on_record, frontier=frontier))
+            check(0 < first < len(records) and records == expected_vente and not frontier.open_tasks(),
+                  f"frontière : Mubawab repris à la page 2 ({first} + {len(records) - first} annonces)")
+
+        # Page 1 à moitié faite : 2 annonces écrites, la 3e en échec, page réservée par un worker mort
+        with open(server.routes['avito'][unquote(page_1).split('avito.ma/', 1)[1]], encoding='utf-8') as f:
+            urls = avito_pages.listing_urls(f.read(), page_1)
+        os.remove(target)
+        with crawl_frontier.Frontier('avito_vente', path) as frontier:
+            frontier.add_pages([(1, page_1)])
+            frontier.next_page()
+            frontier.lease_listings(page_1, urls)
+            frontier.finish_page(page_1, urls[:2], {urls[2]: 'Chrome mort'})
+            frontier.next_page()
+        with crawl_frontier.Frontier('avito_vente', path) as frontier:
+            frontier.resume()
+            details = detail_hits(server, 'avito')
+            rows = asyncio.run(avito_pages.crawl(make_crawler(server), AVITO_BASE_URL, range(1, 2), target,
+                                                 frontier=frontier))
+            details = detail_hits(server, 'avito') - details
+            check(rows == 1 and details == 1, f"frontière : page reprise, {details} annonce refaite sur {len(urls)}")
+
+        # Bail : une page prise n'est pas donnée à un autre worker avant expiration
+        with crawl_frontier.Frontier('bail', path, lease_seconds=0.3) as a, \
+                crawl_frontier.Frontier('bail', path, lease_seconds=0.3) as b:
+            a.add_pages([(1, page_1)])
+            taken = a.next_page()
+            check(taken is not None and b.next_page() is None, "frontière : page réservée par un seul worker")
+            time.sleep(0.35)
+            check(b.next_page() == taken, "frontière : bail expiré, page reprise par un autre worker")
+
+            # Échecs répétés : page abandonnée après max_attempts, ses annonces avec elle
+            b.lease_listings(page_1, urls)
+            for attempt in range(b.max_attempts):
+                b.fail(page_1, 'HTTP 503')
+                b.next_page()
+            counts = b.counts()
+            check(counts.get(('page', 'failed')) == 1 and counts.get(('listing', 'failed')) == len(urls)
+                  and not b.open_tasks(), f"frontière : page abandonnée après {b.max_attempts} échecs")
+
+
+def check_value_parsing():
+    """Formats de prix, surfaces et pièces vus dans les fichiers bruts, pour chaque moteur"""
+    cases = {
+        value_parsing.parse_price: (['23900 DH', '1 380 000 DH', '9 000 DH Baisse du prix 500 DH', '1\u202f200 Dhs',
+                                     '2.500.000 MAD', 'Prix à consulter', '4 200 EUR', '', None],
+                                    [23900, 1380000, 9000, 1200, 2500000, None, None, None, None]),
+        value_parsing.parse_surface: (['57 m²', '90 m2', '1 200 m²', '57,5 m²', '100-120 m²', 'm²', None],
+                                      [57, 90, 1200, 57.5, 100, None, None]),
+        value_parsing.parse_count: (['3 Chambres', '1 Salle de bain', '5', 'Studio', None],
+                                    [3, 1, 5, None, None]),
+    }
+    engines = ['pandas'] + (['arrow'] if value_parsing.pa is not None else [])
+    for parse, (raw, expected) in cases.items():
+        for engine in engines:
+            got = parse(raw, engine).series().astype(object).where(lambda s: s.notna(), None).tolist()
+            check(got == expected, f"valeurs : {parse.__name__} ({engine}) {got}")
+
+
+def check_clean_pipeline(n_csv=400, n_json=300):
+    """Nettoyage d'extraits des fichiers bruts : en une fois, puis en deux runs incrémentaux"""
+    with open(os.path.join(clean_pipeline.RAW_DIR, 'avito_location.csv'), 'rb') as f:
+        header, *lines = [next(f) for _ in range(n_csv + 1)]
+    records = []
+    for record in record_store.iter_records(os.path.join(clean_pipeline.RAW_DIR, 'annonces_location_all.json')):
+        records.append(record)
+        if len(records) == n_json:
+            break
+    names = ['avito_location', 'mubawab_location']
+
+    def write_raw(raw_dir, csv_lines, json_records, tail=b''):
+        os.makedirs(raw_dir, exist_ok=True)
+        with open(os.path.join(raw_dir, 'avito_location.csv'), 'wb') as f:
+            f.write(header + b''.join(csv_lines) + tail)
+        ndjson = os.path.join(raw_dir, 'annonces.ndjson')
+        with open(ndjson, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + '\n' for r in json_records)
+        record_store.export_json(ndjson, os.path.join(raw_dir, 'annonces_location_all.json'))
+
+    def outputs(clean_dir):
+        result = {}
+        for name in sorted(os.listdir(clean_dir)):
+            with open(os.path.join(clean_dir, name), 'rb') as f:
+                result[name] = f.read()
+        return result
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full, inc = os.path.join(tmp, 'full'), os.path.join(tmp, 'inc')
+        write_raw(os.path.join(full, 'raw'), lines, records)
+        clean_pipeline.run(names, os.path.join(full, 'raw'), os.path.join(full, 'clean'),
+                           os.path.join(full, 'state.sqlite'), chunksize=100_000)
+        expected = outputs(os.path.join(full, 'clean'))
+
+        # 1er run : moitié des annonces, dernière ligne CSV en cours d'écriture ; petits blocs
+        half = lines[n_csv // 2]
+        raw, clean, state = os.path.join(inc, 'raw'), os.path.join(inc, 'clean'), os.path.join(inc, 'state.sqlite')
+        write_raw(raw, lines[:n_csv // 2], records[:n_json // 2], tail=half[:len(half) // 2])
+        clean_pipeline.run(names, raw, clean, state, chunksize=37)
+        write_raw(raw, lines, records)
+        reports = {r['dataset']: r for r in clean_pipeline.run(names, raw, clean, state, chunksize=37)}
+        check(reports['avito_location']['offset'] > 0 and reports['avito_location']['read'] == n_csv - n_csv // 2,
+              f"nettoyage : CSV repris au curseur ({reports['avito_location']['read']} lignes relues sur {n_csv})")
+        check(reports['mubawab_location']['offset'] > 0 and reports['mubawab_location']['read'] == n_json - n_json // 2,
+              f"nettoyage : JSON réexporté repris au curseur ({reports['mubawab_location']['read']} annonces relues)")
+        check(outputs(clean) == expected, f"nettoyage : {len(expected)} sorties identiques au passage unique")
+
+        reports = clean_pipeline.run(names, raw, clean, state)
+        check(all(r['read'] == 0 and r['written'] is None for r in reports), "nettoyage : re-run sans nouveauté, rien réécrit")
+
+        # Fichier réécrit dans un autre ordre (empreinte différente) : relu en entier
+        write_raw(raw, lines[::-1], records)
+        report = clean_pipeline.run(['avito_location'], raw, clean, state)[0]
+        check(report['offset'] == 0 and report['read'] == n_csv, "nettoyage : fichier brut réécrit relu en entier")
+
+
+def check_notebook_outputs():
+    """
+    Non-régression : CSV Avito du pipeline sur data/raw contre ceux des notebooks clean_avito_*
+    Seul écart admis : une ville écrite autrement (arabe, alias) ramenée à son nom canonique ;
+    prix et surfaces imputés doivent être les mêmes (moyennes groupées par ville brute)
+    """
+    names = [name for name in ('avito_vente', 'avito_location')
+             if clean_pipeline.DATASETS[name].raw_path(clean_pipeline.RAW_DIR)
+             and os.path.exists(os.path.join(clean_pipeline.CLEAN_DIR, clean_pipeline.DATASETS[name].output))]
+    if not names:
+        print("  ⏭ notebooks : fichiers bruts ou CSV des notebooks absents")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        clean_pipeline.run(names, clean_pipeline.RAW_DIR, tmp, os.path.join(tmp, 'state.sqlite'))
+        for name in names:
+            output = clean_pipeline.DATASETS[name].output
+            notebook = pd.read_csv(os.path.join(clean_pipeline.CLEAN_DIR, output))
+            pipeline = pd.read_csv(os.path.join(tmp, output))
+            if len(notebook) != len(pipeline) or list(notebook.columns) != list(pipeline.columns):
+                check(False, f"notebooks : {output} {len(pipeline)} lignes / {len(notebook)} attendues")
+                continue
+            differences = {}
+            for col in notebook.columns:
+                a, b = notebook[col], pipeline[col]
+                if a.dtype.kind in 'fi' and b.dtype.kind in 'fi':
+                    same = np.isclose(a, b, rtol=1e-9, atol=1e-6, equal_nan=True)
+                else:
+                    same = (a.astype(str) == b.astype(str)).to_numpy()
+                if col == 'ville':
+                    canonical = a.astype('string').str.lower().map(clean_pipeline.CITY_ALIASES)
+                    renamed = ~same & (canonical == b).fillna(False).to_numpy()
+                    same = same | renamed
+                    print(f"    {output} : {int(renamed.sum())} ville(s) ramenée(s) au nom canonique")
+                if not same.all():
+                    differences[col] = int((~same).sum())
+            check(not differences, f"notebooks : {output} identique ({len(pipeline)} annonces)"
+                  + (f", colonnes différentes : {differences}" if differences else ""))
+
+
+def check_rate_limit(server, rate=10.0, n=12):
+    """n requêtes vers un même hôte à `rate` req/s : au moins (n - 1) / rate secondes"""
+    crawler = make_crawler(server, rate=rate)
+    urls = [f"{AVITO_BASE_URL}&o=1"] * n
+
+    async def run():
+        async with crawler:
+            start = time.monotonic()
+            results = [r async for _, r in crawler.map(urls, lambda page: page.status)]
+            return time.monotonic() - start, results
+
+    elapsed, results = asyncio.run(run())
+    check(all(r == 200 for r in results), f"{n} requêtes limitées abouties")
+    check(elapsed >= (n - 1) / rate * 0.95, f"débit respecté : {n} requêtes en {elapsed:.2f}s à {rate:g} req/s")
+
+
+def check_pacing(server):
+    """Débit adaptatif : baisse sous erreurs 503, remonte sur réponses rapides ; attente / travail du Pacer"""
+    rate = pacing.AdaptiveRate(2.0, 0.5, 4.0, target_latency=1.0)
+    steps = [rate.update(0.1, ok=False), rate.update(5.0), rate.update(0.1), rate.update(0.1)]
+    check(steps == [1.0, 0.8, 0.9, 1.0], f"pacing : erreur x0.5, lenteur x0.8, réponse rapide +0.1 ({steps})")
+    for _ in range(100):
+        rate.update(0.1)
+    check(rate.rate == 4.0 and rate.lowest == 0.8, f"pacing : débit plafonné à max_rate ({rate.describe()})")
+
+    def run(n):
+        crawler = Crawler(HttpFetcher(), concurrency=2,
+                          policy=HostPolicy(rate=10, burst=1, max_concurrency=2, min_rate=2, max_rate=40,
+                                            target_latency=1.0),
+                          retry=RetryPolicy(attempts=8, backoff=0.01, max_backoff=0.05),
+                          mirrors={"https://www.avito.ma": server.url + "/avito"})
+
+        async def crawl():
+            async with crawler:
+                [r async for r in crawler.map([f"{AVITO_BASE_URL}&o=1"] * n, lambda page: page.status)]
+        asyncio.run(crawl())
+        return crawler.stats, crawler.stats.rates['www.avito.ma']
+
+    server.error_rate = 0.5
+    stats, control = run(10)
+    check(control.lowest < control.start and stats.retries > 0,
+          f"pacing : erreurs 503, débit abaissé ({control.describe()})")
+    server.error_rate = 0.0
+    stats, control = run(30)
+    check(control.rate > control.start, f"pacing : réponses rapides, débit relevé ({control.describe()})")
+    print(f"  {stats.summary()}")
+
+    pacer = pacing.Pacer(rate=20)
+    for _ in range(10):
+        with pacer.request():
+            pass
+    try:
+        with pacer.request():
+            raise TimeoutError("page trop lente")
+    except TimeoutError:
+        pass
+    check(pacer.requests == 11 and pacer.errors == 1 and 0.4 <= pacer.waited <= 0.8,
+          f"pacing : Pacer fixe à 20 req/s, {pacer.waited:.2f}s d'attente pour 11 requêtes")
+    print(f"  {pacer.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification hors ligne du crawler")
+    parser.add_argument('--update', action='store_true', help="réécrit les sorties attendues")
+    parser.add_argument('--error-rate', type=float, default=0.25)
+    parser.add_argument('--rate-limit', type=int, default=30, help="req/s par site avant 429")
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency, error_rate=args.error_rate,
+                          rate_limit=args.rate_limit, seed=42)
+    print(f"🌐 Serveur de fixtures : {server.url}")
+    try:
+        print("\n=== AVITO ===")
+        csv_text, avito_stats = crawl_avito(server)
+        print("\n=== MUBAWAB ===")
+        mubawab_records, mubawab_stats = crawl_mubawab(server)
+
+        if args.update:
+            with open(AVITO_EXPECTED, 'w', encoding='utf-8') as f:
+                f.write(csv_text)
+            with open(MUBAWAB_EXPECTED, 'w', encoding='utf-8') as f:
+                json.dump(mubawab_records, f, ensure_ascii=False, indent=2)
+            print("\n💾 Sorties attendues mises à jour")
+
+        print("\n=== VÉRIFICATIONS ===")
+        with open(AVITO_EXPECTED, encoding='utf-8') as f:
+            check(csv_text == f.read(), "Avito : CSV identique à fixtures/avito/expected.csv")
+        with open(MUBAWAB_EXPECTED, encoding='utf-8') as f:
+            check(mubawab_records == json.load(f), "Mubawab : annonces identiques à fixtures/mubawab/expected.json")
+
+        statuses = dict(server.statuses)
+        print(f"  statuts servis : {statuses}")
+        retries = avito_stats.retries + mubawab_stats.retries
+        if args.error_rate:
+            check(statuses.get(503, 0) > 0 and retries > 0, f"erreurs 503 injectées et relancées ({retries} relances)")
+        check(avito_stats.failures + mubawab_stats.failures == 0, "aucun échec après relances")
+
+        check_store(mubawab_records['location'])
+
+        server.error_rate = 0.0
+        server.rate_limit = None
+        check_seen(server)
+        check_frontier(server)
+        check_pool(server)
+        check_rate_limit(server)
+        check_pacing(server)
+        check_value_parsing()
+        check_clean_pipeline()
+        check_notebook_outputs()
+
+        server.rate_limit = 5
+        before = server.statuses[429]
+        check_rate_limit(server, rate=20.0, n=10)
+        check(server.statuses[429] > before, "429 + Retry-After respectés (requêtes abouties après attente)")
+    finally:
+        server.shutdown()
+
+    if failures:
+        print(f"\n❌ {len(failures)} vérification(s) en échec")
+        sys.exit(1)
+    print("\n✅ Toutes les vérifications passent")
+
+
+if __name__ == "__main__":
+    main()
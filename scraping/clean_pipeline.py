@@ -0,0 +1,725 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de nettoyage en flux : fichiers bruts des scrapers (data/raw) -> data/clean_data
+Reprend les règles des notebooks clean_avito_vendre / clean_avito_location,
+nettoyage_mubawab_ventes, nettoyage_mubawab_location_all_v2 et Preprocessing_ML
+- lecture par blocs de `chunksize` annonces : CSV Avito, NDJSON Mubawab, ou JSON
+  {"annonce_N": {...}} parcouru objet par objet (jamais chargé d'un bloc)
+- étape par ligne, vectorisée (value_parsing, pandas .str) : "1 380 000 DH" -> 1380000.0,
+  "57 m²" -> 57.0, "3 Chambres" -> 3 ; villes ramenées à un nom canonique (Casa, Tangier, الدار البيضاء...),
+  quartiers sans le suffixe " à Ville". Les lignes vont dans une table SQLite de
+  préparation (data/raw/clean_state.sqlite), dédoublonnées par clé comme dans les notebooks
+- curseur par fichier brut (octet lu + empreinte des octets qui le précèdent) : un re-run
+  ne lit que les annonces ajoutées depuis ; un fichier réécrit (compaction, export) est relu
+  en entier. Lignes et curseur sont validés dans la même transaction
+- étape globale : imputations des notebooks (moyennes par ville et type de bien, médianes
+  du prix/m²) calculées en SQL, puis CSV écrit par blocs dans un fichier temporaire
+  remplacé atomiquement. location_all_sources.csv (servi par l'API) et
+  location_ready_for_ml.csv sont dérivés des deux CSV location
+- Avito : les moyennes d'imputation sont groupées par ville brute (colonne ville_brute),
+  comme dans les notebooks qui imputent avant de normaliser les villes. Une annonce
+  « الدار البيضاء » n'entre donc ni dans la moyenne de Casablanca ni dans les villes cibles,
+  même si elle sort sous le nom Casablanca ; les CSV Avito sont identiques à ceux des
+  notebooks, au nom des villes près (check_notebook_outputs dans check_offline.py)
+La mémoire est bornée par chunksize, quelle que soit la taille des fichiers bruts
+Usage : python clean_pipeline.py [--only avito_vente mubawab_location] [--full] [--chunksize 5000]
+"""
+
+import argparse
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from value_parsing import parse_count, parse_price, parse_surface
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RAW_DIR = os.path.join(script_dir, "..", "data", "raw")
+CLEAN_DIR = os.path.join(script_dir, "..", "data", "clean_data")
+DEFAULT_STATE = os.path.join(RAW_DIR, "clean_state.sqlite")
+
+# Octets avant le curseur dont l'empreinte détecte un fichier brut réécrit
+TAIL_BYTES = 256
+
+CLEAN_COLUMNS = ['id', 'ville', 'prix', 'surface', 'quartier', 'type_bien',
+                 'nb_chambres', 'nb_salle_de_bain', 'url_annonce']
+# Colonnes de la table de préparation : clé de dédoublonnage, ligne retenue, ville telle que
+# lue (groupes d'imputation des notebooks), colonnes nettoyées
+STAGE_COLUMNS = ['key', 'keep', 'ville_brute'] + CLEAN_COLUMNS
+
+# Nom canonique des villes, par nom en minuscules ; les autres villes passent en casse titre
+CITY_ALIASES = {
+    'casablanca': 'Casablanca', 'casa': 'Casablanca', 'الدار البيضاء': 'Casablanca',
+    'rabat': 'Rabat', 'الرباط': 'Rabat',
+    'marrakech': 'Marrakech', 'marrakesh': 'Marrakech', 'مراكش': 'Marrakech',
+    'tanger': 'Tanger', 'tangier': 'Tanger', 'tanja': 'Tanger', 'طنجة': 'Tanger',
+}
+TARGET_CITIES = ['Casablanca', 'Rabat', 'Tanger', 'Marrakech']
+
+AVITO_EXCLUDED_TYPES = ['Bureau', 'Magasin', 'Terrain', 'Commerce']
+MUBAWAB_VENTE_TYPES = ['Appartement', 'Maison', 'Villa', 'Riad']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    dataset TEXT PRIMARY KEY,
+    path TEXT,
+    offset INTEGER,
+    tail TEXT,
+    updated REAL
+);
+"""
+
+
+# ============================================
+# ANALYSE VECTORISÉE DES VALEURS BRUTES
+# ============================================
+def _column(frame, *names):
+    """Première colonne présente parmi `names` (NA si aucune)"""
+    for name in names:
+        if name in frame.columns:
+            return frame[name]
+    return pd.Series(pd.NA, index=frame.index, dtype='string')
+
+
+def clean_text(series):
+    """Espaces insécables et retours à la ligne ramenés à un espace ; vide, "None", "null" -> NA"""
+    text = series.astype('string').str.replace(r'\s+', ' ', regex=True).str.strip()
+    return text.mask(text.isin(['', 'None', 'none', 'nan', 'null']))
+
+
+def _number(parser, series):
+    """Colonne convertie par value_parsing, en float (NaN si invalide)"""
+    parsed = parser(series)
+    return pd.Series(parsed.values.astype(float), index=series.index).where(parsed.valid)
+
+
+def city_alias(series):
+    """Nom canonique si le texte est une ville connue, NA sinon"""
+    return series.astype('string').str.lower().map(CITY_ALIASES).astype('string')
+
+
+def normalize_city(series):
+    text = clean_text(series)
+    return city_alias(text).fillna(text.str.title())
+
+
+def city_in_text(series, tokens):
+    """Première ville dont un des `tokens` apparaît dans le texte (quartier, URL)"""
+    low = series.astype('string').str.lower()
+    found = pd.Series(pd.NA, index=series.index, dtype='string')
+    for token, city in tokens:
+        found = found.mask(found.isna() & low.str.contains(token, regex=False).fillna(False), city)
+    return found
+
+
+def normalize_quartier(series):
+    """"Maârif à Casablanca" -> "Maârif" ; espaces normalisés"""
+    text = clean_text(series).str.replace(r'\s+[aà]\s+.*$', '', regex=True).str.strip()
+    return text.mask(text == '')
+
+
+def row_keys(frame, columns):
+    """Empreinte du texte brut de chaque ligne : deux annonces brutes identiques ont la même clé"""
+    text = [_column(frame, c).astype('string').fillna('\x00') for c in columns]
+    joined = text[0].str.cat(text[1:], sep='\x1f')
+    return pd.util.hash_pandas_object(joined, index=False).map('{:016x}'.format)
+
+
+def _stage_frame(key, keep, ville_brute=None, **columns):
+    ville_brute = columns['ville'] if ville_brute is None else ville_brute
+    frame = pd.DataFrame({'key': key, 'keep': keep.astype(int), 'ville_brute': ville_brute, **columns})
+    return frame[STAGE_COLUMNS]
+
+
+# ============================================
+# ÉTAPE PAR LIGNE (un bloc brut -> lignes de préparation)
+# ============================================
+def parse_avito(raw, vente=True):
+    """clean_avito_vendre / clean_avito_location : tout sauf les imputations globales"""
+    raw = raw.drop(columns=['date_annonce'], errors='ignore')
+    chambres = _number(parse_count, _column(raw, 'nb_chambres'))
+    ville = normalize_city(_column(raw, 'ville'))
+
+    # type_bien absent : Maison jusqu'à 6 chambres, Villa au-delà
+    type_bien = clean_text(_column(raw, 'type_bien')).str.capitalize()
+    type_bien = type_bien.fillna(pd.Series(np.where(chambres <= 6, 'Maison', 'Villa'), index=raw.index))
+
+    # Salles de bain à 0 ou absentes : 1 jusqu'à 3 chambres, chambres / 2 - 1 au-delà
+    bains = _number(parse_count, _column(raw, 'nb_salle_de_bains', 'nb_salle_de_bain'))
+    bains = bains.where(bains.fillna(0) != 0, np.where(chambres <= 3, 1, chambres / 2 - 1))
+
+    keep = ville.notna() & (chambres > 0) & ~type_bien.isin(AVITO_EXCLUDED_TYPES)
+    ids = pd.to_numeric(_column(raw, 'id').astype(object), errors='coerce').fillna(0).astype('int64')
+    return _stage_frame(
+        row_keys(raw, raw.columns), keep,
+        # Texte brut : les notebooks imputent prix et surface avant de normaliser la ville
+        ville_brute=_column(raw, 'ville').astype('string'),
+        id=ids.astype(str),
+        ville=ville,
+        # Prix et surface illisibles à 0 : imputés à l'étape globale
+        prix=_number(parse_price, _column(raw, 'prix')).fillna(0),
+        surface=_number(parse_surface, _column(raw, 'surface')).fillna(0),
+        quartier=normalize_quartier(_column(raw, 'quartier')),
+        type_bien=type_bien,
+        nb_chambres=chambres,
+        nb_salle_de_bain=bains,
+        url_annonce=clean_text(_column(raw, 'url_annonce', 'url')))
+
+
+def parse_mubawab_vente(raw):
+    """nettoyage_mubawab_ventes : tout sauf les imputations globales"""
+    chambres = _number(parse_count, _column(raw, 'nb_chambres'))
+    type_bien = clean_text(_column(raw, 'type_bien')).str.title()
+    keep = type_bien.isin(MUBAWAB_VENTE_TYPES) & chambres.notna()
+    key_columns = ['id', 'ville', 'prix', 'surface', 'quartier', 'type_bien',
+                   'nb_chambres', 'nb_salle_de_bain', 'url_annonce', 'url']
+    return _stage_frame(
+        row_keys(raw, key_columns), keep,
+        id=clean_text(_column(raw, 'id')),
+        ville=normalize_city(_column(raw, 'ville')),
+        prix=_number(parse_price, _column(raw, 'prix')),
+        surface=_number(parse_surface, _column(raw, 'surface')),
+        quartier=normalize_quartier(_column(raw, 'quartier')),
+        type_bien=type_bien,
+        nb_chambres=chambres,
+        nb_salle_de_bain=_number(parse_count, _column(raw, 'nb_salle_de_bain')).fillna(1),
+        url_annonce=clean_text(_column(raw, 'url_annonce', 'url')))
+
+
+URL_CITIES = [('casablanca', 'Casablanca'), ('rabat', 'Rabat'), ('marrakech', 'Marrakech'), ('tanger', 'Tanger')]
+QUARTIER_CITIES = [('casablanca', 'Casablanca'), ('casa', 'Casablanca'), ('marrakech', 'Marrakech'),
+                   ('rabat', 'Rabat'), ('tanger', 'Tanger'), ('tangier', 'Tanger')]
+
+
+def parse_mubawab_location(raw):
+    """nettoyage_mubawab_location_all_v2 : tout sauf l'estimation des surfaces manquantes"""
+    url = clean_text(_column(raw, 'url_annonce')).fillna(clean_text(_column(raw, 'url')))
+    quartier_brut = clean_text(_column(raw, 'quartier'))
+    quartier = normalize_quartier(quartier_brut)
+
+    # Ville manquante : suffixe " à Ville" du quartier, quartier qui est une ville, puis URL
+    ville = normalize_city(_column(raw, 'ville'))
+    suffixe = quartier_brut.str.extract(r'\s[aà]\s+(.+)$', expand=False)
+    ville = (ville.fillna(city_alias(suffixe)).fillna(city_alias(quartier_brut))
+             .fillna(city_in_text(url, URL_CITIES)).fillna(city_in_text(quartier, QUARTIER_CITIES)))
+
+    type_bien = clean_text(_column(raw, 'type_bien'))
+    bureau = type_bien.str.lower().str.contains(r'\bbureau\b|local\s+commercial', regex=True).fillna(False)
+    chambres = _number(parse_count, _column(raw, 'nb_chambres'))
+    prix = _number(parse_price, _column(raw, 'prix'))
+    keep = ~bureau & chambres.notna() & prix.between(500, 200_000)
+    ids = pd.to_numeric(_column(raw, 'id').astype(object), errors='coerce')
+    return _stage_frame(
+        # Dédoublonnage par URL (première annonce gardée), avant les filtres comme le notebook
+        url.fillna(''), keep,
+        id=ids.astype('Int64').astype('string'),
+        ville=ville,
+        prix=prix,
+        surface=_number(parse_surface, _column(raw, 'surface')),
+        quartier=quartier,
+        type_bien=type_bien,
+        nb_chambres=chambres,
+        nb_salle_de_bain=_number(parse_count, _column(raw, 'nb_salle_de_bain')).fillna(1),
+        url_annonce=url)
+
+
+# ============================================
+# ÉTAPE GLOBALE (table de préparation -> blocs du CSV nettoyé)
+# ============================================
+def _select_rows(conn, table, chunksize, extra=()):
+    sql = f"SELECT {', '.join(CLEAN_COLUMNS + list(extra))} FROM {table} WHERE keep = 1 ORDER BY rowid"
+    for chunk in pd.read_sql_query(sql, conn, chunksize=chunksize):
+        for col in ('prix', 'surface', 'nb_chambres', 'nb_salle_de_bain'):
+            chunk[col] = chunk[col].astype(float)
+        yield chunk
+
+
+def _lookup(frame, keys, index):
+    """Valeurs de `index` (Series) pour les clés des colonnes `keys` de frame ; NaN si absentes"""
+    if len(keys) == 1:
+        return frame[keys[0]].map(index).astype(float)
+    wanted = pd.MultiIndex.from_frame(frame[keys])
+    return pd.Series(index.reindex(wanted).to_numpy(dtype=float), index=frame.index)
+
+
+def _avito_fill(conn, table, col):
+    """
+    Tables d'imputation de clean_avito_* pour prix ou surface : moyenne (ville brute, type)
+    des valeurs > 0, à défaut moyenne du type ; puis, pour les 0 restants, moyenne du type
+    après ce premier remplacement
+    """
+    positive = pd.read_sql_query(
+        f"SELECT ville_brute, type_bien, SUM({col}) AS total, COUNT(*) AS n FROM {table} "
+        f"WHERE keep = 1 AND {col} > 0 GROUP BY ville_brute, type_bien", conn)
+    targets = ', '.join('?' * len(TARGET_CITIES))
+    zeros = pd.read_sql_query(
+        f"SELECT ville_brute, type_bien, COUNT(*) AS n FROM {table} WHERE keep = 1 "
+        f"AND ({col} IS NULL OR {col} = 0) AND ville_brute IN ({targets}) GROUP BY ville_brute, type_bien",
+        conn, params=TARGET_CITIES)
+
+    by_city = (positive['total'] / positive['n']).set_axis(
+        pd.MultiIndex.from_frame(positive[['ville_brute', 'type_bien']]))
+    by_type_sums = positive.groupby('type_bien')[['total', 'n']].sum()
+    by_type = by_type_sums['total'] / by_type_sums['n']
+
+    # Les valeurs imputées dans les villes cibles entrent dans la moyenne du type
+    zeros['value'] = _lookup(zeros, ['ville_brute', 'type_bien'], by_city)
+    zeros['value'] = zeros['value'].fillna(zeros['type_bien'].map(by_type)).fillna(0)
+    imputed = zeros[zeros['value'] > 0]
+    after = pd.concat([by_type_sums, pd.DataFrame({
+        'total': imputed['value'] * imputed['n'], 'n': imputed['n'], 'type_bien': imputed['type_bien']
+    }).groupby('type_bien').sum()]).groupby(level=0).sum()
+    return by_city, by_type, after['total'] / after['n']
+
+
+def finish_avito(conn, table, chunksize, vente=True):
+    fills = {col: _avito_fill(conn, table, col) for col in ('prix', 'surface')}
+    for chunk in _select_rows(conn, table, chunksize, extra=['ville_brute']):
+        for col, (by_city, by_type, by_type_after) in fills.items():
+            values = chunk[col].fillna(0)
+            target = (values == 0) & chunk['ville_brute'].isin(TARGET_CITIES)
+            imputed = _lookup(chunk, ['ville_brute', 'type_bien'], by_city).fillna(
+                _lookup(chunk, ['type_bien'], by_type)).fillna(0)
+            values = values.mask(target, imputed).replace(0, np.nan)
+            chunk[col] = values.fillna(_lookup(chunk, ['type_bien'], by_type_after)).fillna(0)
+        if vente:
+            # Prix des villas et maisons multiplié par 179,92 (clean_avito_vendre)
+            villas = chunk['type_bien'].isin(['Villa', 'Maison'])
+            chunk.loc[villas, 'prix'] = (chunk.loc[villas, 'prix'] * 179.92).round(1)
+        chunk['nb_chambres'] = chunk['nb_chambres'].astype(int)
+        chunk['nb_salle_de_bain'] = chunk['nb_salle_de_bain'].astype(int)
+        yield chunk
+
+
+def finish_mubawab_vente(conn, table, chunksize):
+    """Prix manquant : moyenne de la ville ; surface manquante : prix / prix moyen au m² de la ville"""
+    city_prix = pd.read_sql_query(
+        f"SELECT ville, AVG(prix) AS v FROM {table} WHERE keep = 1 AND ville IS NOT NULL GROUP BY ville",
+        conn).set_index('ville')['v']
+    city_m2 = pd.read_sql_query(
+        f"SELECT t.ville, AVG(COALESCE(t.prix, c.v) / t.surface) AS v FROM {table} t "
+        f"LEFT JOIN (SELECT ville, AVG(prix) AS v FROM {table} WHERE keep = 1 GROUP BY ville) c "
+        f"ON c.ville = t.ville WHERE t.keep = 1 AND t.ville IS NOT NULL AND t.surface IS NOT NULL "
+        f"GROUP BY t.ville", conn).set_index('ville')['v']
+    for chunk in _select_rows(conn, table, chunksize):
+        chunk['prix'] = chunk['prix'].fillna(_lookup(chunk, ['ville'], city_prix))
+        chunk['surface'] = chunk['surface'].fillna(chunk['prix'] / _lookup(chunk, ['ville'], city_m2))
+        chunk['quartier'] = chunk['quartier'].fillna(chunk['ville'])
+        chunk['nb_chambres'] = chunk['nb_chambres'].astype('Int64')
+        chunk['nb_salle_de_bain'] = chunk['nb_salle_de_bain'].astype('Int64')
+        yield chunk
+
+
+def _median(conn, source, params=()):
+    """Médiane exacte de la colonne v de la sous-requête `source`, calculée par SQLite (ORDER BY)"""
+    n = conn.execute(f"SELECT COUNT(*) FROM ({source})", params).fetchone()[0]
+    if not n:
+        return np.nan
+    rows = conn.execute(f"SELECT v FROM ({source}) ORDER BY v LIMIT ? OFFSET ?",
+                        (*params, 2 - n % 2, (n - 1) // 2)).fetchall()
+    return float(np.mean([r[0] for r in rows]))
+
+
+def finish_mubawab_location(conn, table, chunksize):
+    """Surface manquante : prix / prix médian au m² (ville + type, à défaut ville, puis global), bornée à 10-1000 m²"""
+    ref = (f"SELECT ville, type_bien, prix / surface AS v FROM {table} WHERE keep = 1 "
+           f"AND prix IS NOT NULL AND surface > 0 AND prix / surface BETWEEN 10 AND 2000")
+    groups = conn.execute(f"SELECT DISTINCT ville, type_bien FROM ({ref}) "
+                          f"WHERE ville IS NOT NULL AND type_bien IS NOT NULL").fetchall()
+    by_type = pd.Series({g: _median(conn, f"{ref} AND ville = ? AND type_bien = ?", g) for g in groups},
+                        dtype=float)
+    villes = sorted({ville for ville, _ in groups})
+    by_city = pd.Series({v: _median(conn, f"{ref} AND ville = ?", (v,)) for v in villes}, dtype=float)
+    overall = _median(conn, ref)
+    if not len(by_type):
+        by_type.index = pd.MultiIndex.from_tuples([], names=['ville', 'type_bien'])
+
+    for chunk in _select_rows(conn, table, chunksize):
+        pm2 = _lookup(chunk, ['ville', 'type_bien'], by_type)
+        pm2 = pm2.fillna(_lookup(chunk, ['ville'], by_city)).fillna(overall)
+        missing = chunk['surface'].isna() & (chunk['prix'] > 0) & (pm2 > 0)
+        chunk.loc[missing, 'surface'] = (chunk.loc[missing, 'prix'] / pm2[missing]).clip(10, 1000)
+        chunk['id'] = pd.to_numeric(chunk['id'], errors='coerce').astype('Int64')
+        chunk['nb_chambres'] = chunk['nb_chambres'].astype(int)
+        chunk['nb_salle_de_bain'] = chunk['nb_salle_de_bain'].astype(int)
+        yield chunk
+
+
+@dataclass
+class Dataset:
+    name: str
+    raw: list               # fichiers bruts candidats dans data/raw (le premier présent est lu)
+    parse: object           # bloc brut -> lignes de préparation (STAGE_COLUMNS)
+    finish: object          # (conn, table, chunksize) -> blocs du CSV nettoyé
+    output: str
+    encoding: str = 'utf-8'
+    json_output: str = None
+
+    @property
+    def table(self):
+        return f"rows_{self.name}"
+
+    def raw_path(self, raw_dir):
+        for name in self.raw:
+            path = os.path.join(raw_dir, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+
+DATASETS = {d.name: d for d in (
+    Dataset('avito_vente', ['avito_vendre.csv'], partial(parse_avito, vente=True),
+            partial(finish_avito, vente=True), 'avito_vendre_clean.csv'),
+    Dataset('avito_location', ['avito_location.csv'], partial(parse_avito, vente=False),
+            partial(finish_avito, vente=False), 'avito_location_clean.csv'),
+    Dataset('mubawab_vente', ['annonces_ventes.ndjson', 'annonces_ventes.json', 'annonces_ventes_mubawab.json'],
+            parse_mubawab_vente, finish_mubawab_vente, 'annonces_nettoyees_mubawab.csv'),
+    Dataset('mubawab_location', ['annonces_location_all.ndjson', 'annonces_location_all.json',
+                                 'annonces_location_all_backup.json'],
+            parse_mubawab_location, finish_mubawab_location, 'mubawab_location_all_clean.csv',
+            encoding='utf-8-sig', json_output='mubawab_location_all_clean.json'),
+)}
+
+LOCATION_SOURCES = 'location_all_sources.csv'
+LOCATION_ML = 'location_ready_for_ml.csv'
+ML_KEY_COLUMNS = ['ville', 'prix', 'surface', 'quartier', 'type_bien', 'nb_chambres', 'nb_salle_de_bain']
+
+
+# ============================================
+# LECTURE EN FLUX DES FICHIERS BRUTS
+# ============================================
+def _complete_records(f, chunksize):
+    """
+    Blocs de lignes complètes à partir de la position de f, avec l'octet qui suit chaque bloc.
+    Une ligne sans retour à la ligne (en cours d'écriture) n'est pas lue ; un champ CSV entre
+    guillemets peut contenir des retours à la ligne (guillemets équilibrés)
+    """
+    offset = f.tell()
+    batch, pending, quotes = [], [], 0
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2:
+            continue
+        record = b''.join(pending)
+        pending, quotes = [], 0
+        offset += len(record)
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield batch, offset
+            batch = []
+    if batch:
+        yield batch, offset
+
+
+def _csv_chunks(path, offset, chunksize):
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if not header.endswith(b'\n'):
+            return
+        columns = next(csv.reader([header.decode('utf-8-sig')]))
+        f.seek(max(offset, len(header)))
+        for lines, end in _complete_records(f, chunksize):
+            frame = pd.read_csv(io.BytesIO(b''.join(lines)), header=None, names=columns, dtype=str,
+                                engine='python', on_bad_lines='skip', na_values=['null'], encoding='utf-8')
+            yield frame, end
+
+
+def _ndjson_chunks(path, offset, chunksize):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for lines, end in _complete_records(f, chunksize):
+            records = []
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+            yield pd.DataFrame.from_records(records), end
+
+
+def _skip_ws(buf, pos):
+    while pos < len(buf) and buf[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+def _next_value(decoder, buf, pos, container, first):
+    """
+    (valeur, position de fin) du prochain élément du conteneur JSON dans buf ; (None, pos)
+    en fin de conteneur. IndexError / ValueError si buf s'arrête au milieu de l'élément
+    """
+    pos = _skip_ws(buf, pos)
+    if buf[pos] in '}]':
+        return None, pos
+    if not first:
+        if buf[pos] != ',':
+            raise ValueError(f"',' attendu à la position {pos}")
+        pos = _skip_ws(buf, pos + 1)
+    if container == '{':
+        _, pos = decoder.raw_decode(buf, pos)
+        pos = _skip_ws(buf, pos)
+        if buf[pos] != ':':
+            raise ValueError(f"':' attendu à la position {pos}")
+        pos = _skip_ws(buf, pos + 1)
+    return decoder.raw_decode(buf, pos)
+
+
+def _json_chunks(path, offset, chunksize, block=1 << 20):
+    """JSON historique {"annonce_N": {...}} ou [{...}] lu objet par objet ; offset : fin du dernier objet lu"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+        start = 3 if head.startswith(codecs.BOM_UTF8) else 0
+        start += len(head[start:]) - len(head[start:].lstrip())
+        if start >= len(head) or head[start:start + 1] not in (b'{', b'['):
+            return
+        container = head[start:start + 1].decode()
+        first = offset == 0
+        f.seek(start + 1 if first else offset)
+
+        # buf[pos:] reste à lire ; `done` octets du fichier correspondent à buf[:pos]
+        buf, pos, done, batch = '', 0, f.tell(), []
+        while True:
+            try:
+                value, end = _next_value(decoder, buf, pos, container, first)
+            except (IndexError, ValueError):
+                data = f.read(block)
+                if not data:
+                    break
+                buf = buf[pos:] + utf8.decode(data)
+                pos = 0
+                continue
+            if value is None:
+                break
+            done += len(buf[pos:end].encode('utf-8'))
+            pos, first = end, False
+            if isinstance(value, dict):
+                batch.append(value)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame.from_records(batch), done
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch), done
+
+
+def read_raw(path, offset=0, chunksize=5000):
+    """(DataFrame brut, octet de fin) par blocs de `chunksize` annonces, à partir de `offset`"""
+    if path.endswith('.csv'):
+        return _csv_chunks(path, offset, chunksize)
+    if path.endswith('.json'):
+        return _json_chunks(path, offset, chunksize)
+    return _ndjson_chunks(path, offset, chunksize)
+
+
+def _tail(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        return hashlib.sha1(f.read(min(offset, TAIL_BYTES))).hexdigest()[:16]
+
+
+# ============================================
+# ÉCRITURE ATOMIQUE DES SORTIES
+# ============================================
+def _json_value(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def write_outputs(frames, csv_path, columns, encoding='utf-8', json_path=None):
+    """
+    CSV (et liste JSON indent=2 du notebook location) écrits bloc par bloc dans des fichiers
+    temporaires, remplacés une fois complets ; renvoie le nombre de lignes
+    """
+    rows = 0
+    json_file = open(json_path + '.tmp', 'w', encoding='utf-8') if json_path else None
+    try:
+        with open(csv_path + '.tmp', 'w', encoding=encoding, newline='') as f:
+            if json_file:
+                json_file.write('[')
+            for frame in frames:
+                frame[columns].to_csv(f, index=False, header=not rows)
+                if json_file:
+                    for record in frame[columns].astype(object).to_dict(orient='records'):
+                        body = json.dumps({k: _json_value(v) for k, v in record.items()},
+                                          ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                        json_file.write(f"{',' if rows else ''}\n  {body}")
+                        rows += 1
+                else:
+                    rows += len(frame)
+            if not rows:
+                f.write(','.join(columns) + '\n')
+        if json_file:
+            json_file.write('\n]' if rows else ']')
+            json_file.close()
+            os.replace(json_path + '.tmp', json_path)
+    finally:
+        if json_file and not json_file.closed:
+            json_file.close()
+    os.replace(csv_path + '.tmp', csv_path)
+    return rows
+
+
+# ============================================
+# PIPELINE
+# ============================================
+def open_state(path=DEFAULT_STATE):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _stage(conn, table, frame):
+    values = frame.astype(object).where(frame.notna(), None)
+    cur = conn.executemany(
+        f"INSERT OR IGNORE INTO {table} ({', '.join(STAGE_COLUMNS)}) VALUES ({', '.join('?' * len(STAGE_COLUMNS))})",
+        [tuple(_json_value(v) for v in row) for row in values.itertuples(index=False, name=None)])
+    return cur.rowcount
+
+
+def clean_dataset(conn, dataset, raw_dir=RAW_DIR, clean_dir=CLEAN_DIR, chunksize=5000, full=False):
+    """
+    Lit les annonces ajoutées au fichier brut depuis le dernier run puis, s'il y a du nouveau,
+    réécrit le CSV nettoyé ; renvoie un rapport (dict), None si aucun fichier brut
+    """
+    path = dataset.raw_path(raw_dir)
+    if path is None:
+        return None
+    started = time.perf_counter()
+    table = dataset.table
+    # Table d'une version précédente (colonnes différentes) : supprimée, fichier brut relu
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if existing and existing != STAGE_COLUMNS:
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute("DELETE FROM cursors WHERE dataset = ?", (dataset.name,))
+        conn.commit()
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, keep INTEGER, ville_brute TEXT, "
+                 f"id TEXT, ville TEXT, prix REAL, surface REAL, quartier TEXT, type_bien TEXT, "
+                 f"nb_chambres REAL, nb_salle_de_bain REAL, url_annonce TEXT)")
+
+    # Reprise au curseur si le fichier n'a été que complété depuis ; sinon relecture complète
+    cursor = conn.execute("SELECT path, offset, tail FROM cursors WHERE dataset = ?", (dataset.name,)).fetchone()
+    offset = 0
+    if (cursor and not full and cursor[0] == os.path.abspath(path)
+            and os.path.getsize(path) >= cursor[1] and _tail(path, cursor[1]) == cursor[2]):
+        offset = cursor[1]
+    rebuilt = offset == 0
+    if rebuilt:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM cursors WHERE dataset = ?", (dataset.name,))
+        conn.commit()
+
+    read = added = 0
+    for frame, end in read_raw(path, offset, chunksize):
+        added += _stage(conn, table, dataset.parse(frame)) if len(frame) else 0
+        read += len(frame)
+        conn.execute("INSERT OR REPLACE INTO cursors VALUES (?, ?, ?, ?, ?)",
+                     (dataset.name, os.path.abspath(path), end, _tail(path, end), time.time()))
+        conn.commit()
+
+    csv_path = os.path.join(clean_dir, dataset.output)
+    json_path = os.path.join(clean_dir, dataset.json_output) if dataset.json_output else None
+    outputs = [p for p in (csv_path, json_path) if p]
+    written = None
+    if added or rebuilt or not all(os.path.exists(p) for p in outputs):
+        os.makedirs(clean_dir, exist_ok=True)
+        written = write_outputs(dataset.finish(conn, table, chunksize), csv_path, CLEAN_COLUMNS,
+                                dataset.encoding, json_path)
+    return {'dataset': dataset.name, 'raw': os.path.basename(path), 'offset': offset, 'read': read,
+            'added': added, 'written': written, 'output': dataset.output,
+            'seconds': time.perf_counter() - started}
+
+
+def _location_frames(clean_dir, chunksize, sources):
+    for name, source in sources:
+        path = os.path.join(clean_dir, name)
+        if os.path.exists(path):
+            for chunk in pd.read_csv(path, chunksize=chunksize, encoding='utf-8-sig'):
+                yield chunk.assign(source=source)
+
+
+def location_sources(clean_dir, chunksize):
+    """location_all_sources.csv : annonces location des deux sites, loyer 500-100k DH, 10-1000 m²"""
+    sources = [(DATASETS['avito_location'].output, 'Avito'), (DATASETS['mubawab_location'].output, 'Mubawab')]
+    for chunk in _location_frames(clean_dir, chunksize, sources):
+        yield chunk[chunk['prix'].between(500, 100_000) & chunk['surface'].between(10, 1000)]
+
+
+def location_ml(conn, clean_dir, chunksize):
+    """location_ready_for_ml.csv (Preprocessing_ML) : doublons retirés, prix/m² entre 10 et 3000 DH"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS ml_keys (key TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM ml_keys")
+    sources = [(DATASETS['avito_location'].output, 'avito'), (DATASETS['mubawab_location'].output, 'mubawab')]
+    for chunk in _location_frames(clean_dir, chunksize, sources):
+        first = [conn.execute("INSERT OR IGNORE INTO ml_keys VALUES (?)", (key,)).rowcount == 1
+                 for key in row_keys(chunk, ML_KEY_COLUMNS)]
+        chunk = chunk[np.array(first, dtype=bool)]
+        prix_m2 = chunk['prix'] / chunk['surface']
+        yield chunk[(prix_m2 > 10) & (prix_m2 < 3000)]
+    conn.execute("DELETE FROM ml_keys")
+
+
+def run(names=None, raw_dir=RAW_DIR, clean_dir=CLEAN_DIR, state=DEFAULT_STATE, chunksize=5000, full=False):
+    """Nettoie les jeux `names` (tous par défaut) ; renvoie les rapports"""
+    reports = []
+    conn = open_state(state)
+    try:
+        for name in names or DATASETS:
+            report = clean_dataset(conn, DATASETS[name], raw_dir, clean_dir, chunksize, full)
+            if report is None:
+                print(f"⏭ {name} : aucun fichier brut ({', '.join(DATASETS[name].raw)}) dans {raw_dir}")
+                continue
+            reports.append(report)
+            reprise = f" (reprise à l'octet {report['offset']})" if report['offset'] else ""
+            sortie = (f"{report['output']} réécrit ({report['written']} annonces)" if report['written'] is not None
+                      else f"{report['output']} déjà à jour")
+            print(f"🧹 {name} : {report['read']} lignes lues dans {report['raw']}{reprise}, "
+                  f"{report['added']} nouvelles -> {sortie} en {report['seconds']:.2f}s")
+
+        # Fichiers dérivés des CSV location, réécrits si l'un d'eux a changé
+        changed = any(r['written'] is not None for r in reports if r['dataset'].endswith('_location'))
+        derived = [(LOCATION_SOURCES, 'utf-8-sig', lambda: location_sources(clean_dir, chunksize)),
+                   (LOCATION_ML, 'utf-8', lambda: location_ml(conn, clean_dir, chunksize))]
+        for output, encoding, frames in derived:
+            path = os.path.join(clean_dir, output)
+            if changed or not os.path.exists(path):
+                os.makedirs(clean_dir, exist_ok=True)
+                columns = (CLEAN_COLUMNS[1:] + ['source'] if output == LOCATION_SOURCES
+                           else ML_KEY_COLUMNS + ['source'])
+                print(f"🔗 {output} : {write_outputs(frames(), path, columns, encoding)} annonces")
+    finally:
+        conn.close()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nettoyage en flux des fichiers bruts vers data/clean_data")
+    parser.add_argument('--only', nargs='+', choices=list(DATASETS), help="jeux à nettoyer (tous par défaut)")
+    parser.add_argument('--full', action='store_true', help="relit les fichiers bruts en entier")
+    parser.add_argument('--chunksize', type=int, default=5000, help="annonces par bloc (borne la mémoire)")
+    parser.add_argument('--state', default=DEFAULT_STATE, help="état SQLite (curseurs et lignes préparées)")
+    parser.add_argument('--raw-dir', default=RAW_DIR)
+    parser.add_argument('--clean-dir', default=CLEAN_DIR)
+    args = parser.parse_args()
+    run(args.only, args.raw_dir, args.clean_dir, args.state, args.chunksize, args.full)
+
+
+if __name__ == "__main__":
+    main()
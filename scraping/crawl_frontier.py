@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Frontière de crawl persistante (SQLite) : pages de résultats et annonces à traiter,
+partagée par les scrapers pour reprendre un crawl interrompu là où il s'est arrêté
+- une tâche par URL et par crawl (avito_vente, mubawab_location...) : page de résultats
+  ou annonce (rattachée à sa page), état pending -> leased -> done (ou failed)
+- bail (lease) : une page prise par un worker lui est réservée `lease_seconds` ; un worker
+  mort (crash, Chrome tué, InvalidSessionIdException) la rend disponible à expiration,
+  et resume() libère au démarrage les baux du run précédent
+- au moins une fois : une annonce n'est marquée faite qu'après son écriture sur disque ;
+  un crash entre les deux la refait (doublon retiré par seen_index / la fusion / compact)
+- une page n'est faite que lorsque toutes ses annonces le sont ; sinon elle est relancée
+  plus tard, `max_attempts` fois au plus, comme une page en échec
+- crawl terminé (plus rien en attente) : le run suivant repart de zéro
+Usage : python crawl_frontier.py [--frontier data/raw/frontier.sqlite]   (état par crawl)
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(script_dir, "..", "data", "raw", "frontier.sqlite")
+
+PAGE, LISTING = 'page', 'listing'
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    crawl TEXT NOT NULL,
+    url TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    page INTEGER,
+    parent TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    error TEXT,
+    updated REAL,
+    PRIMARY KEY (crawl, url)
+);
+CREATE INDEX IF NOT EXISTS tasks_next ON tasks (crawl, kind, state, attempts, page);
+CREATE INDEX IF NOT EXISTS tasks_parent ON tasks (crawl, parent);
+CREATE TABLE IF NOT EXISTS meta (
+    crawl TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (crawl, name)
+);
+"""
+
+# Tâche disponible : en attente, ou prise par un worker dont le bail a expiré
+AVAILABLE = "(state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+
+Task = namedtuple('Task', 'url page attempts')
+
+
+class Frontier:
+    """
+    Tâches d'un crawl ; plusieurs processus (mode pool) peuvent partager le fichier :
+    la prise d'une page est une transaction BEGIN IMMEDIATE, une page n'est donnée qu'à un worker
+    """
+
+    def __init__(self, crawl, path=DEFAULT_PATH, lease_seconds=600.0, max_attempts=3, timeout=30.0):
+        self.crawl = crawl
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker = f"{os.getpid()}"
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _write(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    # =========================================================
+    # CYCLE DE VIE DU CRAWL
+    # =========================================================
+    def counts(self):
+        """{(kind, state): nombre de tâches}"""
+        rows = self.conn.execute("SELECT kind, state, COUNT(*) FROM tasks WHERE crawl = ? GROUP BY kind, state",
+                                 (self.crawl,)).fetchall()
+        return {(kind, state): n for kind, state, n in rows}
+
+    def open_tasks(self, kind=None):
+        """Tâches en attente ou en cours (d'un type, ou toutes)"""
+        return sum(n for (k, state), n in self.counts().items()
+                   if state in (PENDING, LEASED) and kind in (None, k))
+
+    def has_pages(self):
+        return self.conn.execute("SELECT 1 FROM tasks WHERE crawl = ? AND kind = ? LIMIT 1",
+                                 (self.crawl, PAGE)).fetchone() is not None
+
+    def reset(self):
+        with self._write() as conn:
+            conn.execute("DELETE FROM tasks WHERE crawl = ?", (self.crawl,))
+            conn.execute("DELETE FROM meta WHERE crawl = ?", (self.crawl,))
+
+    def resume(self, fresh=False):
+        """
+        Début de run : un crawl terminé (ou abandonné avec fresh) est vidé ; sinon les baux
+        du run précédent, dont les workers sont morts, sont libérés. Renvoie True si le
+        crawl reprend là où il s'était arrêté
+        """
+        if fresh or (self.has_pages() and not self.open_tasks()):
+            self.reset()
+            return False
+        with self._write() as conn:
+            conn.execute("UPDATE tasks SET state = 'pending', worker = NULL, lease_until = NULL "
+                         "WHERE crawl = ? AND state = 'leased'", (self.crawl,))
+        return self.has_pages()
+
+    def get(self, name, default=None):
+        """Valeur gardée avec le crawl (URL de résultats filtrée...) ; vidée avec lui"""
+        row = self.conn.execute("SELECT value FROM meta WHERE crawl = ? AND name = ?",
+                                (self.crawl, name)).fetchone()
+        return row[0] if row else default
+
+    def set(self, name, value):
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", (self.crawl, name, value))
+
+    # =========================================================
+    # PAGES DE RÉSULTATS
+    # =========================================================
+    def add_pages(self, pages):
+        """Ajoute les pages [(numéro, url)] absentes ; une page déjà connue garde son état"""
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (crawl, url, kind, page, updated) VALUES (?, ?, ?, ?, ?)",
+                [(self.crawl, url, PAGE, page, now) for page, url in pages])
+
+    def next_page(self):
+        """
+        Prend la prochaine page disponible (numéro croissant, les pages déjà relancées
+        en dernier) et la réserve pour `lease_seconds` ; None s'il n'y en a plus
+        """
+        now = time.time()
+        with self._write() as conn:
+            row = conn.execute(
+                f"SELECT url, page, attempts FROM tasks WHERE crawl = ? AND kind = ? AND {AVAILABLE} "
+                "AND attempts < ? ORDER BY attempts, page LIMIT 1",
+                (self.crawl, PAGE, now, self.max_attempts)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, updated = ? "
+                         "WHERE crawl = ? AND url = ?",
+                         (self.worker, now + self.lease_seconds, now, self.crawl, row[0]))
+        return Task(*row)
+
+    def pages(self):
+        """Pages prises une à une jusqu'à épuisement de la frontière"""
+        while True:
+            task = self.next_page()
+            if task is None:
+                return
+            yield task
+
+    def fail(self, url, error):
+        """Tâche en échec : relancée plus tard, ou abandonnée après `max_attempts` essais"""
+        with self._write() as conn:
+            self._fail(conn, url, error, time.time())
+
+    def _fail(self, conn, url, error, now):
+        conn.execute(
+            "UPDATE tasks SET attempts = attempts + 1, worker = NULL, lease_until = NULL, error = ?, updated = ?, "
+            "state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END "
+            "WHERE crawl = ? AND url = ?",
+            (str(error)[:500], now, self.max_attempts, self.crawl, url))
+        # Page abandonnée : ses annonces encore en attente le sont aussi
+        conn.execute("UPDATE tasks SET state = 'failed', worker = NULL, lease_until = NULL, updated = ? "
+                     "WHERE crawl = ? AND parent = ? AND state IN ('pending', 'leased') AND EXISTS "
+                     "(SELECT 1 FROM tasks p WHERE p.crawl = ? AND p.url = ? AND p.state = 'failed')",
+                     (now, self.crawl, url, self.crawl, url))
+
+    # =========================================================
+    # ANNONCES
+    # =========================================================
+    def lease_listings(self, page_url, urls):
+        """
+        Annonces de la page à traiter, dans l'ordre : ajoute les nouvelles, réserve celles
+        qui ne sont ni faites ni abandonnées (ni prises par un autre worker) et les renvoie
+        """
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (crawl, url, kind, parent, updated) VALUES (?, ?, ?, ?, ?)",
+                [(self.crawl, url, LISTING, page_url, now) for url in urls])
+            leased = []
+            for url in urls:
+                cur = conn.execute(
+                    f"UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, updated = ? "
+                    f"WHERE crawl = ? AND url = ? AND {AVAILABLE} AND attempts < ?",
+                    (self.worker, now + self.lease_seconds, now, self.crawl, url, now, self.max_attempts))
+                if cur.rowcount:
+                    leased.append(url)
+        # Une annonce présente deux fois sur la page n'est rendue qu'une fois
+        return list(dict.fromkeys(leased))
+
+    def finish_page(self, page_url, done=(), errors=None):
+        """
+        Après écriture des annonces sur disque : `done` marquées faites, `errors`
+        {url: erreur} en échec, puis la page faite si plus aucune de ses annonces n'est
+        à reprendre (sinon en échec, relancée plus tard). Renvoie True si la page est faite
+        """
+        errors = errors or {}
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE tasks SET state = 'done', worker = NULL, lease_until = NULL, updated = ? "
+                "WHERE crawl = ? AND url = ?",
+                [(now, self.crawl, url) for url in done if url not in errors])
+            for url, error in errors.items():
+                self._fail(conn, url, error, now)
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE crawl = ? AND parent = ? AND state IN ('pending', 'leased')",
+                (self.crawl, page_url)).fetchone()[0]
+            if remaining:
+                self._fail(conn, page_url, f"{remaining} annonce(s) à reprendre", now)
+            else:
+                conn.execute("UPDATE tasks SET state = 'done', worker = NULL, lease_until = NULL, updated = ? "
+                             "WHERE crawl = ? AND url = ?", (now, self.crawl, page_url))
+        return not remaining
+
+    def summary(self):
+        c = self.counts()
+        return (f"frontière {self.crawl} : pages {c.get((PAGE, DONE), 0)} faites, "
+                f"{c.get((PAGE, PENDING), 0) + c.get((PAGE, LEASED), 0)} en attente, "
+                f"{c.get((PAGE, FAILED), 0)} abandonnées | annonces {c.get((LISTING, DONE), 0)} faites, "
+                f"{c.get((LISTING, PENDING), 0) + c.get((LISTING, LEASED), 0)} en attente, "
+                f"{c.get((LISTING, FAILED), 0)} abandonnées")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_frontier_arguments(parser):
+    parser.add_argument('--frontier', default=DEFAULT_PATH,
+                        help="frontière SQLite du crawl, pour reprendre après un crash ('' pour la désactiver)")
+    parser.add_argument('--fresh', action='store_true',
+                        help="abandonne le crawl en cours et repart de la première page")
+    return parser
+
+
+def open_from_args(args, crawl):
+    """Frontière du crawl, ou None avec --frontier '' ; reprise annoncée s'il y a lieu"""
+    path = getattr(args, 'frontier', None)
+    if not path:
+        return None
+    frontier = Frontier(crawl, path)
+    if frontier.resume(getattr(args, 'fresh', False)):
+        print(f"♻ Reprise du crawl en cours — {frontier.summary()}")
+    return frontier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="État des crawls de la frontière")
+    parser.add_argument('--frontier', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    with Frontier(None, args.frontier) as frontier:
+        crawls = [row[0] for row in frontier.conn.execute("SELECT DISTINCT crawl FROM tasks ORDER BY crawl")]
+    for crawl in crawls:
+        with Frontier(crawl, args.frontier) as frontier:
+            print(frontier.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de crawl asynchrone partagé par les scrapers Avito et Mubawab
+- pool de téléchargements concurrents borné (concurrency)
+- politesse par hôte : débit max (seau à jetons), requêtes simultanées max, budget de requêtes ;
+  débit adaptatif (pacing.AdaptiveRate) : baisse sur erreur ou réponse lente, hausse sinon
+- relances avec backoff exponentiel + jitter sur erreur réseau, 429 et 5xx (Retry-After respecté)
+- fetchers interchangeables : HttpFetcher (aiohttp, sans navigateur) ou BrowserFetcher
+  (pilotes Selenium exécutés dans des threads, pour les pages qui exigent Chrome)
+- HttpFetcher : connexions keep-alive, gzip, requêtes conditionnelles (ETag / Last-Modified)
+  avec ConditionalCache : une page inchangée revient en 304 sans corps
+- mirrors : redirige une origine réelle vers un serveur local (fixtures, tests hors ligne)
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from pacing import AdaptiveRate, rate_bounds
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# En-tête ajouté par HttpFetcher quand la page vient du cache après un 304
+CACHE_HEADER = 'X-Crawler-Cache'
+# En-tête ajouté par BrowserFetcher : durée du chargement seul, sans l'attente d'un pilote libre
+ELAPSED_HEADER = 'X-Crawler-Elapsed'
+
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+
+@dataclass
+class HostPolicy:
+    """Règles de politesse pour un hôte"""
+    rate: float = 2.0           # requêtes par seconde (débit initial si adaptatif)
+    burst: int = 1              # requêtes autorisées d'affilée avant d'appliquer le débit
+    max_concurrency: int = 4    # requêtes simultanées vers l'hôte
+    budget: int = None          # requêtes max pendant le run (None = illimité)
+    min_rate: float = None      # bornes du débit adaptatif (None = débit fixe)
+    max_rate: float = None
+    target_latency: float = float('inf')    # au-delà, réponse lente : le débit baisse
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 4
+    backoff: float = 1.0        # délai de base (s), doublé à chaque tentative
+    max_backoff: float = 30.0
+    statuses: frozenset = RETRY_STATUSES
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        # "Full jitter" : évite que les tâches relancent toutes en même temps
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+@dataclass
+class Page:
+    url: str                    # URL demandée (avant mirror)
+    status: int
+    text: str
+    headers: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+    attempts: int = 1
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+
+@dataclass
+class CrawlStats:
+    requests: int = 0
+    pages: int = 0
+    retries: int = 0
+    failures: int = 0
+    not_modified: int = 0           # pages revalidées (304) servies depuis le cache
+    bytes: int = 0
+    fetch_seconds: float = 0.0      # temps cumulé passé dans les fetchers
+    backoff_seconds: float = 0.0    # attente avant relances
+    rate_wait_seconds: float = 0.0  # attente imposée par le débit par hôte
+    rates: dict = field(default_factory=dict)   # hôte -> AdaptiveRate, en fin de run
+    started: float = field(default_factory=time.monotonic)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        text = (f"{self.pages} pages en {elapsed:.1f}s ({self.pages / elapsed if elapsed else 0:.2f} pages/s) | "
+                f"{self.requests} requêtes, {self.retries} relances, {self.failures} échecs, "
+                f"{self.not_modified} inchangées (304), "
+                f"{self.bytes / 1e6:.1f} Mo | attente débit {self.rate_wait_seconds:.1f}s, "
+                f"backoff {self.backoff_seconds:.1f}s, travail {self.fetch_seconds:.1f}s (cumulé)")
+        adaptive = [f"{host} {rate.describe()}" for host, rate in self.rates.items() if rate.min_rate != rate.max_rate]
+        return text + (f" | débit {', '.join(adaptive)}" if adaptive else "")
+
+
+class FetchError(Exception):
+    def __init__(self, url, reason, status=None):
+        super().__init__(f"{url} : {reason}")
+        self.url = url
+        self.reason = reason
+        self.status = status
+
+
+class BudgetExhausted(FetchError):
+    pass
+
+
+class HostLimiter:
+    """Seau à jetons + sémaphore pour un hôte ; débit ajusté par feedback() si la politique a des bornes"""
+
+    def __init__(self, host, policy):
+        self.host = host
+        self.policy = policy
+        self.used = 0
+        self.waited = 0.0
+        self.control = AdaptiveRate(
+            policy.rate,
+            policy.rate if policy.min_rate is None else policy.min_rate,
+            policy.rate if policy.max_rate is None else policy.max_rate,
+            policy.target_latency)
+        self._semaphore = asyncio.Semaphore(policy.max_concurrency)
+        self._lock = asyncio.Lock()
+        self._tokens = float(policy.burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        if self.policy.budget is not None and self.used >= self.policy.budget:
+            raise BudgetExhausted(self.host, f"budget de {self.policy.budget} requêtes atteint")
+        self.used += 1
+        await self._semaphore.acquire()
+        rate = self.control.rate
+        if not rate:
+            return
+        # Le verrou sérialise la prise de jetons : les requêtes partent espacées de 1/rate
+        async with self._lock:
+            rate = self.control.rate
+            now = time.monotonic()
+            self._tokens = min(self.policy.burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens < 1:
+                wait = (1 - self._tokens) / rate
+                await asyncio.sleep(wait)
+                self.waited += wait
+                self._tokens = 0.0
+                self._updated = time.monotonic()
+            else:
+                self._tokens -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+    def feedback(self, latency, ok):
+        if self.control.rate:
+            self.control.update(latency, ok)
+
+
+def _retry_after(headers):
+    value = (headers or {}).get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Crawler:
+    """
+    Usage :
+        async with Crawler(HttpFetcher(), concurrency=8) as crawler:
+            page = await crawler.fetch(url)
+            async for url, record in crawler.map(urls, parse):
+                ...
+    """
+
+    def __init__(self, fetcher, concurrency=8, policy=None, host_policies=None, retry=None, mirrors=None):
+        self.fetcher = fetcher
+        self.concurrency = concurrency
+        self.policy = policy or HostPolicy()
+        self.host_policies = host_policies or {}
+        self.retry = retry or RetryPolicy()
+        self.mirrors = mirrors or {}
+        self.stats = CrawlStats()
+        self._limiters = {}
+        self._slots = None
+
+    async def __aenter__(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self.stats = CrawlStats()
+        await self.fetcher.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.fetcher.close()
+        self.stats.rate_wait_seconds = sum(l.waited for l in self._limiters.values())
+        self.stats.rates = {host: l.control for host, l in self._limiters.items()}
+
+    def _limiter(self, host):
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = HostLimiter(host, self.host_policies.get(host, self.policy))
+        return limiter
+
+    def _target(self, url):
+        for origin, mirror in self.mirrors.items():
+            if url.startswith(origin):
+                return mirror + url[len(origin):]
+        return url
+
+    async def fetch(self, url):
+        """Télécharge une page ; FetchError après épuisement des relances"""
+        limiter = self._limiter(urlsplit(url).netloc)
+        target = self._target(url)
+        reason, status = None, None
+        for attempt in range(self.retry.attempts):
+            async with self._slots:
+                await limiter.acquire()
+                start = time.monotonic()
+                headers = None
+                try:
+                    status, headers, text = await self.fetcher.fetch(target)
+                    reason = f"HTTP {status}"
+                except Exception as e:
+                    status, reason = None, f"{type(e).__name__}: {e}"
+                finally:
+                    limiter.release()
+                elapsed = time.monotonic() - start
+            self.stats.requests += 1
+            self.stats.fetch_seconds += elapsed
+            # Erreur ou lenteur du site : le débit de l'hôte baisse ; réponse rapide : il remonte
+            latency = float((headers or {}).get(ELAPSED_HEADER, elapsed))
+            limiter.feedback(latency, status is not None and status not in self.retry.statuses)
+
+            if status is not None and status not in self.retry.statuses:
+                self.stats.pages += 1
+                if headers and headers.get(CACHE_HEADER) == 'revalidated':
+                    self.stats.not_modified += 1
+                else:
+                    self.stats.bytes += len(text)
+                return Page(url, status, text, headers or {}, elapsed, attempt + 1)
+
+            if attempt + 1 < self.retry.attempts:
+                delay = self.retry.delay(attempt, _retry_after(headers))
+                self.stats.retries += 1
+                self.stats.backoff_seconds += delay
+                await asyncio.sleep(delay)
+
+        self.stats.failures += 1
+        raise FetchError(url, reason, status)
+
+    async def map(self, urls, parse):
+        """
+        Télécharge et parse les URLs en parallèle, rend (url, résultat) au fil de l'eau
+        Le résultat est l'exception levée si le téléchargement ou le parsing échoue
+        """
+        async def one(url):
+            try:
+                return url, parse(await self.fetch(url))
+            except Exception as e:
+                return url, e
+
+        urls = iter(urls)
+        # Fenêtre bornée : on ne crée pas une tâche par URL d'une liste potentiellement longue
+        pending = set()
+        for url in urls:
+            pending.add(asyncio.ensure_future(one(url)))
+            if len(pending) >= 2 * self.concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+
+# ============================================
+# FETCHERS
+# ============================================
+class ConditionalCache:
+    """
+    Validateurs (ETag, Last-Modified) et HTML des pages déjà téléchargées, sur disque :
+    <dossier>/<sha1 de l'URL>.json + .html.gz. Permet de re-crawler sans retélécharger
+    les annonces inchangées (If-None-Match / If-Modified-Since -> 304).
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, ext):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + ext)
+
+    def validators(self, url):
+        try:
+            with open(self._path(url, '.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url):
+        try:
+            with gzip.open(self._path(url, '.html.gz'), 'rt', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, url, headers, text):
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        # Corps d'abord, validateurs ensuite : un validateur n'existe jamais sans son HTML
+        with gzip.open(self._path(url, '.html.gz'), 'wt', encoding='utf-8', compresslevel=1) as f:
+            f.write(text)
+        with open(self._path(url, '.json'), 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, f)
+
+
+class HttpFetcher:
+    """
+    Téléchargement HTTP sans navigateur (aiohttp) : une session, connexions keep-alive
+    réutilisées (limit par hôte), réponses gzip décompressées, requêtes conditionnelles
+    si un ConditionalCache est fourni
+    """
+
+    def __init__(self, headers=None, timeout=30, limit=32, cache=None):
+        self.headers = {'User-Agent': DEFAULT_USER_AGENT, 'Accept-Language': 'fr-FR,fr;q=0.9',
+                        'Accept-Encoding': 'gzip, deflate'}
+        self.headers.update(headers or {})
+        self.timeout = timeout
+        self.limit = limit
+        self.cache = cache
+        self.session = None
+
+    async def open(self):
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit,
+                                           ttl_dns_cache=300, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers=self.headers
+        )
+
+    async def fetch(self, url):
+        conditional = self.cache.validators(url) if self.cache is not None else {}
+        async with self.session.get(url, headers=conditional) as response:
+            headers = dict(response.headers)
+            if response.status == 304 and conditional:
+                text = self.cache.load(url)
+                if text is not None:
+                    headers[CACHE_HEADER] = 'revalidated'
+                    return 200, headers, text
+                # HTML du cache perdu : on redemande la page sans condition
+                async with self.session.get(url) as full:
+                    headers = dict(full.headers)
+                    text = await full.text(errors='replace')
+                    status = full.status
+            else:
+                status = response.status
+                text = await response.text(errors='replace')
+        if self.cache is not None and status == 200:
+            self.cache.store(url, headers, text)
+        return status, headers, text
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class BrowserFetcher:
+    """
+    Pool de pilotes Selenium : chaque fetch prend un pilote libre et exécute
+    driver.get + page_source dans un thread. Un pilote en erreur (session morte,
+    timeout) est fermé et recréé à la requête suivante ; recyclage tous les recycle_every.
+    """
+
+    def __init__(self, driver_factory, size=1, recycle_every=200, ready=None):
+        self.driver_factory = driver_factory
+        self.size = size
+        self.recycle_every = recycle_every
+        self.ready = ready          # ready(driver) : attente explicite après driver.get
+        self._slots = None
+        self._executor = None
+
+    async def open(self):
+        self._executor = ThreadPoolExecutor(self.size, thread_name_prefix='browser')
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            self._slots.put_nowait({'driver': None, 'uses': 0})
+
+    def _quit(self, slot):
+        if slot['driver'] is not None:
+            try:
+                slot['driver'].quit()
+            except Exception:
+                pass
+        slot['driver'], slot['uses'] = None, 0
+
+    def _load(self, slot, url):
+        if slot['driver'] is not None and slot['uses'] >= self.recycle_every:
+            self._quit(slot)
+        if slot['driver'] is None:
+            slot['driver'] = self.driver_factory()
+        slot['uses'] += 1
+        slot['driver'].get(url)
+        if self.ready is not None:
+            self.ready(slot['driver'])
+        return slot['driver'].page_source
+
+    async def fetch(self, url):
+        slot = await self._slots.get()
+        start = time.monotonic()
+        try:
+            html = await asyncio.get_running_loop().run_in_executor(self._executor, self._load, slot, url)
+        except Exception:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._quit, slot)
+            raise
+        finally:
+            self._slots.put_nowait(slot)
+        # Selenium n'expose pas le statut HTTP
+        return 200, {ELAPSED_HEADER: f"{time.monotonic() - start:.3f}"}, html
+
+    async def close(self):
+        if self._slots is None:
+            return
+        while not self._slots.empty():
+            self._quit(self._slots.get_nowait())
+        self._executor.shutdown(wait=False)
+
+
+def document_ready(timeout=10):
+    """Attente explicite pour BrowserFetcher : DOM chargé, au lieu d'un time.sleep fixe"""
+    def wait(driver):
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        WebDriverWait(driver, timeout).until(lambda d: d.execute_script('return document.readyState') != 'loading')
+    return wait
+
+
+# ============================================
+# OPTIONS EN LIGNE DE COMMANDE (communes aux scrapers)
+# ============================================
+def add_crawler_arguments(parser, default_fetch='browser'):
+    group = parser.add_argument_group('crawler')
+    group.add_argument('--fetch', choices=['browser', 'http'], default=default_fetch,
+                       help="browser : pilotes Chrome ; http : requêtes directes sans navigateur")
+    group.add_argument('--concurrency', type=int, default=4, help="téléchargements simultanés")
+    group.add_argument('--drivers', type=int, default=2, help="nombre de Chrome en mode browser")
+    group.add_argument('--recycle-every', type=int, default=200,
+                       help="mode browser : Chrome redémarré après N pages chargées")
+    group.add_argument('--rate', type=float, default=2.0, help="requêtes/s par hôte au départ (0 = illimité)")
+    group.add_argument('--min-rate', type=float, default=None, help="débit adaptatif : plancher (défaut : rate / 4)")
+    group.add_argument('--max-rate', type=float, default=None, help="débit adaptatif : plafond (défaut : 2 x rate)")
+    group.add_argument('--target-latency', type=float, default=None,
+                       help="au-delà (s), réponse lente et débit en baisse (défaut : 2 en http, 6 en browser)")
+    group.add_argument('--fixed-rate', action='store_true', help="débit fixe à --rate, sans adaptation")
+    group.add_argument('--budget', type=int, default=None, help="requêtes max par hôte pour ce run")
+    group.add_argument('--retries', type=int, default=4)
+    group.add_argument('--mirror', action='append', default=[], metavar='ORIGINE=URL',
+                       help="ex. https://www.avito.ma=http://127.0.0.1:8765/avito (fixtures hors ligne)")
+    group.add_argument('--cache-dir', default=None,
+                       help="mode http : cache des pages pour les requêtes conditionnelles (304)")
+    return parser
+
+
+def crawler_from_args(args, driver_factory=None, ready=None):
+    if args.fetch == 'browser':
+        fetcher = BrowserFetcher(driver_factory, size=args.drivers, recycle_every=args.recycle_every, ready=ready)
+    else:
+        fetcher = HttpFetcher(cache=ConditionalCache(args.cache_dir) if args.cache_dir else None)
+    rate, min_rate, max_rate, target = rate_bounds(args, args.fetch)
+    policy = HostPolicy(rate=rate, max_concurrency=args.concurrency, budget=args.budget,
+                        min_rate=min_rate, max_rate=max_rate, target_latency=target)
+    mirrors = dict(m.split('=', 1) for m in args.mirror)
+    return Crawler(fetcher, concurrency=args.concurrency, policy=policy,
+                   retry=RetryPolicy(attempts=args.retries), mirrors=mirrors)
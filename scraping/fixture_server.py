@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur HTTP local qui rejoue des pages Avito / Mubawab sauvegardées (fixtures/)
+pour tester les scrapers hors ligne :
+    python fixture_server.py --port 8765 --latency 0.05 --error-rate 0.1 --rate-limit 20
+puis par exemple :
+    python scraper_avito_vente.py --fetch http --mirror https://www.avito.ma=http://127.0.0.1:8765/avito
+
+URL servie : /<site>/<chemin?requête du site réel>, résolue via fixtures/<site>/manifest.json
+({"chemin?requête": "fichier.html"} ; à défaut, le chemin sans requête). Injection de défauts :
+- latency : délai fixe avant chaque réponse (s)
+- error_rate : proportion de réponses 503
+- rate_limit : requêtes/s max par site, au-delà 429 + Retry-After
+Comme un vrai site : ETag / Last-Modified (304 sur requête conditionnelle) et gzip si accepté
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _key(path):
+    return unquote(path).lstrip('/')
+
+
+def load_routes(fixtures_dir=FIXTURES_DIR):
+    """{site: {clé normalisée: chemin du fichier}}"""
+    routes = {}
+    for site in sorted(os.listdir(fixtures_dir)):
+        manifest = os.path.join(fixtures_dir, site, 'manifest.json')
+        if not os.path.exists(manifest):
+            continue
+        with open(manifest, encoding='utf-8') as f:
+            pages = json.load(f)
+        routes[site] = {_key(k): os.path.join(fixtures_dir, site, v) for k, v in pages.items()}
+    return routes
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, routes, latency=0.0, error_rate=0.0, rate_limit=None, retry_after=1, seed=None):
+        super().__init__(address, FixtureHandler)
+        self.routes = routes
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.hits = Counter()           # (site, clé) -> requêtes reçues
+        self.statuses = Counter()       # statut -> réponses envoyées
+        self.bytes_sent = 0             # corps envoyés (après gzip)
+        self._files = {}                # chemin -> (html, gzip, etag, last-modified)
+        self.lock = threading.Lock()
+        self._windows = {}              # site -> (début de la seconde, requêtes)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def throttled(self, site):
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            start, count = self._windows.get(site, (now, 0))
+            if now - start >= 1.0:
+                start, count = now, 0
+            self._windows[site] = (start, count + 1)
+            return count >= self.rate_limit
+
+    def inject_error(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def load(self, path):
+        entry = self._files.get(path)
+        if entry is None:
+            with open(path, 'rb') as f:
+                body = f.read()
+            entry = (body, gzip.compress(body, 6), '"' + hashlib.sha1(body).hexdigest()[:16] + '"',
+                     formatdate(os.path.getmtime(path), usegmt=True))
+            self._files[path] = entry
+        return entry
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        site, _, rest = self.path.lstrip('/').partition('/')
+        key = _key(rest)
+        with server.lock:
+            server.hits[(site, key)] += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.throttled(site):
+            return self._send(429, b"Too Many Requests", {'Retry-After': str(server.retry_after)})
+        if server.error_rate and server.inject_error():
+            return self._send(503, b"Service Unavailable")
+
+        routes = server.routes.get(site, {})
+        # Paramètres inconnus (anti-cache des benchmarks...) : page du chemin seul
+        path = routes.get(key) or routes.get(key.partition('?')[0])
+        if path is None:
+            return self._send(404, b"Not Found")
+        body, compressed, etag, last_modified = server.load(path)
+        headers = {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag, 'Last-Modified': last_modified}
+        if self.headers.get('If-None-Match') == etag or (
+                'If-None-Match' not in self.headers and self.headers.get('If-Modified-Since') == last_modified):
+            return self._send(304, b"", headers)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = compressed
+            headers['Content-Encoding'] = 'gzip'
+        self._send(200, body, headers)
+
+    def _send(self, status, body, headers=None):
+        with self.server.lock:
+            self.server.statuses[status] += 1
+            self.server.bytes_sent += len(body)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if 'Content-Type' not in (headers or {}):
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, host='127.0.0.1', fixtures_dir=FIXTURES_DIR, **options):
+    """Démarre le serveur dans un thread ; server.shutdown() pour l'arrêter"""
+    server = FixtureServer((host, port), load_routes(fixtures_dir), **options)
+    threading.Thread(target=server.serve_forever, name='fixture-server', daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur de pages sauvegardées pour les scrapers")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FixtureServer((args.host, args.port), load_routes(), latency=args.latency,
+                           error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed)
+    print(f"🌐 Fixtures servies sur {server.url} ({', '.join(server.routes)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {sum(server.hits.values())} requêtes | statuts : {dict(server.statuses)}")
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction d'une annonce Mubawab en une seule passe lxml, à la place de l'arbre
+BeautifulSoup 'html.parser' et des find_all répétés de la version de référence
+(mubawab_pages.parse_vente_soup / parse_location_soup) :
+- le HTML est parsé une fois par libxml2 (lxml.html)
+- un seul parcours de l'arbre relève prix, quartier, titres h4, date et blocs de features
+- les blocs adDetailFeature sont indexés par classe d'icône (icon-bed, icon-bath...),
+  les blocs adMainFeature par libellé ("Type de bien", "Ville"...)
+- parse() renvoie un MubawabPage typé ; to_vente / to_location produisent les
+  dictionnaires des deux scrapers
+Même résultat que la référence, vérifié par : python bench_mubawab_extract.py
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import lxml.html
+from lxml import etree
+
+# Chaînes ignorées par get_text() de BeautifulSoup (Script, Stylesheet, TemplateString)
+SKIPPED_TAGS = {'script', 'style', 'template'}
+
+VILLES_URL = ["casablanca", "rabat", "marrakech", "tanger"]
+VILLES_TITRE = ['Casablanca', 'Rabat', 'Marrakech', 'Tanger', 'Casa', 'Tangier', 'Tanja']
+VILLES_QUARTIER = ['Casablanca', 'Rabat', 'Marrakech', 'Tanger']
+NORMALISATION_VILLE = {"Casa": "Casablanca", "Tangier": "Tanger"}
+
+# Chaînes de texte d'un élément, déjà strip() et sans les vides : get_text(sep, strip=True)
+# vaut sep.join(...) ; None si l'élément est absent de la page
+Text = Tuple[str, ...]
+
+
+def clean_text(s):
+    if not s:
+        return None
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def _collect(el, out):
+    if el.text and el.tag not in SKIPPED_TAGS:
+        out.append(el.text)
+    for child in el:
+        # Commentaires et instructions de traitement : seul le texte qui suit compte
+        if isinstance(child.tag, str):
+            _collect(child, out)
+        if child.tail:
+            out.append(child.tail)
+
+
+def raw_strings(el):
+    """Chaînes de texte de l'élément, dans l'ordre, comme les parcourt BeautifulSoup"""
+    out = []
+    _collect(el, out)
+    return out
+
+
+def strings(el):
+    return tuple(s for s in (s.strip() for s in raw_strings(el)) if s)
+
+
+def _class_value(el):
+    """Attribut class normalisé : find(class_='a b') compare cette chaîne entière"""
+    return ' '.join((el.get('class') or '').split())
+
+
+def _first(elements, tag, classes=None, token=None):
+    for el in elements.iter(tag):
+        if token is not None and token in (el.get('class') or '').split():
+            return el
+        if classes is not None and _class_value(el) == classes:
+            return el
+    return None
+
+
+@dataclass
+class DetailFeature:
+    """Bloc div.adDetailFeature : icônes <i>, texte du bloc, texte de chaque <span>"""
+    icons: FrozenSet[str]
+    text: Text
+    spans: Tuple[Text, ...]
+
+
+@dataclass
+class MubawabPage:
+    prix: Optional[Text] = None               # h3.orangeTit
+    quartier: Optional[Text] = None           # h3.greyTit
+    titre: Optional[Text] = None              # premier h4.titBlockProp
+    titre_inblock: Optional[Text] = None      # premier h4 class="titBlockProp inBlock"
+    titre_carte: Optional[Text] = None        # même h4 dans div class="blockProp mapBlockProp"
+    date: Optional[Text] = None               # span.adDispDate
+    details: List[DetailFeature] = field(default_factory=list)
+    # Spans de tous les blocs adDetailFeature, sans doublon (blocs imbriqués)
+    detail_spans: List[Text] = field(default_factory=list)
+    # (libellé brut, valeur) des blocs adMainFeature qui ont les deux
+    labels: List[Tuple[str, Text]] = field(default_factory=list)
+    by_icon: Dict[str, List[DetailFeature]] = field(default_factory=dict)
+
+    def feature(self, wanted_label):
+        """Valeur du premier bloc adMainFeature dont le libellé contient wanted_label"""
+        for label, value in self.labels:
+            if wanted_label in label:
+                return value
+        return None
+
+    def with_icon(self, icon):
+        return self.by_icon.get(icon, [])
+
+    # =========================================================
+    # SCHÉMA DU SCRAPER DE LOCATION (parse_location)
+    # =========================================================
+    def to_location(self, lien):
+        prix = clean_text(' '.join(self.prix)) if self.prix is not None else None
+        quartier = clean_text(' '.join(self.quartier)) if self.quartier is not None else None
+
+        surface = None
+        for span in self.detail_spans:
+            t = clean_text(' '.join(span))
+            if t and ("m²" in t or "m2" in t):
+                surface = t
+                break
+
+        type_bien = self.feature("Type de bien")
+        type_bien = clean_text(' '.join(type_bien)) if type_bien is not None else None
+
+        chambres = bains = None
+        for f in self.with_icon('icon-bed'):
+            chambres = clean_text(' '.join(f.text))
+            if chambres:
+                break
+        for f in self.with_icon('icon-bath'):
+            bains = clean_text(' '.join(f.text))
+            if bains:
+                break
+
+        date_annonce = clean_text(' '.join(self.date)) if self.date is not None else None
+
+        return {
+            "ville": self._ville_location(quartier, lien),
+            "prix": prix,
+            "surface": surface,
+            "quartier": quartier,
+            "type_bien": type_bien,
+            "nb_chambres": chambres,
+            "nb_salle_de_bain": bains,
+            "date_annonce": date_annonce,
+            "url": lien
+        }
+
+    def _ville_location(self, quartier, url):
+        ville = None
+        # 1) h4.titBlockProp ("Quartier à Ville")
+        if self.titre is not None:
+            txt_h4 = clean_text(' '.join(self.titre))
+            if txt_h4 and " à " in txt_h4:
+                ville = txt_h4.split(" à ")[-1].strip()
+        # 2) depuis quartier "xxx à Casablanca"
+        if not ville and quartier:
+            q = clean_text(quartier)
+            if q and " à " in q:
+                ville = q.split(" à ")[-1].strip()
+        # 3) features "Ville"
+        if not ville:
+            v = self.feature("Ville")
+            v = clean_text(' '.join(v)) if v is not None else None
+            if v:
+                ville = v
+        # 4) fallback URL
+        if not ville and url:
+            low = url.lower()
+            for v in VILLES_URL:
+                if v in low:
+                    ville = v.capitalize()
+                    break
+        ville = clean_text(ville)
+        if ville:
+            ville = NORMALISATION_VILLE.get(ville, ville)
+        return ville
+
+    # =========================================================
+    # SCHÉMA DU SCRAPER DE VENTE (parse_vente)
+    # =========================================================
+    def to_vente(self, lien):
+        prix = None
+        if self.prix is not None:
+            prix = re.split(r'Baisse|Hausse', ''.join(self.prix))[0].strip()
+
+        surface = None
+        for f in self.details:
+            if f.spans:
+                span_text = re.sub(r'\s+', ' ', ''.join(f.spans[0]))
+                if 'm²' in span_text or 'm2' in span_text:
+                    surface = span_text
+                    break
+
+        quartier = None
+        if self.quartier is not None:
+            quartier = ''.join(self.quartier)
+            if ' à ' in quartier:
+                quartier = quartier.split(' à ')[0].strip()
+
+        type_bien = self.feature('Type de bien')
+        type_bien = ''.join(type_bien) if type_bien is not None else None
+
+        nb_chambres = self._first_span('icon-bed')
+        if not nb_chambres:
+            # Un span vide ("") est conservé si aucun bloc icon-house-boxes n'a de span
+            boxes = self._first_span('icon-house-boxes')
+            if boxes is not None:
+                nb_chambres = boxes
+
+        date_annonce = ''.join(self.date) if self.date is not None else None
+
+        return {
+            'ville': self._ville_vente(quartier),
+            'prix': prix,
+            'surface': surface,
+            'quartier': quartier,
+            'type_bien': type_bien,
+            'nb_chambres': nb_chambres,
+            'nb_salle_de_bain': self._first_span('icon-bath'),
+            'url_annonce': lien,
+            'date_annonce': date_annonce
+        }
+
+    def _first_span(self, icon):
+        """Texte du premier <span> du premier bloc à cette icône qui en a un"""
+        for f in self.with_icon(icon):
+            if f.spans:
+                return ''.join(f.spans[0])
+        return None
+
+    def _ville_vente(self, quartier):
+        ville = None
+        # Méthode 1 : h4 "titBlockProp inBlock" ("Quartier à Ville" ou nom de ville)
+        if self.titre_inblock is not None:
+            title_text = ''.join(self.titre_inblock)
+            if ' à ' in title_text:
+                ville = title_text.split(' à ')[-1].strip()
+            else:
+                for v in VILLES_TITRE:
+                    if v.lower() in title_text.lower():
+                        if v.lower() in ['casa']:
+                            ville = 'Casablanca'
+                        elif v.lower() in ['tanja', 'tangier']:
+                            ville = 'Tanger'
+                        else:
+                            ville = v.capitalize()
+                        break
+        # Méthode 2 : même h4 dans le bloc de la carte
+        if not ville and self.titre_carte is not None:
+            map_text = ''.join(self.titre_carte)
+            if ' à ' in map_text:
+                ville = map_text.split(' à ')[-1].strip()
+        # Méthode 3 : nom de ville dans le quartier
+        if not ville and quartier:
+            for v in VILLES_QUARTIER:
+                if v.lower() in quartier.lower():
+                    ville = v
+                    break
+        # Méthode 4 : features "Ville"
+        if not ville:
+            v = self.feature('Ville')
+            if v is not None:
+                ville = ''.join(v)
+        return ville
+
+
+def _detail_feature(el, page, seen_spans):
+    spans = []
+    for span in el.iter('span'):
+        text = strings(span)
+        spans.append(text)
+        if span not in seen_spans:
+            seen_spans.add(span)
+            page.detail_spans.append(text)
+    icons = frozenset(c for i in el.iter('i') for c in (i.get('class') or '').split())
+    feature = DetailFeature(icons, strings(el), tuple(spans))
+    page.details.append(feature)
+    for icon in icons:
+        page.by_icon.setdefault(icon, []).append(feature)
+
+
+def _main_feature(el, page):
+    label = _first(el, 'p', token='adMainFeatureContentLabel')
+    value = _first(el, 'p', token='adMainFeatureContentValue')
+    if label is not None and value is not None:
+        page.labels.append((''.join(raw_strings(label)), strings(value)))
+
+
+def parse(html):
+    """Parse le HTML d'une annonce en une passe et renvoie un MubawabPage"""
+    page = MubawabPage()
+    try:
+        root = lxml.html.document_fromstring(html)
+    except etree.ParserError:
+        # Document vide : aucun élément, comme un arbre BeautifulSoup vide
+        return page
+    except ValueError:
+        # Chaîne avec déclaration d'encodage XML : libxml2 veut alors des octets
+        root = lxml.html.document_fromstring(
+            html.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+    seen_spans = set()
+    map_block = None
+    for el in root.iter('div', 'h3', 'h4', 'span'):
+        cls = el.get('class')
+        if not cls:
+            continue
+        tokens = cls.split()
+        tag = el.tag
+        if tag == 'div':
+            if 'adDetailFeature' in tokens:
+                _detail_feature(el, page, seen_spans)
+            if 'adMainFeature' in tokens:
+                _main_feature(el, page)
+            if map_block is None and ' '.join(tokens) == 'blockProp mapBlockProp':
+                map_block = el
+        elif tag == 'h3':
+            if page.prix is None and 'orangeTit' in tokens:
+                page.prix = strings(el)
+            if page.quartier is None and 'greyTit' in tokens:
+                page.quartier = strings(el)
+        elif tag == 'h4':
+            if page.titre is None and 'titBlockProp' in tokens:
+                page.titre = strings(el)
+            if page.titre_inblock is None and ' '.join(tokens) == 'titBlockProp inBlock':
+                page.titre_inblock = strings(el)
+        elif page.date is None and 'adDispDate' in tokens:
+            page.date = strings(el)
+
+    if map_block is not None:
+        h4 = _first(map_block, 'h4', classes='titBlockProp inBlock')
+        if h4 is not None:
+            page.titre_carte = strings(h4)
+    return page
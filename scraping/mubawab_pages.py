@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+Pages Mubawab : extraction des liens (listingBox) et des détails d'une annonce
+à partir du HTML, et crawl asynchrone des pages de résultats.
+parse_vente / parse_location reprennent les extractions des deux scrapers
+(schémas de sortie différents : url_annonce / url, nb_salle_de_bain...) en une
+passe lxml (mubawab_extract.py) ; parse_vente_soup / parse_location_soup restent
+la version BeautifulSoup de référence.
+"""
+
+import re
+
+from bs4 import BeautifulSoup
+
+import mubawab_extract
+from crawler import FetchError
+from mubawab_extract import clean_text
+
+
+# =========================================================
+# HELPERS
+# =========================================================
+
+def extract_surface(soup):
+    try:
+        for s in soup.select("div.adDetailFeature span"):
+            t = clean_text(s.get_text(" ", strip=True))
+            if t and ("m²" in t or "m2" in t):
+                return t
+    except Exception:
+        pass
+    return None
+
+
+def extract_type_bien(soup):
+    return extract_from_features(soup, "Type de bien")
+
+
+def extract_from_features(soup, wanted_label):
+    try:
+        for f in soup.select("div.adMainFeature"):
+            label = f.select_one("p.adMainFeatureContentLabel")
+            value = f.select_one("p.adMainFeatureContentValue")
+            if label and value and wanted_label in label.get_text():
+                return clean_text(value.get_text(" ", strip=True))
+    except Exception:
+        pass
+    return None
+
+
+def extract_rooms_baths(soup):
+    chambres = None
+    bains = None
+    try:
+        for f in soup.select("div.adDetailFeature"):
+            if not chambres and f.select_one("i.icon-bed"):
+                chambres = clean_text(f.get_text(" ", strip=True))
+            if not bains and f.select_one("i.icon-bath"):
+                bains = clean_text(f.get_text(" ", strip=True))
+    except Exception:
+        pass
+    return chambres, bains
+
+
+def extract_ville(soup, quartier, url):
+    ville = None
+
+    # 1) h4.titBlockProp ("Quartier à Ville")
+    try:
+        h4 = soup.select_one("h4.titBlockProp")
+        if h4:
+            txt_h4 = clean_text(h4.get_text(" ", strip=True))
+            if txt_h4 and " à " in txt_h4:
+                ville = txt_h4.split(" à ")[-1].strip()
+    except Exception:
+        pass
+
+    # 2) depuis quartier "xxx à Casablanca"
+    if not ville and quartier:
+        q = clean_text(quartier)
+        if q and " à " in q:
+            ville = q.split(" à ")[-1].strip()
+
+    # 3) features "Ville"
+    if not ville:
+        v = extract_from_features(soup, "Ville")
+        if v:
+            ville = v
+
+    # 4) fallback URL
+    if not ville and url:
+        low = url.lower()
+        for v in ["casablanca", "rabat", "marrakech", "tanger"]:
+            if v in low:
+                ville = v.capitalize()
+                break
+
+    ville = clean_text(ville)
+
+    # normalisation
+    if ville:
+        norm = {"Casa": "Casablanca", "Tangier": "Tanger"}
+        ville = norm.get(ville, ville)
+
+    return ville
+
+
+# =========================================================
+# ANNONCE DE LOCATION (scraper_mubawab_location.py)
+# =========================================================
+def parse_location(html, lien):
+    return mubawab_extract.parse(html).to_location(lien)
+
+
+def parse_location_soup(html, lien):
+    """Version de référence (BeautifulSoup) de parse_location"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    prix = None
+    hprix = soup.select_one("h3.orangeTit")
+    if hprix:
+        prix = clean_text(hprix.get_text(" ", strip=True))
+
+    surface = extract_surface(soup)
+
+    quartier = None
+    hq = soup.select_one("h3.greyTit")
+    if hq:
+        quartier = clean_text(hq.get_text(" ", strip=True))
+
+    type_bien = extract_type_bien(soup)
+    chambres, bains = extract_rooms_baths(soup)
+
+    date_annonce = None
+    dd = soup.select_one("span.adDispDate")
+    if dd:
+        date_annonce = clean_text(dd.get_text(" ", strip=True))
+
+    ville = extract_ville(soup, quartier, lien)
+
+    return {
+        "ville": ville,
+        "prix": prix,
+        "surface": surface,
+        "quartier": quartier,
+        "type_bien": type_bien,
+        "nb_chambres": chambres,
+        "nb_salle_de_bain": bains,
+        "date_annonce": date_annonce,
+        "url": lien
+    }
+
+
+# =========================================================
+# ANNONCE DE VENTE (scraper_mubawab_ventes.py)
+# =========================================================
+def parse_vente(html, lien):
+    return mubawab_extract.parse(html).to_vente(lien)
+
+
+def parse_vente_soup(html, lien):
+    """Version de référence (BeautifulSoup) de parse_vente"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Extraire le prix
+    try:
+        prix_element = soup.find('h3', class_='orangeTit')
+        if prix_element:
+            prix = prix_element.get_text(strip=True)
+            prix = re.split(r'Baisse|Hausse', prix)[0].strip()
+        else:
+            prix = None
+    except:
+        prix = None
+
+    # Extraire la surface
+    try:
+        surface = None
+        for feature in soup.find_all('div', class_='adDetailFeature'):
+            span = feature.find('span')
+            if span:
+                span_text = span.get_text(strip=True)
+                span_text = re.sub(r'\s+', ' ', span_text)
+                if 'm²' in span_text or 'm2' in span_text:
+                    surface = span_text
+                    break
+    except:
+        surface = None
+
+    # Extraire le quartier
+    try:
+        quartier_element = soup.find('h3', class_='greyTit')
+        if quartier_element:
+            quartier_complet = quartier_element.get_text(strip=True)
+            if ' à ' in quartier_complet:
+                quartier = quartier_complet.split(' à ')[0].strip()
+            else:
+                quartier = quartier_complet
+        else:
+            quartier = None
+    except:
+        quartier = None
+
+    # Extraire la ville depuis 'titBlockProp inBlock'
+    ville = None
+    try:
+        # Méthode 1: Depuis le h4 dans titBlockProp inBlock
+        title_block = soup.find('h4', class_='titBlockProp inBlock')
+        if title_block:
+            title_text = title_block.get_text(strip=True)
+            # Format attendu: "Quartier à Ville"
+            if ' à ' in title_text:
+                ville = title_text.split(' à ')[-1].strip()
+            else:
+                # Sinon, chercher dans le texte
+                villes_possibles = ['Casablanca', 'Rabat', 'Marrakech', 'Tanger',
+                                    'Casa', 'Tangier', 'Tanja']
+                for v in villes_possibles:
+                    if v.lower() in title_text.lower():
+                        # Normaliser le nom
+                        if v.lower() in ['casa']:
+                            ville = 'Casablanca'
+                        elif v.lower() in ['tanja', 'tangier']:
+                            ville = 'Tanger'
+                        else:
+                            ville = v.capitalize()
+                        break
+    except:
+        pass
+
+    # Si pas trouvée, essayer depuis blockProp mapBlockProp (la carte)
+    if not ville:
+        try:
+            map_block = soup.find('div', class_='blockProp mapBlockProp')
+            if map_block:
+                h4 = map_block.find('h4', class_='titBlockProp inBlock')
+                if h4:
+                    map_text = h4.get_text(strip=True)
+                    if ' à ' in map_text:
+                        ville = map_text.split(' à ')[-1].strip()
+        except:
+            pass
+
+    # Si toujours pas trouvée, chercher dans le quartier
+    if not ville and quartier:
+        villes_possibles = ['Casablanca', 'Rabat', 'Marrakech', 'Tanger']
+        for v in villes_possibles:
+            if v.lower() in quartier.lower():
+                ville = v
+                break
+
+    # Si toujours pas trouvée, chercher dans les features
+    if not ville:
+        try:
+            for feature in soup.find_all('div', class_='adMainFeature'):
+                label = feature.find('p', class_='adMainFeatureContentLabel')
+                if label and 'Ville' in label.get_text():
+                    value = feature.find('p', class_='adMainFeatureContentValue')
+                    if value:
+                        ville = value.get_text(strip=True)
+                        break
+        except:
+            pass
+
+    # Extraire le type de bien
+    try:
+        type_bien = None
+        for feature in soup.find_all('div', class_='adMainFeature'):
+            label = feature.find('p', class_='adMainFeatureContentLabel')
+            if label and 'Type de bien' in label.get_text():
+                value = feature.find('p', class_='adMainFeatureContentValue')
+                if value:
+                    type_bien = value.get_text(strip=True)
+                    break
+    except:
+        type_bien = None
+
+    # Extraire le nombre de chambres
+    try:
+        nb_chambres = None
+        for feature in soup.find_all('div', class_='adDetailFeature'):
+            icon = feature.find('i', class_='icon-bed')
+            if icon:
+                span = feature.find('span')
+                if span:
+                    nb_chambres = span.get_text(strip=True)
+                    break
+
+        if not nb_chambres:
+            for feature in soup.find_all('div', class_='adDetailFeature'):
+                icon = feature.find('i', class_='icon-house-boxes')
+                if icon:
+                    span = feature.find('span')
+                    if span:
+                        nb_chambres = span.get_text(strip=True)
+                        break
+    except:
+        nb_chambres = None
+
+    # Extraire le nombre de salles de bain
+    try:
+        nb_salle_de_bain = None
+        for feature in soup.find_all('div', class_='adDetailFeature'):
+            icon = feature.find('i', class_='icon-bath')
+            if icon:
+                span = feature.find('span')
+                if span:
+                    nb_salle_de_bain = span.get_text(strip=True)
+                    break
+    except:
+        nb_salle_de_bain = None
+
+    # Extraire la date d'annonce
+    try:
+        date_annonce = soup.find('span', class_='adDispDate')
+        if date_annonce:
+            date_annonce = date_annonce.get_text(strip=True)
+        else:
+            date_annonce = None
+    except:
+        date_annonce = None
+
+    return {
+        'ville': ville,
+        'prix': prix,
+        'surface': surface,
+        'quartier': quartier,
+        'type_bien': type_bien,
+        'nb_chambres': nb_chambres,
+        'nb_salle_de_bain': nb_salle_de_bain,
+        'url_annonce': lien,
+        'date_annonce': date_annonce
+    }
+
+
+# =========================================================
+# PAGES DE RÉSULTATS + CRAWL
+# =========================================================
+def page_url(url_base, page):
+    """URL de la page N : ':p:N' ajouté (ou remplacé) en fin d'URL"""
+    if page == 1:
+        return url_base
+    if ':p:' in url_base:
+        return re.sub(r':p:\d+', f':p:{page}', url_base)
+    return url_base + f':p:{page}'
+
+
+def listing_cards(html):
+    """(nb de listingBox, {lien 'linkref': texte de la carte}) d'une page de résultats"""
+    soup = BeautifulSoup(html, "html.parser")
+    annonces = soup.select(".listingBox")
+    cards = {}
+    for a in annonces:
+        if a.get("linkref"):
+            cards.setdefault(a.get("linkref"), a.get_text(" ", strip=True))
+    return len(annonces), cards
+
+
+def listing_links(html):
+    """(nb de listingBox, liens 'linkref') d'une page de résultats"""
+    count, cards = listing_cards(html)
+    return count, list(cards)
+
+
+async def crawl(crawler, url_base, parse, on_record, start_page=1, max_pages=None,
+                link_filter=None, on_page=None, stop_on_empty=True, seen=None, frontier=None):
+    """
+    Pages de résultats en séquence, annonces de chaque page en parallèle
+    - parse(html, lien) -> dict ; on_record(lien, record) appelé dans l'ordre des liens
+    - link_filter(lien) -> False pour ignorer un lien (déjà scrapé, hors annonce...)
+    - seen (seen_index.SeenIndex) : annonces connues au prix inchangé non ouvertes,
+      on_record appelé seulement pour les nouvelles et les modifiées
+    - on_page(page suivante) après chaque page (sauvegarde de la progression) ; False arrête le crawl
+    - s'arrête à la première page sans annonce (ou en échec) si stop_on_empty
+    - frontier (crawl_frontier.Frontier) : reprise à la première page non faite (start_page
+      seulement pour un nouveau crawl), annonces déjà faites sautées ; la page suivante est
+      ajoutée à la frontière avant que la page courante soit marquée faite, après on_page
+    """
+    page = start_page
+    async with crawler:
+        if frontier is not None and not frontier.has_pages():
+            frontier.add_pages([(start_page, page_url(url_base, start_page))])
+        while True:
+            if frontier is None:
+                if max_pages is not None and page > max_pages:
+                    break
+                url = page_url(url_base, page)
+            else:
+                task = frontier.next_page()
+                if task is None:
+                    break
+                page, url = task.page, task.url
+            print(f"\n{'-' * 70}\nPAGE {page}\n{'-' * 70}")
+            try:
+                results = await crawler.fetch(url)
+                count, cards = listing_cards(results.text) if results.ok else (0, {})
+            except FetchError as e:
+                print(f"⛔ Page {page} ignorée : {e}")
+                count, cards = None, {}
+                if frontier is not None:
+                    # Relancée plus tard ; la suite de la pagination continue sans elle
+                    frontier.fail(url, e)
+                    if not stop_on_empty:
+                        add_next_page(frontier, url_base, page + 1, max_pages)
+                    continue
+
+            if count == 0:
+                print("Aucune annonce trouvée sur cette page")
+            if not count and stop_on_empty:
+                # page vide ou en échec après relances : fin de la pagination
+                if frontier is not None:
+                    frontier.finish_page(url)
+                break
+
+            todo = list(cards)
+            if link_filter is not None:
+                todo = [l for l in todo if link_filter(l)]
+            if frontier is not None:
+                todo = frontier.lease_listings(url, todo)
+            liens = todo
+            if seen is not None:
+                liens = [l for l in liens if seen.should_fetch(l, cards[l])]
+            records, errors = {}, {}
+            async for lien, record in crawler.map(liens, lambda p: parse(p.text, p.url)):
+                if isinstance(record, Exception):
+                    print(f"⚠ Lien ignoré ({lien}) : {record}")
+                    errors[lien] = record
+                elif seen is None or seen.observe(lien, record, cards[lien]) != 'unchanged':
+                    records[lien] = record
+            for lien in liens:
+                if lien in records:
+                    on_record(lien, records[lien])
+            if seen is not None:
+                seen.commit()
+            print(f"✓ Page {page} terminée : {len(records)}/{len(liens)} annonces extraites"
+                  + (f" ({len(cards) - len(liens)} ignorées)" if seen is not None else ""))
+
+            page += 1
+            stop = on_page is not None and on_page(page) is False
+            if frontier is not None:
+                # on_page a mis les annonces sur disque : elles peuvent être marquées faites
+                if not stop:
+                    add_next_page(frontier, url_base, page, max_pages)
+                frontier.finish_page(url, todo, errors)
+            if stop:
+                break
+
+    print(f"\n✅ {crawler.stats.summary()}")
+    if seen is not None:
+        print(f"🗂 {seen.summary()}")
+    if frontier is not None:
+        print(f"🧭 {frontier.summary()}")
+    return page
+
+
+def add_next_page(frontier, url_base, page, max_pages=None):
+    """Pagination sans fin connue : la page suivante entre dans la frontière au fil du crawl"""
+    if max_pages is None or page <= max_pages:
+        frontier.add_pages([(page, page_url(url_base, page))])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Cadence adaptative des requêtes, à la place des time.sleep fixes des scrapers
+- AdaptiveRate : débit courant (req/s) borné par min_rate / max_rate, ajusté comme le
+  contrôle de congestion TCP (AIMD) : +increase après une réponse rapide, x decrease
+  après une erreur (exception, 429, 5xx), x slow_decrease après une réponse plus lente
+  que target_latency
+- Pacer : seau à jetons synchrone pour les boucles Selenium ; request() attend un jeton,
+  mesure la requête (chargement + attente explicite de la page) et ajuste le débit
+- temps passé à attendre (débit) et à travailler (requêtes) cumulés : summary()
+- le moteur asynchrone (crawler.HostLimiter) utilise le même AdaptiveRate par hôte
+"""
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Latence cible par défaut : au-delà, la réponse est jugée lente et le débit baisse
+TARGET_LATENCY = {'http': 2.0, 'browser': 6.0}
+
+
+@dataclass
+class AdaptiveRate:
+    rate: float                     # débit courant (req/s)
+    min_rate: float
+    max_rate: float
+    target_latency: float = TARGET_LATENCY['browser']
+    increase: float = 0.1           # req/s ajoutés après une réponse rapide
+    decrease: float = 0.5           # facteur après une erreur
+    slow_decrease: float = 0.8      # facteur après une réponse lente
+    start: float = field(init=False)
+    lowest: float = field(init=False)
+    highest: float = field(init=False)
+
+    def __post_init__(self):
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        self.start = self.lowest = self.highest = self.rate
+
+    def update(self, latency, ok=True):
+        if not ok:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+        elif latency > self.target_latency:
+            self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+        self.lowest = min(self.lowest, self.rate)
+        self.highest = max(self.highest, self.rate)
+        return self.rate
+
+    def describe(self):
+        if self.min_rate == self.max_rate:
+            return f"{self.rate:.2f} req/s (fixe)"
+        return (f"{self.start:.2f} → {self.rate:.2f} req/s (entre {self.lowest:.2f} et {self.highest:.2f}, "
+                f"bornes {self.min_rate:.2f}-{self.max_rate:.2f})")
+
+
+def rate_bounds(args, fetch='browser'):
+    """(débit initial, min, max, latence cible) des options --rate, --min-rate, --max-rate..."""
+    rate = getattr(args, 'rate', 2.0)
+    if getattr(args, 'fixed_rate', False):
+        return rate, rate, rate, float('inf')
+    min_rate = getattr(args, 'min_rate', None)
+    max_rate = getattr(args, 'max_rate', None)
+    target = getattr(args, 'target_latency', None)
+    return (rate,
+            rate / 4 if min_rate is None else min_rate,
+            rate * 2 if max_rate is None else max_rate,
+            TARGET_LATENCY[fetch] if target is None else target)
+
+
+class Pacer:
+    """
+    Usage :
+        pacer = Pacer(rate=1.0)
+        with pacer.request():
+            driver.get(url)
+            WebDriverWait(driver, 10).until(...)
+    Une exception dans le bloc compte comme une erreur (débit divisé) puis est relancée
+    rate=0 : pas de limite, seul le temps de travail est mesuré
+    """
+
+    def __init__(self, rate=1.0, min_rate=None, max_rate=None, target_latency=TARGET_LATENCY['browser'], burst=1):
+        self.control = AdaptiveRate(rate, rate if min_rate is None else min_rate,
+                                    rate if max_rate is None else max_rate, target_latency)
+        self.burst = burst
+        self.waited = 0.0
+        self.worked = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.slow = 0
+        self.started = time.monotonic()
+        self._tokens = float(burst)
+        self._updated = self.started
+
+    def wait(self):
+        """Attend le prochain jeton ; renvoie la durée attendue"""
+        rate = self.control.rate
+        if not rate:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        delay = (1 - self._tokens) / rate
+        time.sleep(delay)
+        self.waited += delay
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        return delay
+
+    def record(self, latency, ok=True):
+        self.requests += 1
+        self.worked += latency
+        if not ok:
+            self.errors += 1
+        elif latency > self.control.target_latency:
+            self.slow += 1
+        if self.control.rate:
+            self.control.update(latency, ok)
+
+    @contextmanager
+    def request(self):
+        self.wait()
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(time.monotonic() - start, ok=False)
+            raise
+        self.record(time.monotonic() - start)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        share = self.waited / elapsed * 100 if elapsed else 0
+        return (f"⏱ {self.requests} requêtes en {elapsed:.1f}s | attente débit {self.waited:.1f}s ({share:.0f}%), "
+                f"travail {self.worked:.1f}s | {self.errors} erreurs, {self.slow} lentes | "
+                f"débit {self.control.describe()}")
+
+
+def pacer_from_args(args, fetch='browser'):
+    """Pacer des boucles Selenium, avec les options du crawler (add_crawler_arguments)"""
+    rate, min_rate, max_rate, target = rate_bounds(args, fetch)
+    return Pacer(rate, min_rate, max_rate, target)
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Stockage incrémental des annonces scrapées : un fichier NDJSON en ajout seul
+(une annonce JSON par ligne) au lieu de réécrire tout le dictionnaire à chaque sauvegarde
+- RecordStore.append écrit une ligne ; fsync groupé toutes les `fsync_every` annonces
+  ou `fsync_seconds` secondes (flush() force l'écriture sur disque)
+- à l'ouverture, une dernière ligne tronquée (arrêt brutal pendant une écriture) est retirée
+- save_checkpoint : progression écrite de façon atomique (fichier temporaire + os.replace),
+  après store.flush() : le checkpoint ne désigne que des annonces déjà sur disque
+- compact : une ligne par clé (la dernière), lignes illisibles retirées ; à lancer entre
+  deux runs, pas pendant qu'un scraper écrit dans le fichier
+- iter_records / read_frames : lecture en flux (annonce par annonce ou DataFrames par blocs)
+- export_json : dictionnaire {"annonce_N": {...}} lu par les notebooks, écrit en flux
+Usage :
+    python record_store.py compact annonces_location_all.ndjson --key url
+    python record_store.py export annonces_location_all.ndjson annonces_location_all.json
+    python record_store.py import annonces_location_all.json annonces_location_all.ndjson
+"""
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+
+
+def annonce_key(record):
+    """Clé du JSON historique : "annonce_12" (id entier ou déjà préfixé)"""
+    record_id = record.get('id')
+    return record_id if isinstance(record_id, str) else f"annonce_{record_id}"
+
+
+def _parse(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def repair(path):
+    """
+    Retire une dernière ligne incomplète (écriture interrompue) ; une dernière ligne
+    valide sans retour à la ligne est gardée et terminée. Renvoie les octets retirés
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return 0
+        # Début de la dernière ligne : recherche du dernier '\n' par blocs depuis la fin
+        start, pos = 0, size
+        while pos > 0:
+            step = min(65536, pos)
+            pos -= step
+            f.seek(pos)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                start = pos + newline + 1
+                break
+        f.seek(start)
+        if _parse(f.read().decode('utf-8', errors='replace')) is not None:
+            f.write(b'\n')
+            return 0
+        f.truncate(start)
+        return size - start
+
+
+class RecordStore:
+    """Fichier NDJSON ouvert en ajout, fsync groupé"""
+
+    def __init__(self, path, fsync_every=50, fsync_seconds=5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self.repaired = repair(path)
+        self.appended = 0
+        self._file = open(path, 'a', encoding='utf-8')
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        # json.dumps échappe les retours à la ligne : une annonce = une ligne
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._pending += 1
+        self.appended += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_seconds:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        if self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def size(self):
+        """Taille en octets de ce qui est sur disque (après flush)"""
+        self.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path):
+    """
+    Annonces du fichier une par une, sans tout charger ; lignes illisibles ignorées.
+    Un JSON historique ({"annonce_1": {...}}) est aussi accepté, mais chargé d'un bloc
+    """
+    if not os.path.exists(path):
+        return
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        records = data.values() if isinstance(data, dict) else data
+        yield from (record for record in records if isinstance(record, dict))
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = _parse(line)
+            if record is not None:
+                yield record
+
+
+def read_frames(path, chunksize=5000):
+    """DataFrames successifs de `chunksize` annonces (notebooks, backend)"""
+    batch = []
+    for record in iter_records(path):
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def load_checkpoint(path, default=None):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict(default or {})
+
+
+def save_checkpoint(path, state):
+    """Écriture atomique : l'ancien checkpoint reste intact si l'écriture est interrompue"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def compact(path, key):
+    """
+    Réécrit le fichier avec une seule ligne par valeur de `key` (la dernière écrite)
+    et sans les lignes illisibles ; renvoie (lignes gardées, lignes retirées)
+    """
+    # 1re passe : numéro de la dernière ligne de chaque clé (les clés seules en mémoire)
+    last, total = {}, 0
+    with open(path, encoding='utf-8') as f:
+        for n, line in enumerate(f):
+            total += 1
+            record = _parse(line)
+            if record is not None:
+                value = record.get(key)
+                last[(None, n) if value is None else value] = n
+    keep = set(last.values())
+
+    # 2e passe : copie des lignes gardées, puis remplacement atomique
+    tmp = path + '.compact'
+    with open(path, encoding='utf-8') as src, open(tmp, 'w', encoding='utf-8') as dst:
+        for n, line in enumerate(src):
+            if n in keep:
+                dst.write(line if line.endswith('\n') else line + '\n')
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp, path)
+    return len(keep), total - len(keep)
+
+
+def export_json(path, out, key=annonce_key):
+    """Écrit {clé: annonce} au format des notebooks (indent=4), en flux ; renvoie le nombre d'annonces"""
+    tmp = out + '.tmp'
+    count = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for record in iter_records(path):
+            body = json.dumps(record, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+            f.write(f"{',' if count else ''}\n    {json.dumps(key(record), ensure_ascii=False)}: {body}")
+            count += 1
+        f.write('\n}' if count else '}')
+    os.replace(tmp, out)
+    return count
+
+
+def import_json(source, path):
+    """Ajoute au store les annonces d'un JSON historique ; renvoie leur nombre"""
+    with RecordStore(path, fsync_every=1000) as store:
+        for record in iter_records(source):
+            store.append(record)
+        return store.appended
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stockage NDJSON des annonces scrapées")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('compact', help="une ligne par clé, lignes illisibles retirées")
+    p.add_argument('path')
+    p.add_argument('--key', default='url', help="champ identifiant l'annonce (url, url_annonce...)")
+    p = sub.add_parser('export', help="NDJSON -> JSON {annonce_N: {...}} des notebooks")
+    p.add_argument('path')
+    p.add_argument('out')
+    p = sub.add_parser('import', help="JSON historique -> NDJSON")
+    p.add_argument('source')
+    p.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        kept, dropped = compact(args.path, args.key)
+        print(f"🗜 {args.path} : {kept} annonces gardées, {dropped} lignes retirées")
+    elif args.command == 'export':
+        print(f"💾 {export_json(args.path, args.out)} annonces exportées dans {args.out}")
+    else:
+        print(f"📥 {import_json(args.source, args.path)} annonces ajoutées à {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,18 @@ from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
-import time
-import json
-import re
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException, WebDriverException
+import argparse
+import asyncio
 import os
-from bs4 import BeautifulSoup
+
+import crawl_frontier
+import mubawab_pages
+import pacing
+import record_store
+import seen_index
+from crawler import add_crawler_arguments, crawler_from_args, document_ready
+from record_store import RecordStore, iter_records
 
 # =========================================================
 # CONFIG
@@ -24,6 +30,8 @@ MAX_PAGES = 400
 BACKUP_EVERY = 50
 RESTART_EVERY = 200
 
+# Annonces ajoutées au fil du crawl (une par ligne) ; OUT_FILE en est l'export JSON
+STORE_FILE = "annonces_location_all.ndjson"
 OUT_FILE = "annonces_location_all.json"
 BACKUP_FILE = "annonces_location_all_backup.json"
 PROGRESS_FILE = "progress_location.json"
@@ -47,51 +55,64 @@ prefs = {
 }
 chrome_options.add_experimental_option("prefs", prefs)
 
-service = Service(ChromeDriverManager().install())
-
-def start_driver():
-    d = webdriver.Chrome(service=service, options=chrome_options)
+service = None
+
+def start_driver(headless=False):
+    global service
+    if service is None:
+        service = Service(ChromeDriverManager().install())
+    options = chrome_options
+    if headless:
+        options = Options()
+        for arg in chrome_options.arguments + ["--headless=new"]:
+            options.add_argument(arg)
+        options.page_load_strategy = chrome_options.page_load_strategy
+        options.add_experimental_option("prefs", prefs)
+    d = webdriver.Chrome(service=service, options=options)
     d.set_page_load_timeout(30)
     return d
 
-driver = start_driver()
+# Chrome n'est démarré que par le chemin Selenium (ou par le pool de pilotes du mode async)
+driver = None
+# Cadence adaptative des chargements du chemin Selenium (pacing.Pacer)
+pacer = None
 
 # =========================================================
-# LOAD/SAVE (DATA + PROGRESS)
+# STORE (DATA + PROGRESS)
 # =========================================================
-def load_locations():
-    if os.path.exists(OUT_FILE):
-        with open(OUT_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    if os.path.exists(BACKUP_FILE):
-        with open(BACKUP_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_locations(locations, backup=False):
-    path = BACKUP_FILE if backup else OUT_FILE
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(locations, f, ensure_ascii=False, indent=4)
-
-def load_progress():
-    if os.path.exists(PROGRESS_FILE):
-        with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"page": 1, "compteur": 0}
-
-def save_progress(page, compteur):
-    with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"page": page, "compteur": compteur}, f, ensure_ascii=False, indent=2)
+def open_store():
+    """Store NDJSON en ajout seul ; au premier lancement, reprend le JSON historique"""
+    if not os.path.exists(STORE_FILE):
+        for legacy in (OUT_FILE, BACKUP_FILE):
+            if os.path.exists(legacy):
+                print(f"📥 {record_store.import_json(legacy, STORE_FILE)} annonces reprises de {legacy}")
+                break
+    return RecordStore(STORE_FILE, fsync_every=BACKUP_EVERY)
 
-def infer_compteur_from_data(locations):
-    # si on a déjà des annonces, on récupère le max id
+def scan_locations():
+    """(URLs déjà scrapées, plus grand id), lus en flux dans le store"""
+    urls = set()
     max_id = 0
-    for k, v in locations.items():
+    for v in iter_records(STORE_FILE):
+        urls.add(v.get("url"))
         try:
             max_id = max(max_id, int(v.get("id", 0)))
         except Exception:
             pass
-    return max_id
+    return urls, max_id
+
+def load_progress():
+    return record_store.load_checkpoint(PROGRESS_FILE, {"page": 1, "compteur": 0})
+
+def save_progress(store, page, compteur):
+    # Annonces sur disque avant le checkpoint : il ne pointe jamais au-delà des données
+    record_store.save_checkpoint(PROGRESS_FILE, {"page": page, "compteur": compteur, "octets": store.size()})
+
+def export_locations():
+    """JSON {"annonce_N": {...}} lu par les notebooks, écrit une fois en fin de run"""
+    n = record_store.export_json(STORE_FILE, OUT_FILE)
+    print(f"💾 {n} annonces exportées dans {OUT_FILE}")
+    return n
 
 # =========================================================
 # RESTART DRIVER
@@ -102,18 +123,30 @@ def restart_driver():
         driver.quit()
     except Exception:
         pass
-    time.sleep(4)
     driver = start_driver()
     print("🔄 Chrome redémarré")
 
+def attendre(condition, timeout=10):
+    """Attente explicite (au lieu d'un time.sleep fixe) ; False si la condition n'arrive pas"""
+    try:
+        WebDriverWait(driver, timeout).until(condition)
+        return True
+    except TimeoutException:
+        return False
+
 # =========================================================
 # SAFE GET (handles dead session)
 # =========================================================
-def safe_get(url, retries=3, sleep_between=2):
+def safe_get(url, retries=3):
+    """
+    Chargement cadencé par le pacer : une erreur divise le débit, la tentative suivante
+    attend donc son jeton plus longtemps (pas de pause fixe entre les essais)
+    """
     global driver
     for i in range(retries):
         try:
-            driver.get(url)
+            with pacer.request():
+                driver.get(url)
             return True
         except InvalidSessionIdException:
             print("💥 InvalidSessionId → restart")
@@ -125,129 +158,34 @@ def safe_get(url, retries=3, sleep_between=2):
                 restart_driver()
             else:
                 print(f"⚠ WebDriverException ({i+1}/{retries}) → retry...")
-                time.sleep(sleep_between)
         except Exception:
             print(f"⚠ Timeout ({i+1}/{retries}) → retry...")
-            time.sleep(sleep_between)
     return False
 
-# =========================================================
-# HELPERS
-# =========================================================
-def clean_text(s):
-    if not s:
-        return None
-    return re.sub(r"\s+", " ", s).strip()
-
-def extract_surface(soup):
-    try:
-        for s in soup.select("div.adDetailFeature span"):
-            t = clean_text(s.get_text(" ", strip=True))
-            if t and ("m²" in t or "m2" in t):
-                return t
-    except Exception:
-        pass
-    return None
-
-def extract_type_bien(soup):
-    try:
-        for f in soup.select("div.adMainFeature"):
-            label = f.select_one("p.adMainFeatureContentLabel")
-            value = f.select_one("p.adMainFeatureContentValue")
-            if label and value and "Type de bien" in label.get_text():
-                return clean_text(value.get_text(" ", strip=True))
-    except Exception:
-        pass
-    return None
-
-def extract_from_features(soup, wanted_label):
-    try:
-        for f in soup.select("div.adMainFeature"):
-            label = f.select_one("p.adMainFeatureContentLabel")
-            value = f.select_one("p.adMainFeatureContentValue")
-            if label and value and wanted_label in label.get_text():
-                return clean_text(value.get_text(" ", strip=True))
-    except Exception:
-        pass
-    return None
-
-def extract_rooms_baths(soup):
-    chambres = None
-    bains = None
-    try:
-        for f in soup.select("div.adDetailFeature"):
-            if not chambres and f.select_one("i.icon-bed"):
-                chambres = clean_text(f.get_text(" ", strip=True))
-            if not bains and f.select_one("i.icon-bath"):
-                bains = clean_text(f.get_text(" ", strip=True))
-    except Exception:
-        pass
-    return chambres, bains
-
-def extract_ville(soup, quartier, url):
-    ville = None
-
-    # 1) h4.titBlockProp ("Quartier à Ville")
-    try:
-        h4 = soup.select_one("h4.titBlockProp")
-        if h4:
-            txt_h4 = clean_text(h4.get_text(" ", strip=True))
-            if txt_h4 and " à " in txt_h4:
-                ville = txt_h4.split(" à ")[-1].strip()
-    except Exception:
-        pass
-
-    # 2) depuis quartier "xxx à Casablanca"
-    if not ville and quartier:
-        q = clean_text(quartier)
-        if q and " à " in q:
-            ville = q.split(" à ")[-1].strip()
-
-    # 3) features "Ville"
-    if not ville:
-        v = extract_from_features(soup, "Ville")
-        if v:
-            ville = v
-
-    # 4) fallback URL
-    if not ville and url:
-        low = url.lower()
-        for v in ["casablanca", "rabat", "marrakech", "tanger"]:
-            if v in low:
-                ville = v.capitalize()
-                break
-
-    ville = clean_text(ville)
-
-    # normalisation
-    if ville:
-        norm = {"Casa": "Casablanca", "Tangier": "Tanger"}
-        ville = norm.get(ville, ville)
-
-    return ville
-
 # =========================================================
 # SCRAPER
 # =========================================================
-def scraping_location_all():
-    global driver
+def scraping_location_all(pacer_=None):
+    global driver, pacer
+    pacer = pacer_ or pacing.Pacer()
+    driver = start_driver()
 
-    # 1) Charger ce qui est déjà scrapé
-    locations = load_locations()
+    # 1) Ouvrir le store et relever ce qui est déjà scrapé (URLs + ids, en flux)
+    store = open_store()
+    deja_vus, compteur_data = scan_locations()
 
     # 2) Charger la progression
     prog = load_progress()
     page = 38
 
     # 3) Déduire compteur depuis data (pour ne pas réécrire annonce_1...)
-    compteur_data = infer_compteur_from_data(locations)
     compteur = max(int(prog.get("compteur", 0)), compteur_data)
 
     print("\n" + "=" * 70)
     print("SCRAPING LOCATION (RESUME) — MUBAWAB")
     print("=" * 70)
     print("URL BASE:", URL_BASE)
-    print(f"✅ Déjà scrapé: {len(locations)} annonces | compteur={compteur} | reprise page={page}")
+    print(f"✅ Déjà scrapé: {len(deja_vus)} annonces | compteur={compteur} | reprise page={page}")
 
     consecutive_timeouts = 0
     wait = WebDriverWait(driver, 15)
@@ -270,19 +208,17 @@ def scraping_location_all():
                     wait = WebDriverWait(driver, 15)
                     consecutive_timeouts = 0
                 page += 1
-                save_progress(page, compteur)
+                save_progress(store, page, compteur)
                 continue
             else:
                 consecutive_timeouts = 0
 
-            time.sleep(2)
-
             try:
                 wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "listingBox")))
             except Exception:
                 print("Aucune annonce détectée → on continue")
                 page += 1
-                save_progress(page, compteur)
+                save_progress(store, page, compteur)
                 continue
 
             annonces = driver.find_elements(By.CLASS_NAME, "listingBox")
@@ -290,7 +226,7 @@ def scraping_location_all():
 
             if not annonces:
                 page += 1
-                save_progress(page, compteur)
+                save_progress(store, page, compteur)
                 continue
 
             liens = []
@@ -307,8 +243,7 @@ def scraping_location_all():
                     break
 
                 # ✅ éviter les doublons si on relance
-                already = any(v.get("url") == lien for v in locations.values())
-                if already:
+                if lien in deja_vus:
                     continue
 
                 compteur += 1
@@ -323,7 +258,8 @@ def scraping_location_all():
                     print("⚠ Lien ignoré (trop lent)")
                     continue
 
-                time.sleep(1.5)
+                # Détails de l'annonce présents (prix, caractéristiques), sans attente fixe
+                attendre(EC.presence_of_element_located((By.CSS_SELECTOR, "h3.orangeTit, div.adDetailFeature")), 5)
 
                 try:
                     html = driver.page_source
@@ -338,69 +274,102 @@ def scraping_location_all():
                     wait = WebDriverWait(driver, 15)
                     continue
 
-                soup = BeautifulSoup(html, "html.parser")
-
-                prix = None
-                hprix = soup.select_one("h3.orangeTit")
-                if hprix:
-                    prix = clean_text(hprix.get_text(" ", strip=True))
-
-                surface = extract_surface(soup)
-
-                quartier = None
-                hq = soup.select_one("h3.greyTit")
-                if hq:
-                    quartier = clean_text(hq.get_text(" ", strip=True))
-
-                type_bien = extract_type_bien(soup)
-                chambres, bains = extract_rooms_baths(soup)
-
-                date_annonce = None
-                dd = soup.select_one("span.adDispDate")
-                if dd:
-                    date_annonce = clean_text(dd.get_text(" ", strip=True))
-
-                ville = extract_ville(soup, quartier, lien)
-
-                locations[f"annonce_{compteur}"] = {
-                    "id": compteur,
-                    "ville": ville,
-                    "prix": prix,
-                    "surface": surface,
-                    "quartier": quartier,
-                    "type_bien": type_bien,
-                    "nb_chambres": chambres,
-                    "nb_salle_de_bain": bains,
-                    "date_annonce": date_annonce,
-                    "url": lien
-                }
+                store.append({"id": compteur, **mubawab_pages.parse_location(html, lien)})
+                deja_vus.add(lien)
 
                 if compteur % BACKUP_EVERY == 0:
-                    save_locations(locations, backup=True)
-                    save_locations(locations, backup=False)
-                    save_progress(page, compteur)
-                    print("💾 Backup + progress sauvegardés")
+                    save_progress(store, page, compteur)
+                    print("💾 Annonces + progress sur disque")
 
             # fin page
             page += 1
-            save_progress(page, compteur)
+            save_progress(store, page, compteur)
 
         # sauvegarde finale
-        save_locations(locations, backup=False)
-        save_locations(locations, backup=True)
-        save_progress(page, compteur)
+        save_progress(store, page, compteur)
+        export_locations()
 
         print("\n✅ TERMINÉ")
-        print("Total annonces:", len(locations))
+        print("Total annonces:", len(deja_vus))
 
     finally:
+        store.close()
+        print(pacer.summary())
         try:
             driver.quit()
         except Exception:
             pass
 
+def scraping_location_async(args):
+    """
+    Annonces téléchargées en parallèle (crawler.py) ; reprise sur la frontière de crawl
+    (pages et annonces non faites), à défaut sur la page sauvegardée dans PROGRESS_FILE
+    """
+    store = open_store()
+    deja_vus, compteur_data = scan_locations()
+    prog = load_progress()
+    page = args.start_page or int(prog.get("page", 1))
+    state = {"compteur": max(int(prog.get("compteur", 0)), compteur_data), "page": page}
+    # Index des annonces vues : les connues ne sont rouvertes que si leur prix a changé
+    seen = seen_index.open_from_args(args, "mubawab_location", iter_records(STORE_FILE), url_field="url")
+    frontier = crawl_frontier.open_from_args(args, "mubawab_location")
+
+    print(f"✅ Déjà scrapé: {len(deja_vus)} annonces | compteur={state['compteur']} | reprise page={page}")
+
+    def link_filter(lien):
+        # ✅ liens d'annonce uniquement, sans les doublons d'un run précédent (l'index
+        # laisse passer une annonce connue au prix modifié : nouvelle observation)
+        return "/fr/a/" in lien and (seen is not None or lien not in deja_vus)
+
+    def on_record(lien, record):
+        if state["compteur"] >= MAX_ANNONCES:
+            return
+        state["compteur"] += 1
+        compteur = state["compteur"]
+        store.append({"id": compteur, **record})
+        deja_vus.add(lien)
+        if compteur % BACKUP_EVERY == 0:
+            save_progress(store, state["page"], compteur)
+            print("💾 Annonces + progress sur disque")
+
+    def on_page(next_page):
+        state["page"] = next_page
+        save_progress(store, next_page, state["compteur"])
+        if state["compteur"] >= MAX_ANNONCES:
+            print("🛑 LIMITE 5000 ATTEINTE")
+            return False
+
+    crawler = crawler_from_args(args, driver_factory=lambda: start_driver(headless=True), ready=document_ready())
+    try:
+        asyncio.run(mubawab_pages.crawl(crawler, URL_BASE, mubawab_pages.parse_location, on_record,
+                                        start_page=page, max_pages=MAX_PAGES, link_filter=link_filter,
+                                        on_page=on_page, stop_on_empty=False, seen=seen, frontier=frontier))
+    finally:
+        save_progress(store, state["page"], state["compteur"])
+        store.close()
+        if seen is not None:
+            seen.close()
+        if frontier is not None:
+            frontier.close()
+        export_locations()
+        print("Total annonces:", len(deja_vus))
+
 # =========================================================
 # RUN
 # =========================================================
 if __name__ == "__main__":
-    scraping_location_all()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scraper Mubawab location")
+    parser.add_argument('--engine', choices=['async', 'selenium'], default='async',
+                        help="async : moteur concurrent (crawler.py) ; selenium : boucle séquentielle historique")
+    parser.add_argument('--start-page', type=int, default=None,
+                        help="première page d'un nouveau crawl (défaut : page sauvegardée dans " + PROGRESS_FILE
+                             + ") ; un crawl interrompu reprend sur la frontière")
+    add_crawler_arguments(parser, default_fetch='http')
+    seen_index.add_seen_arguments(parser)
+    crawl_frontier.add_frontier_arguments(parser)
+    args = parser.parse_args()
+
+    if args.engine == 'selenium':
+        scraping_location_all(pacing.pacer_from_args(args))
+    else:
+        scraping_location_async(args)
\ No newline at end of file
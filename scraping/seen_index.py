@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Index persistant des annonces déjà vues (SQLite), partagé entre les runs des scrapers
+- clé : (source, id de l'annonce sur le site) lu dans l'URL ; Avito : 57103649
+  (...57103649.htm), Mubawab : 7712001 (/fr/a/7712001/...) ; pas le compteur annonce_N.
+  Une source par fichier brut : avito_vente, avito_location, mubawab_vente, mubawab_location
+- carte : prix affiché sur la page de résultats ; une annonce connue dont la carte
+  n'a pas changé n'est pas ouverte (should_fetch), la page de détail est économisée
+- contenu : empreinte des champs extraits (hors url, id et date relative) ; observe()
+  renvoie 'new', 'changed' ou 'unchanged' et seules les deux premières sont écrites
+  dans le fichier brut ; chaque nouveau prix est ajouté à la table observations
+- seed : au premier run, les annonces des fichiers bruts existants servent de référence
+Usage : python seen_index.py [--index data/raw/seen_index.sqlite]   (résumé par source)
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(script_dir, "..", "data", "raw", "seen_index.sqlite")
+
+ID_PATTERNS = {
+    'avito': re.compile(r'(\d+)\.htm'),
+    'mubawab': re.compile(r'/a/(\d+)'),
+}
+
+# Prix affichés sur une carte de résultats ("2 450 000 DH", "4.500 MAD")
+CARD_PRICE = re.compile(r'\d[\d\s.,]*\s*(?:DH|MAD|Dhs?)\b', re.IGNORECASE)
+
+# Champs qui changent sans que l'annonce change (ou qui ne sont pas du contenu)
+VOLATILE_FIELDS = {'id', 'url', 'url_annonce', 'date_annonce'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    url TEXT,
+    card_hash TEXT,
+    content_hash TEXT,
+    prix TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    PRIMARY KEY (source, listing_id)
+);
+CREATE TABLE IF NOT EXISTS observations (
+    source TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    observed_at REAL,
+    prix TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS observations_listing ON observations (source, listing_id);
+"""
+
+
+def listing_id(source, url):
+    """Id de l'annonce sur le site (avito_vente -> avito), lu dans l'URL ; None si absent"""
+    match = ID_PATTERNS[source.split('_')[0]].search(url or '')
+    return match.group(1) if match else None
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def card_hash(card_text):
+    """Empreinte d'une carte : ses prix si elle en affiche, sinon tout son texte"""
+    if card_text is None:
+        return None
+    prices = CARD_PRICE.findall(card_text)
+    key = '|'.join(re.sub(r'\s+', ' ', p).strip() for p in prices) if prices else ' '.join(card_text.split())
+    return _digest(key)
+
+
+def content_hash(record):
+    # Valeurs en texte : une ligne relue du CSV ("3") vaut l'annonce extraite (3) ;
+    # les champs en trop d'une ligne mal formée (clé None de csv.DictReader) sont ignorés
+    fields = {k: None if v is None else str(v) for k, v in record.items()
+              if isinstance(k, str) and k not in VOLATILE_FIELDS}
+    return _digest(json.dumps(fields, sort_keys=True, ensure_ascii=False))
+
+
+class SeenIndex:
+    """
+    Annonces vues d'une source ; plusieurs processus (mode pool) peuvent partager le fichier
+    (WAL, attente sur verrou). Les écritures sont validées par commit(), une fois par page
+    """
+
+    def __init__(self, source, path=DEFAULT_PATH, timeout=30.0):
+        self.source = source
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.skipped = 0
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+
+    def _row(self, lid):
+        return self.conn.execute(
+            "SELECT card_hash, content_hash, prix FROM listings WHERE source = ? AND listing_id = ?",
+            (self.source, lid)).fetchone()
+
+    def should_fetch(self, url, card_text=None):
+        """
+        False pour une annonce connue dont la carte n'a pas changé (sa date de dernière vue
+        est mise à jour) ; True pour une annonce inconnue, sans id ou au prix modifié
+        """
+        lid = listing_id(self.source, url)
+        if lid is None:
+            return True
+        row = self._row(lid)
+        if row is None:
+            return True
+        card = card_hash(card_text)
+        if card is not None and row[0] is not None and card != row[0]:
+            return True
+        # Carte inconnue (annonce reprise des fichiers bruts) : la carte actuelle devient la référence
+        self.conn.execute(
+            "UPDATE listings SET last_seen = ?, card_hash = COALESCE(card_hash, ?) "
+            "WHERE source = ? AND listing_id = ?", (time.time(), card, self.source, lid))
+        self.skipped += 1
+        return False
+
+    def observe(self, url, record, card_text=None, price_field='prix'):
+        """Enregistre l'annonce extraite ; renvoie 'new', 'changed' ou 'unchanged'"""
+        lid = listing_id(self.source, url)
+        if lid is None:
+            self.counts['new'] += 1
+            return 'new'
+        now = time.time()
+        content = content_hash(record)
+        prix = record.get(price_field)
+        prix = None if prix is None else str(prix)
+        card = card_hash(card_text)
+        row = self._row(lid)
+
+        if row is None:
+            status = 'new'
+            self.conn.execute(
+                "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.source, lid, url, card, content, prix, now, now))
+        else:
+            status = 'unchanged' if row[1] == content else 'changed'
+            self.conn.execute(
+                "UPDATE listings SET url = ?, card_hash = COALESCE(?, card_hash), content_hash = ?, "
+                "prix = ?, last_seen = ? WHERE source = ? AND listing_id = ?",
+                (url, card, content, prix, now, self.source, lid))
+        if row is None or row[2] != prix:
+            self.conn.execute("INSERT INTO observations VALUES (?, ?, ?, ?, ?)",
+                              (self.source, lid, now, prix, content))
+        self.counts[status] += 1
+        return status
+
+    def seed(self, records, url_field, price_field='prix'):
+        """
+        Annonces déjà présentes dans les fichiers bruts, si la source n'a encore rien
+        dans l'index ; renvoie le nombre d'annonces ajoutées
+        """
+        if self.conn.execute("SELECT 1 FROM listings WHERE source = ? LIMIT 1", (self.source,)).fetchone():
+            return 0
+        added = 0
+        now = time.time()
+        for record in records:
+            url = record.get(url_field)
+            lid = listing_id(self.source, url)
+            if lid is None:
+                continue
+            prix = record.get(price_field)
+            prix = None if prix is None else str(prix)
+            # Une annonce présente plusieurs fois : la dernière ligne fait foi
+            self.conn.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, NULL, ?, ?, ?, ?)",
+                (self.source, lid, url, content_hash(record), prix, now, now))
+            added += 1
+        self.commit()
+        return added
+
+    def price_history(self, url_or_id):
+        """[(horodatage, prix)] d'une annonce, du plus ancien au plus récent"""
+        lid = listing_id(self.source, url_or_id) or url_or_id
+        return self.conn.execute(
+            "SELECT observed_at, prix FROM observations WHERE source = ? AND listing_id = ? "
+            "ORDER BY observed_at", (self.source, lid)).fetchall()
+
+    def summary(self):
+        return (f"index : {self.counts['new']} nouvelles, {self.counts['changed']} modifiées, "
+                f"{self.counts['unchanged']} inchangées, {self.skipped} pages de détail évitées")
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def csv_records(path):
+    """Lignes d'un CSV brut (avito_*.csv) en dictionnaires, lues en flux"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def add_seen_arguments(parser):
+    parser.add_argument('--seen-index', default=DEFAULT_PATH,
+                        help="index SQLite des annonces déjà vues ('' pour tout retélécharger)")
+    return parser
+
+
+def open_from_args(args, source, existing=None, url_field='url_annonce'):
+    """
+    Index de la source, ou None avec --seen-index '' ; au premier run, amorcé avec les
+    annonces `existing` (itérable paresseux : lu seulement si la source est vide)
+    """
+    path = getattr(args, 'seen_index', None)
+    if not path:
+        return None
+    index = SeenIndex(source, path)
+    if existing is not None:
+        added = index.seed(existing, url_field)
+        if added:
+            print(f"🗂 Index amorcé : {added} annonces {source} déjà dans les fichiers bruts")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Résumé de l'index des annonces vues")
+    parser.add_argument('--index', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    with SeenIndex(None, args.index) as index:
+        rows = index.conn.execute(
+            "SELECT l.source, COUNT(*), "
+            "(SELECT COUNT(*) FROM observations o WHERE o.source = l.source) "
+            "FROM listings l GROUP BY l.source").fetchall()
+        for source, listings, observations in rows:
+            print(f"{source:<18}{listings:>8} annonces{observations:>8} prix observés")
+
+
+if __name__ == "__main__":
+    main()
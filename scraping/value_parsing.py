@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion vectorisée des valeurs brutes des scrapers en nombres, une colonne entière à la fois
+- prix : "23900 DH" (Avito, f"{clean_price} DH"), "1 380 000 DH" (Mubawab, orangeTit),
+  "9 000 DH Baisse du prix 500 DH" -> 9000.0 ; "Prix à consulter" ou prix en euros : invalide
+- surface : "57 m²", "90 m2", "1 200 m²", "57,5 m²", "100-120 m²" -> premier nombre
+- pièces : "3 Chambres", "1 Salle de bain", "5" -> entier
+Chaque fonction prend une Series pandas, une liste, un tableau NumPy ou un tableau Arrow
+(Array / ChunkedArray) et renvoie un Parsed : valeurs typées (float64 ou int64) et masque de
+validité (True : valeur lue). Une seule expression régulière par colonne, appliquée par :
+- le moteur 'arrow' : pyarrow.compute (RE2, en C++), sans objet Python par valeur
+- le moteur 'pandas' : Series.str.extract (module re), si pyarrow n'est pas installé
+Benchmark et comparaison des moteurs : python bench_value_parsing.py
+"""
+
+import re
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # moteur pandas seulement
+    pa = pc = None
+
+# Espaces des nombres affichés : espace, insécable, fine insécable, tabulation
+SPACES = ' \u00a0\u202f\t'
+# Entier avec ou sans séparateurs de milliers ("1 380 000", "1.380.000", "23900")
+_INTEGER = rf'\d{{1,3}}(?:[{SPACES}.]\d{{3}})+|\d+'
+
+PRICE_PATTERN = (rf'(?is)^[{SPACES}]*(?P<num>{_INTEGER})(?:,(?P<dec>\d{{1,2}}))?[{SPACES}]*'
+                 rf'(?P<unit>Dhs|DH|MAD|€|EUR)?(?:[{SPACES}]+(?:Baisse|Hausse)\b.*)?[{SPACES}]*$')
+SURFACE_PATTERN = rf'(?P<num>\d{{1,3}}(?:[{SPACES}]\d{{3}})+|\d+)(?:[.,](?P<dec>\d+))?'
+COUNT_PATTERN = r'(?P<num>\d+)'
+# Séparateurs de milliers retirés avant conversion
+SEPARATORS = f'[{SPACES}.]'
+FOREIGN_CURRENCIES = ['€', 'EUR']
+
+ENGINES = ('auto', 'arrow', 'pandas')
+
+
+class Parsed(NamedTuple):
+    values: np.ndarray   # float64 (NaN si invalide) ou int64 (0 si invalide)
+    valid: np.ndarray    # bool
+
+    def series(self, index=None):
+        """Series float (NaN si invalide) ou Int64 (<NA> si invalide)"""
+        if self.values.dtype.kind == 'f':
+            return pd.Series(self.values, index=index)
+        return pd.Series(pd.arrays.IntegerArray(self.values, ~self.valid), index=index)
+
+    def arrow(self):
+        """Tableau Arrow typé, null là où la valeur est invalide"""
+        return pa.array(self.values, mask=~self.valid)
+
+
+def _engine(engine):
+    if engine not in ENGINES:
+        raise ValueError(f"moteur inconnu : {engine} ({', '.join(ENGINES)})")
+    if engine == 'auto':
+        return 'arrow' if pa is not None else 'pandas'
+    if engine == 'arrow' and pa is None:
+        raise ImportError("pyarrow n'est pas installé : moteur 'pandas' seulement")
+    return engine
+
+
+def _as_arrow(values):
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values if pa.types.is_string(values.type) or pa.types.is_large_string(values.type) \
+            else pc.cast(values, pa.string())
+    return pa.array(pd.Series(values).astype('string'), type=pa.string(), from_pandas=True)
+
+
+def _as_text(values):
+    """Series object de chaînes (NA si absent), pour le module re"""
+    if pa is not None and isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = values.to_pandas()
+    return pd.Series(values).astype('string').astype(object)
+
+
+def _extract_arrow(values, pattern, integer):
+    names = re.compile(pattern).groupindex
+    groups = pc.extract_regex(_as_arrow(values), pattern)
+    digits = pc.replace_substring_regex(pc.struct_field(groups, 'num'), SEPARATORS, '')
+    if not integer and 'dec' in names:
+        digits = pc.coalesce(pc.binary_join_element_wise(digits, pc.struct_field(groups, 'dec'), '.'), digits)
+    number = pc.cast(digits, pa.int64() if integer else pa.float64())
+    valid = pc.is_valid(number)
+    if 'unit' in names:
+        foreign = pc.is_in(pc.utf8_upper(pc.struct_field(groups, 'unit')), pa.array(FOREIGN_CURRENCIES))
+        valid = pc.and_(valid, pc.invert(pc.fill_null(foreign, False)))
+    valid = np.asarray(valid.to_numpy(zero_copy_only=False), dtype=bool)
+    values = pc.fill_null(number, 0 if integer else np.nan).to_numpy(zero_copy_only=False)
+    return values, valid
+
+
+def _extract_pandas(values, pattern, integer):
+    groups = _as_text(values).str.extract(pattern)
+    digits = groups['num'].str.replace(SEPARATORS, '', regex=True)
+    if not integer and 'dec' in groups:
+        digits = digits.where(groups['dec'].isna(), digits + '.' + groups['dec'])
+    number = pd.to_numeric(digits, errors='coerce').astype(float)
+    valid = number.notna()
+    if 'unit' in groups:
+        valid &= ~groups['unit'].str.upper().isin(FOREIGN_CURRENCIES)
+    valid = valid.to_numpy(dtype=bool)
+    if integer:
+        return number.fillna(0).to_numpy(dtype='int64'), valid
+    return number.to_numpy(dtype=float), valid
+
+
+def _parse(values, pattern, integer=False, engine='auto'):
+    extract = _extract_arrow if _engine(engine) == 'arrow' else _extract_pandas
+    numbers, valid = extract(values, pattern, integer)
+    if not integer:
+        numbers = np.where(valid, numbers, np.nan)
+    return Parsed(numbers, valid)
+
+
+def parse_price(values, engine='auto'):
+    """Prix en DH (float64) ; invalide : texte sans nombre en tête, prix en euros"""
+    return _parse(values, PRICE_PATTERN, engine=engine)
+
+
+def parse_surface(values, engine='auto'):
+    """Surface en m² (float64) : premier nombre du texte"""
+    return _parse(values, SURFACE_PATTERN, engine=engine)
+
+
+def parse_count(values, engine='auto'):
+    """Nombre de chambres, salles de bain, pièces (int64) : premier entier du texte"""
+    return _parse(values, COUNT_PATTERN, integer=True, engine=engine)
+
+
+# Colonnes brutes des scrapers -> fonction de conversion
+PARSERS = {
+    'prix': parse_price,
+    'surface': parse_surface,
+    'nb_chambres': parse_count,
+    'nb_salle_de_bain': parse_count,
+    'nb_salle_de_bains': parse_count,
+}
+
+
+def parse_frame(frame, engine='auto'):
+    """{colonne: Parsed} pour les colonnes de PARSERS présentes dans le DataFrame"""
+    return {col: parser(frame[col], engine) for col, parser in PARSERS.items() if col in frame.columns}